@@ -0,0 +1,102 @@
+import asyncio
+import time
+from typing import Awaitable, Callable, List, Optional
+
+from app.metrics import Histogram
+
+
+class MicroBatcher:
+    """
+    Coalesces concurrent single-item calls into batched calls.
+
+    `submit(item)` parks the item and returns a future-backed awaitable. An
+    item that arrives while no batch is running is flushed right away, so a
+    lone request never waits. Otherwise items queue up behind the running
+    batch and are flushed as one `fn(items)` call as soon as `max_batch` of
+    them are waiting, a batch finishes, or `max_wait` seconds after the
+    first one arrived, whichever comes first. `fn` must return one result
+    per item, in order; if it raises, every caller in that batch gets the
+    exception.
+
+    `runner(fn, items)` decides where the batch runs (e.g. the inference
+    executor); by default it runs inline on the event loop. All bookkeeping
+    happens on the event loop thread, so no locks are needed.
+    """
+
+    def __init__(self, fn: Callable[[list], list], max_batch: int = 32, max_wait: float = 0.002,
+                 runner: Optional[Callable[..., Awaitable]] = None,
+                 batch_sizes: Optional[Histogram] = None, wait_seconds: Optional[Histogram] = None):
+        if max_batch < 1:
+            raise ValueError("max_batch must be at least 1.")
+        self.fn = fn
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.runner = runner
+        self.batch_sizes = batch_sizes
+        self.wait_seconds = wait_seconds
+        self._pending: List[tuple] = []  # (item, future, enqueued at)
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks = set()
+
+    async def submit(self, item):
+        """Queues `item` for the next batch and waits for its result."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future, time.perf_counter()))
+        if not self._tasks or len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        while self._pending:
+            batch, self._pending = self._pending[:self.max_batch], self._pending[self.max_batch:]
+            # Drop callers that gave up (e.g. disconnected) before their batch ran
+            batch = [entry for entry in batch if not entry[1].cancelled()]
+            if batch:
+                task = asyncio.get_running_loop().create_task(self._run(batch))
+                self._tasks.add(task)
+                task.add_done_callback(self._finished)
+
+    def _finished(self, task):
+        self._tasks.discard(task)
+        # Whatever queued up behind this batch goes next, without waiting out the timer
+        if self._pending:
+            self._flush()
+
+    async def _run(self, batch):
+        started = time.perf_counter()
+        if self.batch_sizes is not None:
+            self.batch_sizes.observe(len(batch))
+        if self.wait_seconds is not None:
+            for _, _, enqueued in batch:
+                self.wait_seconds.observe(started - enqueued)
+
+        items = [item for item, _, _ in batch]
+        try:
+            if self.runner is not None:
+                results = await self.runner(self.fn, items)
+            else:
+                results = self.fn(items)
+            if len(results) != len(items):
+                raise RuntimeError(f"Batch function returned {len(results)} results for {len(items)} items.")
+        except BaseException as e:
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            if not isinstance(e, Exception):
+                raise
+            return
+        for (_, future, _), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    async def close(self):
+        """Flushes anything still pending and waits for running batches."""
+        self._flush()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
@@ -0,0 +1,126 @@
+from concurrent.futures import Executor, FIRST_COMPLETED, wait
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+from app.metrics import StageTimer
+
+
+class GraphStage(NamedTuple):
+    name: str
+    fn: Callable
+    deps: Tuple[str, ...]
+    optional: Tuple[str, ...]  # Deps that may be None without skipping this stage
+
+
+class StageGraph:
+    """
+    A small DAG of analysis stages that share their intermediate results.
+
+    Each stage is a function of its dependencies' values, registered with
+    `stage(name, deps)`. `run` executes only what the requested targets need,
+    each stage once, and hands independent branches to a thread pool so the
+    wall time is the critical path rather than the sum of the stages (OpenCV
+    and MediaPipe release the GIL). A stage whose required input is None
+    (no image, no person) is skipped and yields None itself.
+    """
+
+    def __init__(self):
+        self.stages: Dict[str, GraphStage] = {}
+
+    def stage(self, name: str, deps: Sequence[str] = (), optional: Sequence[str] = ()):
+        """Decorator registering `fn(*dep_values)` as stage `name`."""
+        def register(fn):
+            self.stages[name] = GraphStage(name, fn, tuple(deps), tuple(optional))
+            return fn
+        return register
+
+    def plan(self, targets: Iterable[str], inputs: Iterable[str] = ()) -> List[str]:
+        """
+        The stages needed for `targets`, dependencies first. Optional deps are
+        only planned when they are targets themselves or some planned stage
+        requires them; otherwise they are passed as None. Raises KeyError for
+        unknown names.
+        """
+        inputs = set(inputs)
+        required, visiting = set(), set()
+
+        def require(name):
+            if name in inputs or name in required:
+                return
+            if name not in self.stages:
+                raise KeyError(name)
+            if name in visiting:
+                raise ValueError(f"Stage graph has a cycle through {name}.")
+            visiting.add(name)
+            stage = self.stages[name]
+            for dep in stage.deps:
+                if dep not in stage.optional:
+                    require(dep)
+            visiting.discard(name)
+            required.add(name)
+
+        for target in targets:
+            require(target)
+
+        order = []
+
+        def visit(name):
+            if name in order:
+                return
+            for dep in self.stages[name].deps:
+                if dep in required:
+                    visit(dep)
+            order.append(name)
+
+        for name in sorted(required):
+            visit(name)
+        return order
+
+    def _call(self, stage: GraphStage, values: dict, timer: Optional[StageTimer]):
+        args = [values[dep] for dep in stage.deps]
+        if timer is None:
+            return stage.fn(*args)
+        with timer.stage(stage.name):
+            return stage.fn(*args)
+
+    def run(self, targets: Iterable[str], inputs: dict, timer: Optional[StageTimer] = None,
+            pool: Optional[Executor] = None) -> dict:
+        """
+        Runs the stages `targets` need and returns every computed value by
+        name (inputs included, unplanned optional deps as None). Every ready
+        stage is submitted to `pool` as soon as its inputs are in, so
+        independent branches overlap; the calling thread only runs a stage
+        itself when nothing else could run meanwhile. Without a pool
+        everything runs sequentially.
+        """
+        values = dict(inputs)
+        pending = self.plan(targets, values)
+        for name in pending:
+            for dep in self.stages[name].optional:
+                if dep not in values and dep not in pending:
+                    values[dep] = None
+        running = {}
+        while pending or running:
+            for future in [future for future in running if future.done()]:
+                values[running.pop(future)] = future.result()
+
+            runnable = []
+            for name in [name for name in pending if all(dep in values for dep in self.stages[name].deps)]:
+                pending.remove(name)
+                stage = self.stages[name]
+                if any(values[dep] is None for dep in stage.deps if dep not in stage.optional):
+                    values[name] = None
+                else:
+                    runnable.append(stage)
+            if not runnable:
+                if running:
+                    wait(running, return_when=FIRST_COMPLETED)
+                continue
+
+            if pool is None or (len(runnable) == 1 and not running):
+                # Everything still pending waits on these stages anyway
+                for stage in runnable:
+                    values[stage.name] = self._call(stage, values, timer)
+            else:
+                for stage in runnable:
+                    running[pool.submit(self._call, stage, values, timer)] = stage.name
+        return values
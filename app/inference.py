@@ -0,0 +1,109 @@
+import asyncio
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from typing import Callable, Optional
+
+from app.settings import Settings
+
+
+class ExecutorSaturated(Exception):
+    """Raised when the inference queue is full and the request should be shed."""
+
+
+class InferenceExecutor:
+    """
+    Runs CPU-bound inference stages (decode, MediaPipe, classification) off the
+    event loop on a thread or process pool.
+
+    At most `workers + max_queue` calls may be pending at once. Beyond that,
+    `run()` fails fast with ExecutorSaturated instead of letting the backlog
+    (and tail latency) grow without bound.
+    """
+
+    def __init__(self, kind: str = 'thread', workers: int = 1, max_queue: int = 0,
+                 initializer: Optional[Callable] = None):
+        if kind not in ('thread', 'process'):
+            raise ValueError("Invalid executor kind. Use 'thread' or 'process'.")
+        self.kind = kind
+        self.workers = workers
+        self.capacity = workers + max_queue
+        self.initializer = initializer
+        self.in_flight = 0
+        self._executor: Optional[Executor] = None
+        self._thread_executor: Optional[ThreadPoolExecutor] = None
+
+    @classmethod
+    def from_settings(cls, settings: Settings, initializer: Optional[Callable] = None) -> 'InferenceExecutor':
+        return cls(settings.executor_kind, settings.inference_workers, settings.max_queue, initializer)
+
+    @property
+    def queue_depth(self) -> int:
+        """Number of submitted calls still waiting for a free worker."""
+        return max(0, self.in_flight - self.workers)
+
+    def start(self):
+        if self._executor is not None:
+            return
+        if self.kind == 'process':
+            # Spawn rather than fork: MediaPipe's native threads don't survive fork()
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=self.initializer,
+            )
+        else:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.workers,
+                thread_name_prefix='inference',
+                initializer=self.initializer,
+            )
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+        if self._thread_executor is not None:
+            self._thread_executor.shutdown(wait=True, cancel_futures=True)
+            self._thread_executor = None
+
+    def _in_process_executor(self) -> Executor:
+        self.start()
+        if self.kind == 'thread':
+            return self._executor
+        if self._thread_executor is None:
+            self._thread_executor = ThreadPoolExecutor(
+                max_workers=self.workers,
+                thread_name_prefix='inference-local',
+                initializer=self.initializer,
+            )
+        return self._thread_executor
+
+    async def _submit(self, executor_getter: Callable[[], Executor], fn: Callable, *args, **kwargs):
+        if self.in_flight >= self.capacity:
+            raise ExecutorSaturated(f"Inference queue is full ({self.in_flight} in flight).")
+        executor = executor_getter()
+        # Counted on the event loop thread only, so no lock is needed
+        self.in_flight += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(executor, partial(fn, *args, **kwargs))
+        finally:
+            self.in_flight -= 1
+
+    def _pool_executor(self) -> Executor:
+        self.start()
+        return self._executor
+
+    async def run(self, fn: Callable, *args, **kwargs):
+        """Runs `fn(*args, **kwargs)` on the pool and awaits the result."""
+        return await self._submit(self._pool_executor, fn, *args, **kwargs)
+
+    async def run_in_thread(self, fn: Callable, *args, **kwargs):
+        """
+        Like run(), but always on a thread of this process.
+
+        For work bound to in-process state that can't be pickled, such as a
+        streaming session's own landmarker. Shares the same backpressure limit.
+        """
+        return await self._submit(self._in_process_executor, fn, *args, **kwargs)
@@ -1,17 +1,230 @@
+import asyncio
+import logging
+import random
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+import numpy as np
 from fastapi import FastAPI, HTTPException
-from sklearn.datasets import load_iris
-from sklearn.naive_bayes import GaussianNB
 from pydantic import BaseModel
-from typing import List
-from photography.leading_lines import get_person_bounding_box
-from utilities.pose_classifier import make_prediction_data
-from utilities.media_pipe import extract_pose_data
-from utilities.images import read_image_from_memory
-from fastapi import FastAPI, File, UploadFile, HTTPException
+from typing import List, Optional
+from utilities.landmarker_cascade import LatencyBudget
+from utilities.model_registry import get_model_registry
+from utilities.result_cache import MISSING, ResultCache, content_key, path_key
+from fastapi import FastAPI, File, UploadFile, HTTPException, Header, Query, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, PlainTextResponse
 from typing import Dict
+from app import metrics, stages, wire
+from app.batcher import MicroBatcher
+from app.inference import InferenceExecutor, ExecutorSaturated
+from app.settings import settings
+from app.shared_frames import RingFull, SharedFrameRing
+from app.streaming import StreamSession
+
+# All CPU-bound stages go through this executor, never the event loop
+inference = InferenceExecutor.from_settings(settings, initializer=stages.warm_worker)
+# Retried and duplicate uploads are answered from here without re-running inference
+result_cache = ResultCache(settings.cache_entries, settings.cache_mb * 1024 * 1024,
+                           settings.cache_ttl, settings.cache_dir, settings.cache_disk_mb * 1024 * 1024)
+
+logger = logging.getLogger(__name__)
+
+metrics.registry.gauge('fotoflow_executor_in_flight', 'Calls running or queued on the inference executor.',
+                       lambda: inference.in_flight)
+metrics.registry.gauge('fotoflow_executor_queue_depth', 'Calls waiting for a free inference worker.',
+                       lambda: inference.queue_depth)
+metrics.registry.gauge('fotoflow_model_load_seconds', 'Duration of the most recent classifier load.',
+                       lambda: get_model_registry().last_load_seconds)
+metrics.registry.gauge('fotoflow_model_loads', 'Classifier loads (including hot reloads) in this process.',
+                       lambda: get_model_registry().loads)
+for name, stats_key in (('hits', 'hits'), ('disk_hits', 'disk_hits'), ('misses', 'misses')):
+    metrics.registry.gauge(f'fotoflow_cache_{name}', f'Result cache {stats_key.replace("_", " ")}.',
+                           lambda stats_key=stats_key: result_cache.stats()[stats_key])
+
+# Most recent sampled cProfile traces, served on /debug/profiles
+recent_profiles = deque(maxlen=20)
+
+# Inference-server mode (process executor + FOTOFLOW_FRAME_TRANSPORT=shm): frames
+# reach the workers through this ring, created per API process in lifespan
+frame_ring: Optional[SharedFrameRing] = None
+metrics.registry.gauge('fotoflow_frame_slots_in_use', 'Shared-memory frame slots leased to in-flight requests.',
+                       lambda: frame_ring.in_use if frame_ring is not None else 0)
+metrics.registry.gauge('fotoflow_frame_slot_leaks', 'Shared-memory frame slots reclaimed after outliving their lease.',
+                       lambda: frame_ring.leaked if frame_ring is not None else 0)
+
+# Startup progress, served on /ready
+readiness = {"ready": False, "classifier": False, "landmarker": False, "warmup_seconds": None, "error": None}
+
+def prediction_key(namespace: str, image_data: bytes) -> str:
+    """Cache key for results that depend on the pose classifier, changing whenever it is redeployed."""
+    return content_key(f"{namespace}-{get_model_registry().version()}", image_data)
+
+async def run_stage(key: str, fn, *args) -> stages.StageOutput:
+    """
+    Returns the cached output for `key`, or runs stage `fn` on the executor,
+    records its per-stage timings and caches the output. Outputs the latency
+    budget kept from escalating are not cached, so a later request with a
+    larger budget still gets the full cascade.
+    """
+    output = result_cache.get(key) if key else MISSING
+    if output is not MISSING:
+        return output
+
+    if settings.debug and random.random() < settings.profile_sample_rate:
+        output = await inference.run(stages.profiled, fn, *args)
+        recent_profiles.append({"stage": fn.__name__, "time": time.time(), "profile": output.profile})
+        output = output._replace(profile=None)
+    else:
+        output = await inference.run(fn, *args)
+
+    for stage, seconds in output.timings.items():
+        metrics.stage_seconds.observe(seconds, stage=stage)
+    for variant in output.landmarkers:
+        metrics.landmarker_runs.inc(variant=variant)
+    for lighter, heavier in zip(output.landmarkers, output.landmarkers[1:]):
+        metrics.landmarker_escalations.inc(from_variant=lighter, to_variant=heavier)
+    if key and not output.budget_limited:
+        result_cache.put(key, output)
+    return output
+
+def request_budget(budget_ms: Optional[float]) -> LatencyBudget:
+    """
+    The landmarker budget for a request starting now: the client's
+    X-Latency-Budget-Ms or FOTOFLOW_LATENCY_BUDGET_MS, at the current queue
+    depth per worker. A backed-up executor keeps requests on the cheapest model.
+    """
+    budget_ms = budget_ms if budget_ms is not None else settings.latency_budget_ms
+    return LatencyBudget.from_ms(budget_ms, inference.queue_depth / max(1, inference.workers))
+
+async def warm_up():
+    """Runs dummy inferences on every executor worker, then marks the service ready."""
+    started = time.perf_counter()
+    try:
+        # Thread workers share one landmarker pool; each worker process has its own
+        calls = inference.workers if inference.kind == 'process' else 1
+        landmarkers = 1 if inference.kind == 'process' else None
+        outputs = await asyncio.gather(*(inference.run(stages.warm_up, landmarkers) for _ in range(calls)))
+        for output in outputs:
+            for stage, seconds in output.timings.items():
+                metrics.stage_seconds.observe(seconds, stage=stage)
+        readiness["landmarker"] = True
+        readiness["ready"] = True
+    except Exception as e:
+        logger.exception("Warm-up failed")
+        readiness["error"] = f"{type(e).__name__}: {e}"
+    readiness["warmup_seconds"] = time.perf_counter() - started
+
+async def run_shared_frame(key: str, fn, frame: np.ndarray, *args) -> Optional[stages.StageOutput]:
+    """
+    Runs stage `fn(FrameRef, *args)` with `frame` copied into a shared-memory
+    slot instead of pickled, holding the slot until the worker is done.
+    Returns None without the ring, when every slot is leased, or for frames
+    larger than a slot; callers then fall back to sending bytes.
+    """
+    if frame_ring is None or frame.nbytes > frame_ring.slot_bytes:
+        return None
+    try:
+        lease = frame_ring.acquire(owner=fn.__name__)
+    except RingFull:
+        return None
+    try:
+        return await run_stage(key, fn, frame_ring.write(lease, frame), *args)
+    finally:
+        frame_ring.release(lease)
+
+async def extract_shared(image_data: bytes, budget: Optional[LatencyBudget]) -> Optional[stages.StageOutput]:
+    """
+    stages.extract_upload for inference-server mode: the upload is decoded on
+    this process's threads (OpenCV releases the GIL) and only the small RGB
+    buffer is handed to a worker, through the ring, or pickled when the ring
+    can't take it. None without the ring, before anything is decoded.
+    """
+    if frame_ring is None:
+        return None
+    key = content_key('landmarks', image_data)
+    output = result_cache.get(key)
+    if output is not MISSING:
+        return output
+    decoded = await inference.run_in_thread(stages.decode_upload, image_data)
+    for stage, seconds in decoded.timings.items():
+        metrics.stage_seconds.observe(seconds, stage=stage)
+    if decoded.value is None:
+        return decoded
+    rgb, image_shape = decoded.value.rgb, decoded.value.original_shape
+    output = await run_shared_frame(key, stages.extract_frame, rgb, image_shape, budget)
+    if output is None:
+        # Never decode the upload a second time in the worker
+        output = await run_stage(key, stages.extract_decoded, rgb, image_shape, budget)
+    return output
+
+async def reclaim_leaked_frames():
+    """Periodically takes back frame slots whose holders never released them."""
+    while True:
+        await asyncio.sleep(settings.frame_lease_seconds / 2)
+        frame_ring.reclaim_leaked(settings.frame_lease_seconds)
+
+async def _run_batch_stage(fn, batch):
+    output = await run_stage(None, fn, batch)
+    return output.value
+
+# Concurrent /prediction requests share one classifier call, which also describes the poses
+classify_batcher = MicroBatcher(stages.describe_batch, max(1, settings.batch_max_size),
+                                settings.batch_max_wait_ms / 1000, runner=_run_batch_stage,
+                                batch_sizes=metrics.batch_size, wait_seconds=metrics.batch_wait_seconds)
+
+async def predict_batched(image_data: bytes, budget: Optional[LatencyBudget] = None) -> stages.StageOutput:
+    """
+    Same result as stages.predict_upload, but split at the classifier: the
+    pose is extracted on its own, then classified and described on the
+    executor in a micro-batch with whatever other requests are in flight.
+    """
+    extracted = await extract_shared(image_data, budget)
+    if extracted is None:
+        extracted = await run_stage(content_key('landmarks', image_data), stages.extract_upload, image_data, budget)
+    if extracted.value is None:
+        return extracted
+    value = await classify_batcher.submit(extracted.value)
+    return stages.StageOutput(value, extracted.outcome, extracted.timings)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Load the classifier once per worker instead of once per request
+    # (a no-op when app.serve already loaded it before forking)
+    get_model_registry().ensure_loaded()
+    readiness["classifier"] = True
+    inference.start()
+    global frame_ring
+    reaper_task = None
+    if inference.kind == 'process' and settings.frame_transport == 'shm':
+        # One slot per request the executor admits, so a slot is always free for it
+        frame_ring = SharedFrameRing(inference.capacity, settings.frame_slot_mb * 1024 * 1024)
+        reaper_task = asyncio.create_task(reclaim_leaked_frames())
+    # Warm up in the background so the server can answer liveness checks meanwhile
+    warmup_task = asyncio.create_task(warm_up()) if settings.warmup else None
+    if warmup_task is None:
+        readiness["ready"] = True
+    yield
+    if warmup_task is not None:
+        warmup_task.cancel()
+    await classify_batcher.close()
+    inference.shutdown()
+    if frame_ring is not None:
+        reaper_task.cancel()
+        frame_ring.close()
+        frame_ring = None
 
 # Creating FastAPI instance
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
+
+@app.middleware('http')
+async def track_requests(request, call_next):
+    metrics.in_flight_requests.inc()
+    started = time.perf_counter()
+    try:
+        return await call_next(request)
+    finally:
+        metrics.request_seconds.observe(time.perf_counter() - started, endpoint=request.url.path)
+        metrics.in_flight_requests.dec()
 
 # Defining the Pydantic model for request body
 class RequestBody(BaseModel):
@@ -20,51 +233,342 @@ class RequestBody(BaseModel):
 class ImageRequest(BaseModel):
     image_name: str
 
+@app.exception_handler(ExecutorSaturated)
+async def executor_saturated_handler(request, exc: ExecutorSaturated):
+    # Shed load early rather than letting queued requests blow the latency budget
+    metrics.outcomes.inc(endpoint=request.url.path, outcome='rejected')
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers={"Retry-After": "1"})
+
 @app.post('/pose-data')
-def get_pose_data(request: ImageRequest):
+async def get_pose_data(request: ImageRequest, accept: str = Header(None)):
     """
     Extract pose data from the given image name.
+    Send `Accept: application/x-fotoflow-pose` (or application/msgpack) for
+    the landmarks as packed float32 instead of JSON.
     """
     try:
         # Process the image using Mediapipe
-        pose_data = extract_pose_data(request.image_name)
-
-        if not pose_data:
-            raise HTTPException(status_code=404, detail="No pose data could be extracted from the image.")
-
-        # Return the extracted pose data
-        return {"image_name": request.image_name, "pose_data": pose_data}
-
+        output = await run_stage(path_key('pose-data', request.image_name),
+                                 stages.extract_path, request.image_name)
+    except ExecutorSaturated:
+        raise
     except Exception as e:
         # Handle any unexpected errors
+        logger.exception("Failed to extract pose data from %s", request.image_name)
+        metrics.outcomes.inc(endpoint='/pose-data', outcome='error')
         raise HTTPException(status_code=500, detail=f"Error processing image: {str(e)}")
 
+    metrics.outcomes.inc(endpoint='/pose-data', outcome=output.outcome)
+    if not output.value:
+        raise HTTPException(status_code=404, detail="No pose data could be extracted from the image.")
+
+    media_type = wire.negotiate(accept)
+    if media_type != wire.JSON_MEDIA_TYPE:
+        return wire.pose_response(media_type, landmarks=output.value, extra={"image_name": request.image_name})
+
+    # Return the extracted pose data
+    return {"image_name": request.image_name, "pose_data": output.value}
+
 
 
 @app.post('/prediction')
-async def get_prediction(image: UploadFile = File(...)) -> Dict:
+async def get_prediction(image: UploadFile = File(...),
+                         x_latency_budget_ms: Optional[float] = Header(None)) -> Dict:
     """
     Extract pose data from the given image.
-    The image is expected to be uploaded as a file.
+    The image is expected to be uploaded as a file. X-Latency-Budget-Ms caps
+    how far a low-confidence pose may escalate to heavier landmarker models.
     """
+    budget = request_budget(x_latency_budget_ms)
     try:
         # Read the image data from the uploaded file
         image_data = await image.read()
-        image = read_image_from_memory(image_data)
-        image_shape = image.shape
-        pose_data = extract_pose_data(image)
-        bounding_coords = get_person_bounding_box(pose_data,image_shape)
-        prediction = make_prediction_data(pose_data)
-        prediction = prediction
-        if not pose_data:
-            raise HTTPException(status_code=404, detail="No pose data could be extracted from the image.")
-
-        # Return the extracted pose data
-        return {"prediction": prediction,
-                "bounding_box":bounding_coords
-                }
-
+        if settings.batch_max_size > 1 or frame_ring is not None:
+            output = await predict_batched(image_data, budget)
+        else:
+            output = await run_stage(prediction_key('prediction', image_data), stages.predict_upload, image_data,
+                                     budget)
+    except ExecutorSaturated:
+        raise
     except Exception as e:
         # Handle any unexpected errors
+        logger.exception("Prediction failed for upload %s", image.filename)
+        metrics.outcomes.inc(endpoint='/prediction', outcome='error')
+        raise HTTPException(status_code=500, detail=f"Error processing image: {str(e)}")
+
+    metrics.outcomes.inc(endpoint='/prediction', outcome=output.outcome)
+    if output.outcome == 'decode_failure':
+        raise HTTPException(status_code=400, detail="The uploaded file could not be decoded as an image.")
+    if output.value is None:
         return {"prediction": "No one found."}
+
+    # Return the extracted pose data
+    return output.value
+
+
+
+@app.post('/prediction/multi')
+async def get_prediction_multi(image: UploadFile = File(...)) -> Dict:
+    """
+    Detects up to FOTOFLOW_MAX_POSES people in an uploaded group shot and
+    returns a prediction, bounding box and composition score for each.
+    """
+    try:
+        image_data = await image.read()
+        output = await run_stage(prediction_key('prediction-multi', image_data), stages.predict_people, image_data)
+    except ExecutorSaturated:
+        raise
+    except Exception as e:
+        logger.exception("Multi-person prediction failed for upload %s", image.filename)
+        metrics.outcomes.inc(endpoint='/prediction/multi', outcome='error')
         raise HTTPException(status_code=500, detail=f"Error processing image: {str(e)}")
+
+    metrics.outcomes.inc(endpoint='/prediction/multi', outcome=output.outcome)
+    if output.outcome == 'decode_failure':
+        raise HTTPException(status_code=400, detail="The uploaded file could not be decoded as an image.")
+    people = output.value or []
+    return {"count": len(people), "people": people}
+
+
+@app.post('/prediction/raw')
+async def get_prediction_raw(request: Request,
+                             x_frame_width: int = Header(...),
+                             x_frame_height: int = Header(...),
+                             x_frame_format: str = Header('gray'),
+                             accept: str = Header(None),
+                             x_latency_budget_ms: Optional[float] = Header(None)):
+    """
+    Classifies an uncompressed preview frame sent as the plain request body.
+    X-Frame-Width / X-Frame-Height give its size and X-Frame-Format its layout
+    (gray, nv12, bgr or rgb). The response format follows the Accept header:
+    JSON by default, or the compact binary / msgpack pose payload.
+    X-Latency-Budget-Ms works as on /prediction.
+    """
+    budget = request_budget(x_latency_budget_ms)
+    frame_data = await request.body()
+    try:
+        output = await run_shared_frame(None, stages.predict_raw_shared, np.frombuffer(frame_data, np.uint8),
+                                        x_frame_width, x_frame_height, x_frame_format.lower(), budget)
+        if output is None:
+            output = await run_stage(None, stages.predict_raw, frame_data, x_frame_width, x_frame_height,
+                                     x_frame_format.lower(), budget)
+    except ExecutorSaturated:
+        raise
+    except Exception as e:
+        logger.exception("Prediction failed for a raw %s frame", x_frame_format)
+        metrics.outcomes.inc(endpoint='/prediction/raw', outcome='error')
+        raise HTTPException(status_code=500, detail=f"Error processing frame: {str(e)}")
+
+    metrics.outcomes.inc(endpoint='/prediction/raw', outcome=output.outcome)
+    if output.outcome == 'decode_failure':
+        raise HTTPException(status_code=400, detail=f"Body is not a {x_frame_width}x{x_frame_height} "
+                                                    f"{x_frame_format} frame.")
+    media_type = wire.negotiate(accept)
+    if output.value is None:
+        return wire.pose_response(media_type, extra={"prediction": "No one found."})
+    return wire.pose_response(media_type, output.value["landmarks"], output.value["bounding_box"],
+                              output.value["label_id"], extra={"prediction": output.value["prediction"]})
+
+
+@app.post('/analyze')
+async def analyze_image(image: UploadFile = File(...), requested: str = Query(None, alias='stages'),
+                        x_latency_budget_ms: Optional[float] = Header(None)) -> Dict:
+    """
+    Full composition analysis of one upload in a single call: pose
+    landmarks, bounding box, classification, head angles and gaze, leading
+    lines and rule-of-thirds placement. `stages` picks a comma-separated
+    subset (pose, box, classify, head, lines, thirds); by default all run.
+    Lines and thirds only take the person into account when box (and, for
+    the composition score, classify) is requested too. The image is decoded
+    once, and pose detection runs in parallel with edge detection.
+    X-Latency-Budget-Ms works as on /prediction.
+    """
+    budget = request_budget(x_latency_budget_ms)
+    names = [name.strip() for name in requested.split(',') if name.strip()] if requested else []
+    unknown = sorted(set(names) - set(stages.ANALYSIS_STAGES))
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown stages: {', '.join(unknown)}. "
+                                                    f"Choose from {', '.join(stages.ANALYSIS_STAGES)}.")
+    names = [name for name in stages.ANALYSIS_STAGES if name in names] or list(stages.ANALYSIS_STAGES)
+
+    try:
+        image_data = await image.read()
+        output = await run_stage(prediction_key(f"analyze-{'+'.join(names)}", image_data),
+                                 stages.analyze, image_data, names, budget)
+    except ExecutorSaturated:
+        raise
+    except Exception as e:
+        logger.exception("Analysis failed for upload %s", image.filename)
+        metrics.outcomes.inc(endpoint='/analyze', outcome='error')
+        raise HTTPException(status_code=500, detail=f"Error processing image: {str(e)}")
+
+    metrics.outcomes.inc(endpoint='/analyze', outcome=output.outcome)
+    if output.outcome == 'decode_failure':
+        raise HTTPException(status_code=400, detail="The uploaded file could not be decoded as an image.")
+    return dict(output.value, stages=names)
+
+
+@app.post('/similar-poses')
+async def get_similar_poses(image: UploadFile = File(...), k: int = Query(5, ge=1, le=50),
+                            x_latency_budget_ms: Optional[float] = Header(None)) -> Dict:
+    """
+    Finds the `k` reference shots whose poses are closest to the person in
+    the upload, for "closest example shot" posing guidance. Searches the
+    landmark store at FOTOFLOW_LANDMARK_STORE (see utilities.landmark_store).
+    X-Latency-Budget-Ms works as on /prediction.
+    """
+    if not settings.landmark_store:
+        raise HTTPException(status_code=404, detail="No landmark store is configured.")
+    budget = request_budget(x_latency_budget_ms)
+    try:
+        image_data = await image.read()
+        output = await run_stage(None, stages.similar_poses, image_data, k, budget)
+    except ExecutorSaturated:
+        raise
+    except Exception as e:
+        logger.exception("Similar-pose search failed for upload %s", image.filename)
+        metrics.outcomes.inc(endpoint='/similar-poses', outcome='error')
+        raise HTTPException(status_code=500, detail=f"Error processing image: {str(e)}")
+
+    metrics.outcomes.inc(endpoint='/similar-poses', outcome=output.outcome)
+    if output.outcome == 'decode_failure':
+        raise HTTPException(status_code=400, detail="The uploaded file could not be decoded as an image.")
+    if output.value is None:
+        return {"matches": [], "prediction": "No one found."}
+    return {"matches": output.value}
+
+
+@app.get('/labels')
+def get_labels() -> Dict:
+    """Class labels in label-id order, for decoding binary responses."""
+    return {"labels": get_model_registry().classes}
+
+
+@app.post('/prediction/batch')
+async def get_prediction_batch(images: List[UploadFile] = File(...),
+                               x_latency_budget_ms: Optional[float] = Header(None)) -> Dict:
+    """
+    Classifies a burst of uploaded images in one call.
+    Decoding and pose extraction run concurrently per image, at most one per
+    inference worker so a large burst never overflows the queue on its own,
+    then all landmark vectors are classified together in a single vectorized
+    batch. An image that fails gets an error entry instead of failing the
+    batch. X-Latency-Budget-Ms works as on /prediction, for the whole batch.
+    """
+    budget = request_budget(x_latency_budget_ms)
+    image_datas = await asyncio.gather(*(image.read() for image in images))
+    fan_out = asyncio.Semaphore(max(1, inference.workers))
+
+    async def extract(image_data):
+        async with fan_out:
+            return await run_stage(content_key('landmarks', image_data), stages.extract_upload, image_data, budget)
+
+    outputs = await asyncio.gather(*(extract(image_data) for image_data in image_datas), return_exceptions=True)
+    for output in outputs:
+        if isinstance(output, ExecutorSaturated):
+            raise output
+    try:
+        described = await run_stage(None, stages.describe_batch,
+                                    [output.value if isinstance(output, stages.StageOutput) else None
+                                     for output in outputs])
+    except ExecutorSaturated:
+        raise
+    except Exception as e:
+        logger.exception("Batch classification failed")
+        metrics.outcomes.inc(endpoint='/prediction/batch', outcome='error')
+        raise HTTPException(status_code=500, detail=f"Error processing images: {str(e)}")
+
+    results = []
+    for image, output, value in zip(images, outputs, described.value):
+        if isinstance(output, BaseException):
+            logger.error("Pose extraction failed for batch upload %s", image.filename,
+                         exc_info=(type(output), output, output.__traceback__))
+            metrics.outcomes.inc(endpoint='/prediction/batch', outcome='error')
+            results.append({"filename": image.filename, "error": f"Error processing image: {output}"})
+            continue
+        metrics.outcomes.inc(endpoint='/prediction/batch', outcome=output.outcome)
+        if output.outcome == 'decode_failure':
+            results.append({"filename": image.filename, "error": "Could not decode image."})
+        elif value is None:
+            results.append({"filename": image.filename, "prediction": "No one found."})
+        else:
+            results.append({"filename": image.filename, **value})
+    return {"results": results}
+
+
+@app.get('/metrics', response_class=PlainTextResponse)
+def get_metrics():
+    """Prometheus text-format metrics: stage timings, outcomes, in-flight and queue gauges."""
+    return PlainTextResponse(metrics.registry.render(), media_type='text/plain; version=0.0.4')
+
+
+if settings.debug:
+    @app.get('/debug/profiles')
+    def get_debug_profiles() -> Dict:
+        """Sampled cProfile traces of recent stage calls (FOTOFLOW_PROFILE_SAMPLE_RATE)."""
+        return {"profiles": list(recent_profiles)}
+
+
+@app.get('/ready')
+def get_ready():
+    """Readiness probe: 200 once the classifier and landmarkers are warm, 503 before (or if warm-up failed)."""
+    return JSONResponse(status_code=200 if readiness["ready"] else 503, content=readiness)
+
+
+@app.get('/cache/stats')
+def get_cache_stats() -> Dict:
+    """Hit/miss counters of the result cache, for tuning its capacity."""
+    return result_cache.stats()
+
+
+@app.websocket('/stream')
+async def stream_analysis(websocket: WebSocket):
+    """
+    Live pose analysis over a WebSocket.
+    The client sends each frame as a binary message (JPEG/PNG bytes) and gets
+    back one JSON message per processed frame. If frames arrive faster than
+    they can be analyzed, only the newest waiting frame is kept.
+    """
+    await websocket.accept()
+    session = StreamSession()
+    pending = {"data": None, "index": -1, "dropped": 0}
+    frame_ready = asyncio.Event()
+
+    async def receive_frames():
+        index = 0
+        while True:
+            data = await websocket.receive_bytes()
+            if pending["data"] is not None:
+                pending["dropped"] += 1  # Superseded before we got to it
+            pending["data"], pending["index"] = data, index
+            index += 1
+            frame_ready.set()
+
+    receiver = asyncio.create_task(receive_frames())
+    try:
+        while True:
+            # Wait for a frame, but notice a disconnect while idle
+            waiter = asyncio.create_task(frame_ready.wait())
+            await asyncio.wait({waiter, receiver}, return_when=asyncio.FIRST_COMPLETED)
+            if receiver.done():
+                waiter.cancel()
+                receiver.result()  # Re-raises the disconnect
+            frame_ready.clear()
+            data, index = pending["data"], pending["index"]
+            pending["data"] = None
+
+            try:
+                result = await inference.run_in_thread(session.process_frame, data)
+            except ExecutorSaturated:
+                result = {"error": "busy"}
+            except Exception as e:
+                # One bad frame (or a landmarker failure) shouldn't end the session
+                logger.exception("Stream frame %d failed", index)
+                result = {"error": f"Error processing frame: {e}"}
+            result.update({"frame": index, "dropped": pending["dropped"]})
+            await websocket.send_json(result)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        receiver.cancel()
+        await asyncio.get_running_loop().run_in_executor(None, session.close)
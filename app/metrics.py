@@ -0,0 +1,209 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+# Latency buckets (seconds) spanning cheap NumPy stages to slow full-frame inference
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(label_names: Tuple[str, ...], label_values: Tuple[str, ...], extra: str = '') -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(label_names, label_values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value))
+
+
+class _Metric:
+    kind = ''
+
+    def __init__(self, name: str, documentation: str, label_names: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, '')) for name in self.label_names)
+
+    def header(self) -> str:
+        return f'# HELP {self.name} {self.documentation}\n# TYPE {self.name} {self.kind}\n'
+
+
+class Counter(_Metric):
+    """A monotonically increasing count, optionally split by labels."""
+    kind = 'counter'
+
+    def __init__(self, name: str, documentation: str, label_names: Iterable[str] = ()):
+        super().__init__(name, documentation, label_names)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def render(self) -> str:
+        with self._lock:
+            items = sorted(self._values.items())
+        return self.header() + ''.join(
+            f'{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}\n' for key, value in items
+        )
+
+
+class Gauge(_Metric):
+    """A value that can go up and down, or is read from `callback` at scrape time."""
+    kind = 'gauge'
+
+    def __init__(self, name: str, documentation: str, callback: Optional[Callable[[], float]] = None):
+        super().__init__(name, documentation)
+        self.callback = callback
+        self._value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount: float = 1.0):
+        self.inc(-amount)
+
+    def set(self, value: float):
+        self._value = value
+
+    def value(self) -> float:
+        return float(self.callback()) if self.callback is not None else self._value
+
+    def render(self) -> str:
+        return self.header() + f'{self.name} {_format_value(self.value())}\n'
+
+
+class Histogram(_Metric):
+    """Cumulative-bucket histogram, optionally split by labels."""
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, label_names: Iterable[str] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, label_names)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple[str, ...], list] = {}  # key -> [bucket counts..., sum, count]
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def count(self, **labels) -> int:
+        series = self._series.get(self._key(labels))
+        return series[-1] if series else 0
+
+    def render(self) -> str:
+        with self._lock:
+            items = sorted((key, list(series)) for key, series in self._series.items())
+        lines = [self.header()]
+        for key, series in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, series):
+                cumulative += bucket_count
+                labels = _format_labels(self.label_names, key, f'le="{_format_value(bound)}"')
+                lines.append(f'{self.name}_bucket{labels} {cumulative}\n')
+            labels = _format_labels(self.label_names, key, 'le="+Inf"')
+            lines.append(f'{self.name}_bucket{labels} {series[-1]}\n')
+            labels = _format_labels(self.label_names, key)
+            lines.append(f'{self.name}_sum{labels} {_format_value(series[-2])}\n')
+            lines.append(f'{self.name}_count{labels} {series[-1]}\n')
+        return ''.join(lines)
+
+
+class MetricsRegistry:
+    """Collects metrics and renders them in the Prometheus text exposition format."""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered.")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, label_names: Iterable[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, label_names))
+
+    def gauge(self, name: str, documentation: str, callback: Optional[Callable[[], float]] = None) -> Gauge:
+        return self.register(Gauge(name, documentation, callback))
+
+    def histogram(self, name: str, documentation: str, label_names: Iterable[str] = (),
+                  buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, label_names, buckets))
+
+    def render(self) -> str:
+        return ''.join(metric.render() for metric in self._metrics.values())
+
+
+class StageTimer:
+    """
+    Collects per-stage wall times inside a (possibly remote) executor call.
+
+    Stage functions fill one in and hand `timings` back with their result, so
+    the front end can record them even when the work ran in another process.
+    """
+
+    def __init__(self):
+        self.timings: Dict[str, float] = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = self.timings.get(name, 0.0) + time.perf_counter() - started
+
+
+registry = MetricsRegistry()
+
+stage_seconds = registry.histogram(
+    'fotoflow_stage_seconds', 'Time spent in each analysis stage.', ('stage',))
+request_seconds = registry.histogram(
+    'fotoflow_request_seconds', 'End-to-end handler latency.', ('endpoint',))
+outcomes = registry.counter(
+    'fotoflow_outcomes_total', 'Analysis outcomes (ok, no_person, decode_failure, error, rejected).',
+    ('endpoint', 'outcome'))
+in_flight_requests = registry.gauge(
+    'fotoflow_in_flight_requests', 'HTTP requests currently being handled.')
+batch_size = registry.histogram(
+    'fotoflow_batch_size', 'Requests coalesced into each micro-batched classifier call.',
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128))
+batch_wait_seconds = registry.histogram(
+    'fotoflow_batch_wait_seconds', 'Time a request waited for its micro-batch to be dispatched.',
+    buckets=(0.0005, 0.001, 0.002, 0.005, 0.01, 0.025, 0.05, 0.1))
+landmarker_runs = registry.counter(
+    'fotoflow_landmarker_runs_total', 'Pose landmarker runs per cascade variant.', ('variant',))
+landmarker_escalations = registry.counter(
+    'fotoflow_landmarker_escalations_total', 'Low-confidence poses retried on a heavier landmarker variant.',
+    ('from_variant', 'to_variant'))
@@ -0,0 +1,136 @@
+"""
+Preforking server for fast, memory-efficient scale-out (POSIX only).
+
+The master process imports the app and loads the classifier once, freezes
+the GC so those objects are never touched again, then forks uvicorn workers
+that all accept on one shared listening socket. Workers start serving
+without re-importing or reloading anything, and the model pages stay shared
+copy-on-write between them. MediaPipe landmarkers are only created inside
+the workers (during their warm-up), since its native threads don't survive
+fork(). Workers that die are replaced.
+
+Usage:
+    python -m app.serve --workers 4 --port 8000
+"""
+import argparse
+import gc
+import os
+import signal
+import socket
+import sys
+import time
+
+# A worker exiting faster than this after start is crashing, not finishing
+MIN_WORKER_LIFETIME = 1.0
+
+
+def bind_socket(host: str, port: int, backlog: int = 2048) -> socket.socket:
+    family = socket.AF_INET6 if ':' in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def preload():
+    """Everything worth sharing between workers: the app's imports and the classifier."""
+    from app.main import app
+    from utilities.model_registry import get_model_registry
+
+    get_model_registry().ensure_loaded()
+    # Move everything allocated so far out of the collector's reach, so GC passes
+    # in the workers don't write to (and un-share) these pages
+    gc.collect()
+    gc.freeze()
+    return app
+
+
+def _run_worker(app, sock: socket.socket, log_level: str):
+    import uvicorn
+
+    for sig in (signal.SIGTERM, signal.SIGINT, signal.SIGCHLD):
+        signal.signal(sig, signal.SIG_DFL)
+    config = uvicorn.Config(app, log_level=log_level, lifespan='on')
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+class Prefork:
+    """Forks and supervises `workers` uvicorn processes sharing one socket."""
+
+    def __init__(self, app, sock: socket.socket, workers: int, log_level: str = 'info'):
+        self.app = app
+        self.sock = sock
+        self.workers = workers
+        self.log_level = log_level
+        self.children = {}  # pid -> start time
+        self.stopping = False
+
+    def spawn(self):
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                _run_worker(self.app, self.sock, self.log_level)
+            except BaseException:
+                import traceback
+                traceback.print_exc()
+                code = 1
+            finally:
+                os._exit(code)
+        self.children[pid] = time.monotonic()
+        print(f"Started worker {pid}", file=sys.stderr)
+
+    def stop(self, signum=None, frame=None):
+        self.stopping = True
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        for _ in range(self.workers):
+            self.spawn()
+
+        while self.children:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            except InterruptedError:
+                continue
+            started = self.children.pop(pid, None)
+            if started is None or self.stopping:
+                continue
+            print(f"Worker {pid} exited with status {os.waitstatus_to_exitcode(status)}, replacing it",
+                  file=sys.stderr)
+            if time.monotonic() - started < MIN_WORKER_LIFETIME:
+                time.sleep(MIN_WORKER_LIFETIME)  # Don't spin on a worker that crashes at startup
+            self.spawn()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the FotoFlow API with preforked, pre-warmed workers.")
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="Worker processes to fork.")
+    parser.add_argument('--log-level', default='info')
+    args = parser.parse_args(argv)
+
+    if not hasattr(os, 'fork'):
+        raise SystemExit("app.serve needs fork(); use uvicorn directly on this platform.")
+
+    started = time.perf_counter()
+    app = preload()
+    sock = bind_socket(args.host, args.port)
+    print(f"Preloaded in {time.perf_counter() - started:.2f}s, forking {args.workers} workers "
+          f"on {args.host}:{args.port}", file=sys.stderr)
+    Prefork(app, sock, args.workers, args.log_level).run()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+import os
+from dataclasses import dataclass
+from typing import Optional
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.environ.get(name)
+    return int(value) if value else default
+
+
+@dataclass(frozen=True)
+class Settings:
+    """Service settings, read from FOTOFLOW_* environment variables."""
+    executor_kind: str = 'thread'  # 'thread' or 'process'
+    frame_transport: str = 'pickle'  # 'shm' hands process workers decoded frames through shared memory
+    frame_slot_mb: int = 8  # Largest frame (decoded RGB or raw) a shared-memory slot holds
+    frame_lease_seconds: float = 30.0  # Slots held longer than this are reclaimed as leaked
+    inference_workers: int = os.cpu_count() or 1
+    max_queue: int = 2 * (os.cpu_count() or 1)  # Requests allowed to wait beyond the busy workers
+    landmarker_pool_size: int = os.cpu_count() or 1  # PoseLandmarker instances per mode/model
+    cache_entries: int = 1024  # 0 disables the result cache
+    cache_mb: int = 64
+    cache_ttl: float = 300.0  # Seconds
+    cache_dir: Optional[str] = None  # Shared on-disk tier for multiple workers
+    cache_disk_mb: int = 256  # Size the on-disk tier is pruned back to
+    debug: bool = False  # Enables /debug endpoints
+    profile_sample_rate: float = 0.0  # Fraction of requests run under cProfile when debug is on
+    batch_max_size: int = 32  # Concurrent /prediction classifications per batch; 1 disables batching
+    batch_max_wait_ms: float = 2.0  # Longest a request waits for its batch to fill
+    max_poses: int = 5  # People analyzed per image by /prediction/multi
+    warmup: bool = True  # Run a dummy inference at startup; /ready reports when it is done
+    landmark_store: Optional[str] = None  # Reference pose store searched by /similar-poses
+    latency_budget_ms: float = 250.0  # Default per-request budget for landmarker escalation; 0 = unlimited
+    landmarker_variants: Optional[str] = None  # 'lite=path,full=path,heavy=path', cheapest first
+    min_pose_confidence: float = 0.6  # Below this, escalate to the next landmarker variant
+
+    @classmethod
+    def from_env(cls) -> 'Settings':
+        workers = _env_int('FOTOFLOW_INFERENCE_WORKERS', cls.inference_workers)
+        return cls(
+            executor_kind=os.environ.get('FOTOFLOW_EXECUTOR', cls.executor_kind).lower(),
+            frame_transport=os.environ.get('FOTOFLOW_FRAME_TRANSPORT', cls.frame_transport).lower(),
+            frame_slot_mb=_env_int('FOTOFLOW_FRAME_SLOT_MB', cls.frame_slot_mb),
+            frame_lease_seconds=float(os.environ.get('FOTOFLOW_FRAME_LEASE_SECONDS') or cls.frame_lease_seconds),
+            inference_workers=workers,
+            max_queue=_env_int('FOTOFLOW_MAX_QUEUE', 2 * workers),
+            # One landmarker per inference thread is enough to never block on the pool
+            landmarker_pool_size=_env_int('FOTOFLOW_LANDMARKER_POOL_SIZE', workers),
+            cache_entries=_env_int('FOTOFLOW_CACHE_ENTRIES', cls.cache_entries),
+            cache_mb=_env_int('FOTOFLOW_CACHE_MB', cls.cache_mb),
+            cache_ttl=float(os.environ.get('FOTOFLOW_CACHE_TTL') or cls.cache_ttl),
+            cache_dir=os.environ.get('FOTOFLOW_CACHE_DIR') or None,
+            cache_disk_mb=_env_int('FOTOFLOW_CACHE_DISK_MB', cls.cache_disk_mb),
+            debug=os.environ.get('FOTOFLOW_DEBUG', '').lower() in ('1', 'true', 'yes'),
+            profile_sample_rate=float(os.environ.get('FOTOFLOW_PROFILE_SAMPLE_RATE') or 0.0),
+            batch_max_size=_env_int('FOTOFLOW_BATCH_MAX_SIZE', cls.batch_max_size),
+            batch_max_wait_ms=float(os.environ.get('FOTOFLOW_BATCH_MAX_WAIT_MS') or cls.batch_max_wait_ms),
+            max_poses=_env_int('FOTOFLOW_MAX_POSES', cls.max_poses),
+            warmup=os.environ.get('FOTOFLOW_WARMUP', '1').lower() not in ('0', 'false', 'no'),
+            landmark_store=os.environ.get('FOTOFLOW_LANDMARK_STORE') or None,
+            latency_budget_ms=float(os.environ.get('FOTOFLOW_LATENCY_BUDGET_MS') or cls.latency_budget_ms),
+            landmarker_variants=os.environ.get('FOTOFLOW_LANDMARKER_VARIANTS') or None,
+            min_pose_confidence=float(os.environ.get('FOTOFLOW_MIN_POSE_CONFIDENCE') or cls.min_pose_confidence),
+        )
+
+
+settings = Settings.from_env()
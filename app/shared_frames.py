@@ -0,0 +1,210 @@
+# Zero-copy frame transport between the API process and process-pool
+# inference workers. The front end copies each decoded frame once into a
+# slot of a shared-memory ring and sends the workers a small FrameRef;
+# workers map the slot in place and send back only landmarks.
+import logging
+import threading
+import time
+import weakref
+from multiprocessing import shared_memory
+from typing import Dict, List, NamedTuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Every slot starts with a 64-byte header holding its current generation
+# (uint64), so a worker can tell whether the slot was reclaimed and reused
+# while it was reading.
+_HEADER_BYTES = 64
+
+
+class RingFull(Exception):
+    """Raised when every slot is leased; callers fall back to sending bytes."""
+
+
+class StaleFrame(Exception):
+    """Raised by a worker whose slot was reclaimed (and possibly rewritten) mid-read."""
+
+
+class FrameRef(NamedTuple):
+    """Picklable pointer to a frame in a shared-memory slot."""
+    segment: str
+    offset: int
+    generation: int
+    shape: tuple
+    dtype: str
+
+
+class FrameLease(NamedTuple):
+    """A slot checked out of the ring; hand it back with `SharedFrameRing.release`."""
+    slot: int
+    generation: int
+    acquired_at: float
+    owner: str
+
+
+class SharedFrameRing:
+    """
+    A fixed ring of `slots` shared-memory frame slots of `slot_bytes` each.
+
+    Lifecycle: `acquire` leases a free slot, `write` copies a frame into it
+    and returns the FrameRef to send to a worker, and `release` returns the
+    slot once the worker's result is back. Each lease bumps the slot's
+    generation, so a FrameRef from an earlier lease is detectably stale.
+
+    Leak detection: `reclaim_leaked(max_age)` takes back slots leased for
+    longer than `max_age` seconds (a handler that forgot to release, or a
+    worker that hung) and logs their owners. `close` reports slots still
+    leased and unlinks the segment; it also runs at interpreter exit, so a
+    crashed front end does not leave the segment behind in /dev/shm.
+    """
+
+    def __init__(self, slots: int, slot_bytes: int):
+        if slots < 1 or slot_bytes < 1:
+            raise ValueError("A frame ring needs at least one slot of at least one byte.")
+        self.slots = slots
+        self.slot_bytes = slot_bytes
+        self._stride = _HEADER_BYTES + slot_bytes
+        self._memory = shared_memory.SharedMemory(create=True, size=slots * self._stride)
+        self._headers = np.ndarray((slots,), dtype=np.uint64, buffer=self._memory.buf,
+                                   strides=(self._stride,))
+        self._headers[:] = 0
+        self._lock = threading.Lock()
+        self._free: List[int] = list(range(slots))
+        self._leases: Dict[int, FrameLease] = {}
+        self.leaked = 0
+        self._finalizer = weakref.finalize(self, _unlink, self._memory)
+
+    @property
+    def name(self) -> str:
+        return self._memory.name
+
+    @property
+    def in_use(self) -> int:
+        return len(self._leases)
+
+    def acquire(self, owner: str = '') -> FrameLease:
+        """Leases a free slot. Raises RingFull instead of waiting when none is free."""
+        with self._lock:
+            if not self._free:
+                raise RingFull(f"All {self.slots} frame slots are in use.")
+            slot = self._free.pop()
+            generation = int(self._headers[slot]) + 1
+            self._headers[slot] = generation
+            lease = FrameLease(slot, generation, time.monotonic(), owner)
+            self._leases[slot] = lease
+        return lease
+
+    def release(self, lease: FrameLease) -> bool:
+        """
+        Returns a leased slot to the ring. Returns False (and changes nothing)
+        for a lease that was already released or reclaimed.
+        """
+        with self._lock:
+            if self._leases.get(lease.slot) != lease:
+                return False
+            del self._leases[lease.slot]
+            self._free.append(lease.slot)
+        return True
+
+    def write(self, lease: FrameLease, frame: np.ndarray) -> FrameRef:
+        """Copies `frame` into the leased slot. Raises ValueError if it does not fit."""
+        if self._leases.get(lease.slot) != lease:
+            raise ValueError("Frame lease is no longer valid.")
+        frame = np.asarray(frame)
+        if frame.nbytes > self.slot_bytes:
+            raise ValueError(f"Frame of {frame.nbytes} bytes does not fit a {self.slot_bytes}-byte slot.")
+        offset = lease.slot * self._stride + _HEADER_BYTES
+        view = np.ndarray(frame.shape, dtype=frame.dtype, buffer=self._memory.buf, offset=offset)
+        view[...] = frame
+        return FrameRef(self.name, offset, lease.generation, frame.shape, frame.dtype.str)
+
+    def reclaim_leaked(self, max_age: float) -> List[FrameLease]:
+        """Takes back slots leased longer than `max_age` seconds ago; returns their leases."""
+        now = time.monotonic()
+        with self._lock:
+            leaked = [lease for lease in self._leases.values() if now - lease.acquired_at > max_age]
+            for lease in leaked:
+                del self._leases[lease.slot]
+                # Invalidate the stale FrameRef before the slot can be leased again
+                self._headers[lease.slot] = lease.generation + 1
+                self._free.append(lease.slot)
+            self.leaked += len(leaked)
+        for lease in leaked:
+            logger.warning("Reclaimed frame slot %d leased %.1fs ago by %s", lease.slot,
+                           now - lease.acquired_at, lease.owner or 'an unknown caller')
+        return leaked
+
+    def close(self):
+        """Releases the shared memory. Slots still leased are reported as leaks."""
+        if self._leases:
+            logger.warning("Closing frame ring with %d slots still leased: %s", len(self._leases),
+                           ', '.join(lease.owner or str(lease.slot) for lease in self._leases.values()))
+        self._headers = None
+        self._finalizer()
+
+
+def _unlink(memory: shared_memory.SharedMemory):
+    try:
+        memory.close()
+    except BufferError:
+        pass  # A view is still alive; the mapping goes away with the process
+    try:
+        memory.unlink()
+    except FileNotFoundError:
+        pass
+
+
+# Worker side: segments attached by this process, by name
+_attached: Dict[str, shared_memory.SharedMemory] = {}
+_attached_lock = threading.Lock()
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    memory = _attached.get(name)
+    if memory is None:
+        with _attached_lock:
+            memory = _attached.get(name)
+            if memory is None:
+                # Executor workers are spawned by the ring's owner and share its resource
+                # tracker, so attaching here doesn't hand the segment's cleanup to this process
+                memory = shared_memory.SharedMemory(name=name)
+                _attached[name] = memory
+    return memory
+
+
+def _generation(memory: shared_memory.SharedMemory, ref: FrameRef) -> int:
+    return int(np.ndarray((), dtype=np.uint64, buffer=memory.buf, offset=ref.offset - _HEADER_BYTES))
+
+
+class SharedFrame:
+    """
+    Worker-side, zero-copy view of a FrameRef, used as a context manager:
+
+        with SharedFrame(ref) as frame:
+            ...  # frame is a read-only ndarray over the slot
+
+    Raises StaleFrame on entry or exit if the slot was reclaimed meanwhile,
+    so results computed from a reused slot are never returned.
+    """
+
+    def __init__(self, ref: FrameRef):
+        self.ref = ref
+        self._memory = _attach(ref.segment)
+
+    def _check(self):
+        if _generation(self._memory, self.ref) != self.ref.generation:
+            raise StaleFrame(f"Frame slot at offset {self.ref.offset} was reclaimed.")
+
+    def __enter__(self) -> np.ndarray:
+        self._check()
+        frame = np.ndarray(self.ref.shape, dtype=np.dtype(self.ref.dtype), buffer=self._memory.buf,
+                           offset=self.ref.offset)
+        frame.flags.writeable = False
+        return frame
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self._check()
+        return False
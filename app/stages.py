@@ -0,0 +1,424 @@
+# CPU-bound request stages. These run on the inference executor, possibly in a
+# separate process, so they are plain module-level functions that take and
+# return picklable values.
+import cProfile
+import io
+import pstats
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple, Optional, Sequence
+import numpy as np
+from photography.composition import (
+    box_centers, composition_score, composition_scores, highlighted_points, thirds_points
+)
+from photography.leading_lines import LeadingLineDetector, get_person_bounding_box, get_person_bounding_boxes
+from utilities.images import read_image_for_inference, read_raw_frame
+from utilities.landmark_store import get_landmark_store
+from utilities.landmarker_cascade import (
+    DEFAULT_VARIANTS, CascadeResult, LatencyBudget, LandmarkerCascade, get_landmarker_cascade, parse_variants
+)
+from utilities.landmarks import NUM_FEATURES, is_empty
+from utilities.media_pipe import (
+    extract_all_landmarks, extract_pose_data, find_pose, get_landmarker_pool, set_landmarker_pool_size
+)
+from utilities.model_registry import get_model_registry
+from utilities.pose_classifier import get_gaze_direction, make_prediction_batch, make_prediction_data
+from app.graph import StageGraph
+from app.metrics import StageTimer
+from app.shared_frames import FrameRef, SharedFrame
+from app.settings import settings
+
+
+class StageOutput(NamedTuple):
+    """
+    What a stage function hands back to the front end.
+
+    `outcome` is 'ok', 'no_person' or 'decode_failure'; `timings` maps stage
+    names to seconds so they can be recorded in this process's metrics.
+    `landmarkers` lists the cascade variants that ran, in order, and
+    `budget_limited` marks results the latency budget kept from escalating,
+    which must not be cached for requests with a larger budget.
+    """
+    value: object
+    outcome: str
+    timings: dict
+    profile: Optional[str] = None
+    landmarkers: tuple = ()
+    budget_limited: bool = False
+
+
+def warm_worker():
+    """Executor initializer: load the classifier before the first request lands."""
+    set_landmarker_pool_size(settings.landmarker_pool_size)
+    get_model_registry().ensure_loaded()
+
+
+def landmarker_cascade() -> LandmarkerCascade:
+    """The configured cascade of installed landmarker variants (FOTOFLOW_LANDMARKER_VARIANTS)."""
+    variants = parse_variants(settings.landmarker_variants) if settings.landmarker_variants else DEFAULT_VARIANTS
+    return get_landmarker_cascade(variants, settings.min_pose_confidence)
+
+
+def warm_up(landmarkers: Optional[int] = None) -> StageOutput:
+    """
+    Dummy inference run at startup: classifies a zero vector and creates
+    `landmarkers` pooled landmarkers (default: the whole pool) of every
+    cascade variant, each with one blank detection. Raises if any stage
+    cannot be set up.
+    """
+    timer = StageTimer()
+    with timer.stage('classify'):
+        make_prediction_batch(np.zeros((1, NUM_FEATURES)))
+    warmed = 0
+    for name, path in landmarker_cascade().variants:
+        with timer.stage(f'landmarks_{name}'):
+            warmed += get_landmarker_pool('IMAGE', path).warm(landmarkers)
+    return StageOutput(warmed, 'ok', timer.timings)
+
+
+def _cascade_fields(result: Optional[CascadeResult]) -> dict:
+    """The StageOutput fields describing a cascade run (none for a run that never happened)."""
+    if result is None:
+        return {}
+    return {"landmarkers": result.tried, "budget_limited": result.budget_limited}
+
+
+def _extract(image_data: bytes, timer: StageTimer, budget: Optional[LatencyBudget]):
+    """Decode and cascade pose detection: (landmarks, original shape, outcome, CascadeResult or None)."""
+    with timer.stage('decode'):
+        decoded = read_image_for_inference(image_data)
+    if decoded is None:
+        return None, None, 'decode_failure', None
+    with timer.stage('landmarks'):
+        result = landmarker_cascade().run(decoded.rgb, budget or LatencyBudget(), timer)
+    outcome = 'ok' if result.landmarks is not None else 'no_person'
+    return result.landmarks, decoded.original_shape, outcome, result
+
+
+def extract_upload(image_data: bytes, budget: Optional[LatencyBudget] = None) -> StageOutput:
+    """
+    Decodes one uploaded image and extracts its pose, escalating to heavier
+    landmarker variants as `budget` allows.
+    The value is (PoseLandmarks, original image shape), or None if nothing was
+    found; landmarks are normalized, so they apply to the full-resolution
+    image unchanged.
+    """
+    timer = StageTimer()
+    landmarks, image_shape, outcome, cascade = _extract(image_data, timer, budget)
+    value = (landmarks, image_shape) if landmarks is not None else None
+    return StageOutput(value, outcome, timer.timings, **_cascade_fields(cascade))
+
+
+def decode_upload(image_data: bytes) -> StageOutput:
+    """Decodes an upload to its inference-size DecodedImage (None if it can't be decoded)."""
+    timer = StageTimer()
+    with timer.stage('decode'):
+        decoded = read_image_for_inference(image_data)
+    return StageOutput(decoded, 'ok' if decoded is not None else 'decode_failure', timer.timings)
+
+
+def extract_decoded(rgb: np.ndarray, image_shape, budget: Optional[LatencyBudget] = None) -> StageOutput:
+    """
+    extract_upload for an image the front end already decoded to its
+    inference-size RGB buffer. `image_shape` is the original image's shape.
+    """
+    timer = StageTimer()
+    with timer.stage('landmarks'):
+        result = landmarker_cascade().run(rgb, budget or LatencyBudget(), timer)
+    if result.landmarks is None:
+        return StageOutput(None, 'no_person', timer.timings, **_cascade_fields(result))
+    return StageOutput((result.landmarks, tuple(image_shape)), 'ok', timer.timings, **_cascade_fields(result))
+
+
+def extract_frame(frame: FrameRef, image_shape, budget: Optional[LatencyBudget] = None) -> StageOutput:
+    """
+    extract_decoded for a frame in a shared memory slot: the RGB buffer is
+    read in place, and only the landmarks travel back.
+    """
+    with SharedFrame(frame) as rgb:
+        return extract_decoded(rgb, image_shape, budget)
+
+
+def describe_pose(pose_data, image_shape, prediction, timer: StageTimer) -> dict:
+    """The /prediction response for a classified pose: prediction, bounding box and composition score."""
+    with timer.stage('bounding_box'):
+        bounding_box = get_person_bounding_box(pose_data, image_shape)
+    with timer.stage('composition'):
+        composition = composition_score(box_centers(bounding_box)[0], image_shape, prediction)
+    return {"prediction": prediction, "bounding_box": bounding_box, "composition": composition._asdict()}
+
+
+def predict_upload(image_data: bytes, budget: Optional[LatencyBudget] = None) -> StageOutput:
+    """
+    Runs decode, pose extraction, bounding box and classification for one upload.
+    The value is a dict with prediction, bounding box and composition score,
+    or None if no one was found.
+    """
+    timer = StageTimer()
+    pose_data, image_shape, outcome, cascade = _extract(image_data, timer, budget)
+    if pose_data is None:
+        return StageOutput(None, outcome, timer.timings, **_cascade_fields(cascade))
+    with timer.stage('classify'):
+        prediction = make_prediction_data(pose_data)
+    return StageOutput(describe_pose(pose_data, image_shape, prediction, timer), outcome, timer.timings,
+                       **_cascade_fields(cascade))
+
+
+def predict_people(image_data: bytes) -> StageOutput:
+    """
+    Runs decode and one multi-person pose pass, then boxes, classification
+    and composition for everyone found as single vectorized batches. The value
+    is a list with one dict per person (prediction, bounding box, composition),
+    or None if no one was found.
+    """
+    timer = StageTimer()
+    with timer.stage('decode'):
+        decoded = read_image_for_inference(image_data)
+    if decoded is None:
+        return StageOutput(None, 'decode_failure', timer.timings)
+    with timer.stage('landmarks'):
+        poses = extract_all_landmarks(decoded.rgb, settings.max_poses)
+    if is_empty(poses):
+        return StageOutput(None, 'no_person', timer.timings)
+
+    image_shape = decoded.original_shape
+    with timer.stage('bounding_box'):
+        boxes = get_person_bounding_boxes(poses, image_shape)
+    with timer.stage('classify'):
+        predictions = make_prediction_batch(poses)
+    with timer.stage('composition'):
+        scores = composition_scores(box_centers(boxes), image_shape, predictions)
+
+    people = []
+    for i, prediction in enumerate(predictions):
+        people.append({"prediction": prediction,
+                       "bounding_box": tuple(int(v) for v in boxes[i]),
+                       "composition": {"score": float(scores["score"][i]),
+                                       "thirds_distance": float(scores["thirds_distance"][i]),
+                                       "target_point": tuple(int(v) for v in scores["target_point"][i]),
+                                       "convergence_distance": None}
+                       })
+    return StageOutput(people, 'ok', timer.timings)
+
+
+def predict_raw(frame_data: bytes, width: int, height: int, pixel_format: str,
+                budget: Optional[LatencyBudget] = None) -> StageOutput:
+    """
+    Runs pose extraction, bounding box and classification on an uncompressed
+    preview frame (see read_raw_frame). The value is a dict with prediction,
+    label id, bounding box and float32 (33, 3) landmarks, or None if no one
+    was found; a frame that doesn't match its declared size is a decode failure.
+    """
+    timer = StageTimer()
+    with timer.stage('decode'):
+        try:
+            decoded = read_raw_frame(frame_data, width, height, pixel_format)
+        except ValueError:
+            return StageOutput(None, 'decode_failure', timer.timings)
+    with timer.stage('landmarks'):
+        result = landmarker_cascade().run(decoded.rgb, budget or LatencyBudget(), timer)
+    pose_data = result.landmarks
+    if pose_data is None:
+        return StageOutput(None, 'no_person', timer.timings, **_cascade_fields(result))
+    with timer.stage('bounding_box'):
+        bounding_box = get_person_bounding_box(pose_data, decoded.original_shape)
+    with timer.stage('classify'):
+        prediction = make_prediction_data(pose_data)
+    return StageOutput({"prediction": prediction,
+                        "label_id": get_model_registry().classes.index(prediction),
+                        "bounding_box": bounding_box,
+                        "landmarks": pose_data.xyz}, 'ok', timer.timings, **_cascade_fields(result))
+
+
+def predict_raw_shared(frame: FrameRef, width: int, height: int, pixel_format: str,
+                       budget: Optional[LatencyBudget] = None) -> StageOutput:
+    """predict_raw for frame bytes passed through a shared-memory slot instead of pickled."""
+    with SharedFrame(frame) as frame_data:
+        return predict_raw(frame_data, width, height, pixel_format, budget)
+
+
+def classify_batch(pose_batch) -> StageOutput:
+    """Classifies a list of optional poses in one call, see make_prediction_batch."""
+    timer = StageTimer()
+    with timer.stage('classify'):
+        predictions = make_prediction_batch(pose_batch)
+    return StageOutput(predictions, 'ok', timer.timings)
+
+
+def describe_batch(extracted) -> StageOutput:
+    """
+    classify_batch followed by describe_pose for a list of optional
+    (pose, image shape) pairs, so the geometry stays off the event loop.
+    The value has one /prediction dict per pair, or None where there is no pose.
+    """
+    timer = StageTimer()
+    extracted = [item or (None, None) for item in extracted]
+    with timer.stage('classify'):
+        predictions = make_prediction_batch([pose_data for pose_data, _ in extracted])
+    values = [describe_pose(pose_data, image_shape, prediction, timer) if prediction is not None else None
+              for (pose_data, image_shape), prediction in zip(extracted, predictions)]
+    return StageOutput(values, 'ok', timer.timings)
+
+
+def similar_poses(image_data: bytes, k: int, budget: Optional[LatencyBudget] = None) -> StageOutput:
+    """
+    Extracts the pose from one upload, escalating as `budget` allows, and
+    looks up the `k` closest reference poses in the FOTOFLOW_LANDMARK_STORE
+    store. The value is a list of dicts (row, distance, metadata), nearest
+    first, or None if no one was found.
+    """
+    timer = StageTimer()
+    pose_data, _, outcome, cascade = _extract(image_data, timer, budget)
+    if pose_data is None:
+        return StageOutput(None, outcome, timer.timings, **_cascade_fields(cascade))
+    with timer.stage('similarity'):
+        neighbors = get_landmark_store(settings.landmark_store).nearest(pose_data, k)
+    return StageOutput([neighbor._asdict() for neighbor in neighbors], outcome, timer.timings,
+                       **_cascade_fields(cascade))
+
+
+# /analyze: every stage reads the one decoded RGB buffer, and the pose branch
+# runs alongside edge detection; person boxes are masked out of the edges after
+analysis_graph = StageGraph()
+_line_detector = LeadingLineDetector()
+ANALYSIS_STAGES = ('pose', 'box', 'classify', 'head', 'lines', 'thirds')
+
+
+@analysis_graph.stage('decode', ['image_data'])
+def _decode_stage(image_data):
+    return read_image_for_inference(image_data)
+
+
+@analysis_graph.stage('gray', ['decode'])
+def _gray_stage(decoded):
+    return _line_detector.downscale(decoded.rgb, is_rgb=True)
+
+
+@analysis_graph.stage('edges', ['gray'])
+def _edges_stage(gray):
+    return _line_detector.canny(gray[0])
+
+
+@analysis_graph.stage('landmarks', ['decode', 'budget', 'timer'], optional=['budget', 'timer'])
+def _landmarks_stage(decoded, budget, timer):
+    return landmarker_cascade().run(decoded.rgb, budget or LatencyBudget(), timer)
+
+
+@analysis_graph.stage('pose', ['landmarks'])
+def _pose_stage(result):
+    return result.landmarks
+
+
+@analysis_graph.stage('box', ['pose', 'decode'])
+def _box_stage(pose_data, decoded):
+    return get_person_bounding_box(pose_data, decoded.original_shape)
+
+
+@analysis_graph.stage('classify', ['pose'])
+def _classify_stage(pose_data):
+    return make_prediction_data(pose_data)
+
+
+@analysis_graph.stage('head', ['pose'])
+def _head_stage(pose_data):
+    roll, yaw, pitch = find_pose(pose_data)
+    return {"head_angles": {"roll": float(roll), "yaw": float(yaw), "pitch": float(pitch)},
+            "gaze": get_gaze_direction(yaw)}
+
+
+@analysis_graph.stage('lines', ['edges', 'gray', 'decode', 'box'], optional=['box'])
+def _lines_stage(edges, gray, decoded, bounding_box):
+    # Boxes are in original pixels, the edges in pyramid-level pixels of the inference buffer
+    scale = gray[1]
+    edges = _line_detector.mask_edges(edges, [bounding_box] if bounding_box else (), scale * decoded.scale)
+    result = _line_detector.lines_from_edges(edges, scale, decoded.rgb.shape)
+    lines = decoded.to_original(result.lines)
+    convergence = decoded.to_original(result.convergence)
+    return {"lines": lines.reshape(-1, 4).tolist() if lines is not None else [],
+            "strengths": result.strengths.tolist(),
+            "convergence_point": tuple(int(v) for v in convergence) if convergence is not None else None}
+
+
+@analysis_graph.stage('thirds', ['decode', 'box', 'classify', 'lines'], optional=['box', 'classify', 'lines'])
+def _thirds_stage(decoded, bounding_box, prediction, lines):
+    image_shape = decoded.original_shape
+    convergence = lines["convergence_point"] if lines else None
+    posture = prediction or "forward"
+    result = {"points": thirds_points(*image_shape[:2]).tolist(),
+              "highlighted": list(highlighted_points(posture, image_shape, convergence)),
+              "composition": None}
+    if bounding_box is not None:
+        result["composition"] = composition_score(box_centers(bounding_box)[0], image_shape, prediction,
+                                                  convergence)._asdict()
+    return result
+
+
+_branch_pool = None
+_branch_pool_lock = threading.Lock()
+
+
+def _analysis_branch_pool() -> ThreadPoolExecutor:
+    """
+    Threads for the parallel /analyze branches (created on first use): two per
+    inference worker, so each analysis can run its pose and edge branches at once.
+    """
+    global _branch_pool
+    if _branch_pool is None:
+        with _branch_pool_lock:
+            if _branch_pool is None:
+                _branch_pool = ThreadPoolExecutor(max_workers=2 * settings.inference_workers,
+                                                  thread_name_prefix='analysis')
+    return _branch_pool
+
+
+def analyze(image_data: bytes, requested: Sequence[str] = ANALYSIS_STAGES,
+            budget: Optional[LatencyBudget] = None) -> StageOutput:
+    """
+    Runs the requested ANALYSIS_STAGES (and what they depend on) over one
+    upload with a single decode, see analysis_graph. The value is a dict with
+    one entry per requested stage, or None if the image could not be decoded;
+    coordinates refer to the full-resolution image.
+    """
+    timer = StageTimer()
+    values = analysis_graph.run(requested, {"image_data": image_data, "budget": budget, "timer": timer}, timer,
+                                _analysis_branch_pool())
+    decoded = values["decode"]
+    if decoded is None:
+        return StageOutput(None, 'decode_failure', timer.timings)
+
+    result = {"image_shape": list(decoded.original_shape[:2])}
+    cascade = values.get("landmarks")
+    if 'pose' in requested:
+        result["landmarks"] = values["pose"].tolist() if values["pose"] is not None else None
+        result["landmarker"] = {"variant": cascade.variant, "confidence": cascade.confidence}
+    if 'box' in requested:
+        result["bounding_box"] = values["box"]
+    if 'classify' in requested:
+        result["prediction"] = values["classify"]
+    if 'head' in requested:
+        result.update(values["head"] or {"head_angles": None, "gaze": None})
+    if 'lines' in requested:
+        result["leading_lines"] = values["lines"]
+    if 'thirds' in requested:
+        thirds = values["thirds"]
+        result["composition"] = thirds.pop("composition")
+        result["rule_thirds"] = thirds
+    outcome = 'no_person' if 'pose' in values and values["pose"] is None else 'ok'
+    return StageOutput(result, outcome, timer.timings, **_cascade_fields(cascade))
+
+
+def extract_path(image_name: str) -> StageOutput:
+    """Extracts pose data from an image on disk as a flattened list."""
+    timer = StageTimer()
+    with timer.stage('landmarks'):
+        pose_data = extract_pose_data(image_name)
+    return StageOutput(pose_data, 'ok' if pose_data else 'no_person', timer.timings)
+
+
+def profiled(fn, *args) -> StageOutput:
+    """Runs a stage function under cProfile and attaches the top entries to its output."""
+    profiler = cProfile.Profile()
+    output = profiler.runcall(fn, *args)
+    stream = io.StringIO()
+    pstats.Stats(profiler, stream=stream).sort_stats('cumulative').print_stats(25)
+    return output._replace(profile=stream.getvalue())
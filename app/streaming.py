@@ -0,0 +1,84 @@
+import time
+from typing import Dict, Optional
+
+from photography.composition import box_centers, composition_score
+from photography.leading_lines import detect_leading_lines, get_person_bounding_box
+from utilities.images import read_image_for_inference
+from utilities.media_pipe import DEFAULT_MODEL_ASSET_PATH, create_pose_landmarker, extract_landmarks, find_pose
+from utilities.pose_classifier import get_gaze_direction, make_prediction_data
+
+
+def _to_int_tuple(values) -> Optional[tuple]:
+    return tuple(int(v) for v in values) if values is not None else None
+
+
+class StreamSession:
+    """
+    Pose analysis state for one live frame stream.
+
+    Each session owns a VIDEO-mode landmarker, so MediaPipe can track the
+    person from frame to frame instead of re-detecting them, and feeds it
+    strictly increasing timestamps as that mode requires. A session processes
+    one frame at a time and must be closed when the stream ends.
+    """
+
+    def __init__(self, model_asset_path: str = DEFAULT_MODEL_ASSET_PATH):
+        self.model_asset_path = model_asset_path
+        self.frames_processed = 0
+        self._landmarker = None
+        self._started = time.monotonic()
+        self._last_timestamp_ms = -1
+
+    def _next_timestamp_ms(self) -> int:
+        timestamp_ms = int((time.monotonic() - self._started) * 1000)
+        # VIDEO mode rejects repeated timestamps, even for frames in the same ms
+        timestamp_ms = max(timestamp_ms, self._last_timestamp_ms + 1)
+        self._last_timestamp_ms = timestamp_ms
+        return timestamp_ms
+
+    def process_frame(self, frame_data: bytes) -> Dict:
+        """
+        Analyzes one encoded frame (JPEG/PNG bytes).
+        Coordinates in the result refer to the full-resolution frame.
+
+        :return: Dict with the prediction, bounding box, leading-line
+                 convergence point, head angles and composition score for the frame.
+        """
+        decoded = read_image_for_inference(frame_data)
+        if decoded is None:
+            return {"error": "Could not decode frame."}
+
+        if self._landmarker is None:
+            self._landmarker = create_pose_landmarker('VIDEO', self.model_asset_path)
+
+        timestamp_ms = self._next_timestamp_ms()
+        pose_data = extract_landmarks(decoded.rgb, running_mode='VIDEO', frame_count=timestamp_ms,
+                                      landmarker=self._landmarker)
+        self.frames_processed += 1
+        # Lines run on the same downscaled RGB buffer; map the result back to full size
+        _, circle_center, _ = detect_leading_lines(decoded.rgb, pose_data, is_rgb=True)
+
+        convergence_point = _to_int_tuple(decoded.to_original(circle_center))
+        result = {"timestamp_ms": timestamp_ms,
+                  "convergence_point": convergence_point}
+        if pose_data is None:
+            result["prediction"] = "No one found."
+            return result
+
+        roll, yaw, pitch = find_pose(pose_data)
+        prediction = make_prediction_data(pose_data)
+        bounding_box = get_person_bounding_box(pose_data, decoded.original_shape)
+        composition = composition_score(box_centers(bounding_box)[0], decoded.original_shape, prediction,
+                                        convergence_point)
+        result.update({"prediction": prediction,
+                       "bounding_box": bounding_box,
+                       "head_angles": {"roll": roll, "yaw": yaw, "pitch": pitch},
+                       "gaze": get_gaze_direction(yaw),
+                       "composition": composition._asdict()
+                       })
+        return result
+
+    def close(self):
+        if self._landmarker is not None:
+            self._landmarker.close()
+            self._landmarker = None
@@ -0,0 +1,114 @@
+# Compact response encodings for bandwidth-constrained clients, chosen with
+# the Accept header. JSON stays the default; msgpack is only offered when
+# the optional `msgpack` package is installed.
+import struct
+from typing import Optional, Sequence
+
+import numpy as np
+from fastapi import Response
+from fastapi.responses import JSONResponse
+
+from utilities.landmarks import NUM_LANDMARKS
+
+BINARY_MEDIA_TYPE = 'application/x-fotoflow-pose'
+MSGPACK_MEDIA_TYPE = 'application/msgpack'
+JSON_MEDIA_TYPE = 'application/json'
+
+# Binary layout, little-endian:
+#   magic    4s      b'FFP1'
+#   label    int16   index into /labels, -1 if no one was found
+#   count    uint16  number of landmarks that follow (0 or 33)
+#   box      4*int32 x, y, w, h in pixels (all -1 without a person)
+#   xyz      count*3 float32 normalized landmark coordinates
+BINARY_MAGIC = b'FFP1'
+_BINARY_HEADER = struct.Struct('<4shH4i')
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+def negotiate(accept: Optional[str]) -> str:
+    """
+    Picks the response media type from an Accept header.
+
+    Entries are taken by descending q value, then in header order; anything
+    not understood falls back to JSON.
+    """
+    if not accept:
+        return JSON_MEDIA_TYPE
+    offered = {BINARY_MEDIA_TYPE, JSON_MEDIA_TYPE}
+    if msgpack is not None:
+        offered.update({MSGPACK_MEDIA_TYPE, 'application/x-msgpack'})
+
+    candidates = []
+    for position, entry in enumerate(accept.split(',')):
+        media_type, *params = [part.strip() for part in entry.split(';')]
+        quality = 1.0
+        for param in params:
+            if param.startswith('q='):
+                try:
+                    quality = float(param[2:])
+                except ValueError:
+                    quality = 0.0
+        if quality > 0:
+            candidates.append((-quality, position, media_type.lower()))
+
+    for _, _, media_type in sorted(candidates):
+        if media_type in offered:
+            return MSGPACK_MEDIA_TYPE if 'msgpack' in media_type else media_type
+        if media_type in ('*/*', 'application/*'):
+            return JSON_MEDIA_TYPE
+    return JSON_MEDIA_TYPE
+
+
+def encode_binary(landmarks=None, bounding_box: Optional[Sequence[int]] = None, label_id: int = -1) -> bytes:
+    """Packs a pose result into the fixed binary layout above (420 bytes with a person, 24 without)."""
+    xyz = b''
+    count = 0
+    if landmarks is not None:
+        xyz = np.ascontiguousarray(landmarks, dtype='<f4').reshape(-1)
+        count = xyz.size // 3
+        if count != NUM_LANDMARKS:
+            raise ValueError(f"Expected {NUM_LANDMARKS} landmarks, got {count}")
+        xyz = xyz.tobytes()
+    box = tuple(bounding_box) if bounding_box is not None else (-1, -1, -1, -1)
+    return _BINARY_HEADER.pack(BINARY_MAGIC, label_id, count, *box) + xyz
+
+
+def decode_binary(payload: bytes) -> dict:
+    """Inverse of encode_binary, for clients and tests written in Python."""
+    magic, label_id, count, *box = _BINARY_HEADER.unpack_from(payload)
+    if magic != BINARY_MAGIC:
+        raise ValueError("Not a FotoFlow pose payload.")
+    landmarks = np.frombuffer(payload, '<f4', count * 3, _BINARY_HEADER.size).reshape(count, 3) if count else None
+    return {"label_id": label_id,
+            "bounding_box": tuple(box) if box[0] >= 0 else None,
+            "landmarks": landmarks
+            }
+
+
+def pose_response(media_type: str, landmarks=None, bounding_box=None, label_id: int = -1,
+                  extra: Optional[dict] = None) -> Response:
+    """
+    Encodes a pose result in the negotiated media type.
+
+    Binary carries only landmarks, box and label id. msgpack carries the same
+    fields with the landmarks as raw float32 bytes, plus `extra`. JSON
+    carries everything with the landmarks as a flat list.
+    """
+    headers = {'Vary': 'Accept'}
+    if media_type == BINARY_MEDIA_TYPE:
+        return Response(encode_binary(landmarks, bounding_box, label_id), media_type=media_type, headers=headers)
+
+    body = dict(extra or {})
+    body.update({"label_id": label_id, "bounding_box": list(bounding_box) if bounding_box is not None else None})
+    if media_type == MSGPACK_MEDIA_TYPE:
+        if landmarks is not None:
+            body["landmarks"] = np.ascontiguousarray(landmarks, dtype='<f4').tobytes()
+        return Response(msgpack.packb(body), media_type=media_type, headers=headers)
+
+    if landmarks is not None:
+        body["landmarks"] = np.asarray(landmarks, dtype=np.float32).reshape(-1).tolist()
+    return JSONResponse(body, headers=headers)
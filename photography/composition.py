@@ -0,0 +1,203 @@
+import numpy as np
+from functools import lru_cache
+from typing import NamedTuple, Optional, Tuple
+from cv2 import line, circle
+
+# Which rule-of-thirds intersections suit each posture, as indices into
+# thirds_points() order: top-left, top-right, bottom-left, bottom-right.
+# A subject turned left needs room on the right, so it belongs on the right thirds.
+_ALL_POINTS = (0, 1, 2, 3)
+POSTURE_TARGETS = {
+    "forward": _ALL_POINTS,
+    "backwards": _ALL_POINTS,
+    "skewed left": (1, 3),
+    "over shoulder left": (1, 3),
+    "skewed right": (0, 2),
+    "over shoulder right": (0, 2),
+}
+
+
+class OverlayStyle(NamedTuple):
+    """Look of the rule-of-thirds overlay. Colors are BGR."""
+    color: Tuple[int, int, int] = (0, 255, 0)
+    thickness: int = 1
+    circle_radius: int = 5
+
+
+DEFAULT_STYLE = OverlayStyle()
+
+
+class CompositionScore(NamedTuple):
+    """
+    Composition of one frame, with no pixels rendered.
+
+    `thirds_distance` is the distance from the subject to the nearest suitable
+    thirds intersection, as a fraction of the image diagonal, and
+    `target_point` that intersection in pixels. `convergence_distance` is the
+    same for the leading-line convergence point and the subject, or None
+    without lines. `score` folds both into [0, 1], higher is better.
+    """
+    score: float
+    thirds_distance: float
+    target_point: Tuple[int, int]
+    convergence_distance: Optional[float]
+
+
+def normalize_posture(posture: str) -> str:
+    """
+    Maps classifier labels and their variants ("skewed_left", "backward") to
+    the keys of POSTURE_TARGETS.
+    """
+    key = posture.strip().lower().replace('_', ' ')
+    if key == "backward":
+        key = "backwards"
+    if key not in POSTURE_TARGETS:
+        raise ValueError(f"Unknown posture: {posture}")
+    return key
+
+
+def thirds_points(height: int, width: int) -> np.ndarray:
+    """The four inner rule-of-thirds intersections as an int (4, 2) array of (x, y)."""
+    dx, dy = width // 3, height // 3
+    return np.array([(dx, dy), (2 * dx, dy), (dx, 2 * dy), (2 * dx, 2 * dy)])
+
+
+def highlighted_points(posture, image_shape, highlight_point=None) -> Tuple[int, ...]:
+    """
+    Indices of the intersections to draw large for `posture`.
+
+    Facing the camera (or away from it), that is the intersection closest to
+    `highlight_point`, if given; otherwise the pair on the side the subject
+    should be placed.
+    """
+    targets = POSTURE_TARGETS[normalize_posture(posture)]
+    if targets != _ALL_POINTS:
+        return targets
+    if highlight_point is None:
+        return ()
+    points = thirds_points(*image_shape[:2])
+    distances = np.hypot(*(points - np.asarray(highlight_point)).T)
+    return (int(np.argmin(distances)),)
+
+
+@lru_cache(maxsize=64)
+def _overlay_indices(height: int, width: int, style: OverlayStyle, highlighted: Tuple[int, ...]) -> np.ndarray:
+    """
+    Flat pixel indices covered by the overlay, rasterized once per
+    (resolution, style, highlighted intersections).
+    """
+    mask = np.zeros((height, width), np.uint8)
+    dx, dy = width // 3, height // 3
+    for x in (dx, 2 * dx):
+        line(mask, (x, 0), (x, height), 255, style.thickness)
+    for y in (dy, 2 * dy):
+        line(mask, (0, y), (width, y), 255, style.thickness)
+
+    # Facing postures show all four intersections (the nearest one enlarged),
+    # turned postures only the enlarged pair on the side the subject belongs
+    shown = _ALL_POINTS if len(highlighted) <= 1 else highlighted
+    points = thirds_points(height, width)
+    for i in shown:
+        radius = style.circle_radius * 2 if i in highlighted else style.circle_radius
+        circle(mask, (int(points[i][0]), int(points[i][1])), radius, 255, -1)
+
+    indices = np.flatnonzero(mask)
+    indices.flags.writeable = False
+    return indices
+
+
+def draw_rule_thirds(image, posture="forward", highlight_point=None, style: OverlayStyle = DEFAULT_STYLE,
+                     alpha: float = 1.0):
+    """
+    Blends the rule-of-thirds overlay onto a copy of `image`.
+
+    The overlay is rasterized once per resolution and style and cached as
+    pixel indices, so each frame costs one gather/scatter over the covered
+    pixels instead of redrawing lines and circles.
+
+    Args:
+        image: BGR image; it is not modified.
+        posture: Classifier posture label, selecting the highlighted intersections.
+        highlight_point: (x, y) whose nearest intersection is enlarged for forward/backwards postures.
+        style: Overlay color, line thickness and circle radius.
+        alpha: Overlay opacity in [0, 1].
+
+    Returns:
+        Tuple: (image with overlay, int (4, 2) array of the intersections)
+    """
+    height, width = image.shape[:2]
+    highlighted = highlighted_points(posture, image.shape, highlight_point)
+    indices = _overlay_indices(height, width, style, highlighted)
+
+    output = image.copy()
+    pixels = output.reshape(-1, output.shape[2] if output.ndim == 3 else 1)
+    color = np.asarray(style.color[:pixels.shape[1]], dtype=np.float32)
+    if alpha >= 1.0:
+        pixels[indices] = color.astype(output.dtype)
+    elif alpha > 0.0:
+        pixels[indices] = (pixels[indices] * (1.0 - alpha) + color * alpha).round().astype(output.dtype)
+    return output, thirds_points(height, width)
+
+
+def composition_scores(subjects, image_shape, postures=None, convergences=None):
+    """
+    Scores the placement of N subjects in one vectorized pass.
+
+    Args:
+        subjects: (N, 2) subject points (x, y) in pixels, e.g. bounding box centers.
+        image_shape: Shape of the image the points refer to.
+        postures: Optional sequence of N posture labels; restricts each subject to its suitable thirds.
+        convergences: Optional (N, 2) leading-line convergence points; NaN rows mean no lines.
+
+    Returns:
+        dict of arrays: score (N,), thirds_distance (N,), target_point (N, 2), convergence_distance (N,)
+        with NaN where there was no convergence point.
+    """
+    subjects = np.asarray(subjects, dtype=np.float64).reshape(-1, 2)
+    height, width = image_shape[:2]
+    diagonal = np.hypot(width, height)
+    points = thirds_points(height, width)
+
+    # (N, 4) distances from every subject to every intersection
+    distances = np.hypot(*(subjects[:, np.newaxis, :] - points[np.newaxis]).transpose(2, 0, 1)) / diagonal
+    if postures is not None:
+        allowed = np.zeros((len(subjects), 4), dtype=bool)
+        for i, posture in enumerate(postures):
+            allowed[i, list(POSTURE_TARGETS[normalize_posture(posture)])] = True
+        distances = np.where(allowed, distances, np.inf)
+    nearest = distances.argmin(axis=1)
+    thirds_distance = distances[np.arange(len(subjects)), nearest]
+
+    # Half the diagonal away from any intersection scores zero
+    thirds_score = np.clip(1.0 - thirds_distance / 0.5, 0.0, 1.0)
+    convergence_distance = np.full(len(subjects), np.nan)
+    score = thirds_score
+    if convergences is not None:
+        convergences = np.asarray(convergences, dtype=np.float64).reshape(-1, 2)
+        convergence_distance = np.hypot(*(convergences - subjects).T) / diagonal
+        convergence_score = np.clip(1.0 - convergence_distance / 0.5, 0.0, 1.0)
+        # Lines leading to the subject are a bonus; frames without lines keep the thirds score
+        score = np.where(np.isnan(convergence_distance), thirds_score,
+                         0.7 * thirds_score + 0.3 * np.nan_to_num(convergence_score))
+
+    return {"score": score,
+            "thirds_distance": thirds_distance,
+            "target_point": points[nearest],
+            "convergence_distance": convergence_distance}
+
+
+def composition_score(subject, image_shape, posture=None, convergence=None) -> CompositionScore:
+    """Scores a single subject point; see composition_scores."""
+    scores = composition_scores([subject], image_shape, None if posture is None else [posture],
+                                None if convergence is None else [convergence])
+    convergence_distance = float(scores["convergence_distance"][0])
+    return CompositionScore(float(scores["score"][0]),
+                            float(scores["thirds_distance"][0]),
+                            tuple(int(v) for v in scores["target_point"][0]),
+                            None if np.isnan(convergence_distance) else convergence_distance)
+
+
+def box_centers(boxes) -> np.ndarray:
+    """Centers of (x, y, w, h) boxes as a float (N, 2) array."""
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    return boxes[:, :2] + boxes[:, 2:] / 2
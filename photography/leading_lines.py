@@ -1,69 +1,236 @@
 import numpy as np
+from typing import NamedTuple, Optional, Sequence, Tuple
 from cv2 import (
-    cvtColor, equalizeHist, GaussianBlur, rectangle, bitwise_and,
-    Canny, HoughLinesP, line, circle, COLOR_BGR2GRAY
+    cvtColor, equalizeHist, GaussianBlur, rectangle, bitwise_and, pyrDown,
+    Canny, HoughLinesP, line, circle, COLOR_BGR2GRAY, COLOR_RGB2GRAY
 )
+from utilities.landmarks import as_landmark_array, is_empty
+
+def get_person_bounding_boxes(landmarks, image_shape):
+    """
+    Computes person bounding boxes for a batch of poses in one vectorized pass.
+
+    Args:
+        landmarks: Poses as PoseLandmarks or an array of shape (N, 33, 3) / (N, 99).
+        image_shape (tuple): Shape of the image the landmarks are normalized to.
+
+    Returns:
+        numpy array: Integer boxes of shape (N, 4) as (x, y, w, h).
+    """
+    xyz = as_landmark_array(landmarks)
+    if xyz.ndim == 2:
+        xyz = xyz[np.newaxis]
+
+    h, w = image_shape[:2]
+    x_coords = xyz[..., 0] * w  # Extract all x coordinates
+    y_coords = xyz[..., 1] * h  # Extract all y coordinates
+
+    # Compute bounding box with margin
+    x_min, x_max = x_coords.min(axis=1), x_coords.max(axis=1)
+    y_min, y_max = y_coords.min(axis=1), y_coords.max(axis=1)
+
+    margin_x = np.trunc((x_max - x_min) * 0.2)  # 20% margin
+    margin_y = np.trunc((y_max - y_min) * 0.1)  # 10% margin
+
+    x_min = np.maximum(0, np.trunc(x_min - margin_x)).astype(int)
+    x_max = np.minimum(w, np.trunc(x_max + margin_x)).astype(int)
+    y_min = np.maximum(0, np.trunc(y_min - margin_y)).astype(int)
+    y_max = np.minimum(h, np.trunc(y_max + margin_y)).astype(int)
+
+    return np.stack([x_min, y_min, x_max - x_min, y_max - y_min], axis=1)  # (x, y, w, h)
 
 def get_person_bounding_box(landmarks, image_shape):
     """Computes the bounding box of a person using pose landmarks."""
-    if not landmarks:
+    if is_empty(landmarks):
         return None  # No person detected
 
-    h, w, _ = image_shape
-    x_coords = np.array(landmarks[0::3]) * w  # Extract all x coordinates
-    y_coords = np.array(landmarks[1::3]) * h  # Extract all y coordinates
+    return tuple(int(v) for v in get_person_bounding_boxes(landmarks, image_shape)[0])  # (x, y, w, h)
 
-    # Compute bounding box with margin
-    x_min, x_max = np.min(x_coords), np.max(x_coords)
-    y_min, y_max = np.min(y_coords), np.max(y_coords)
-
-    margin_x = int((x_max - x_min) * 0.2)  # 20% margin
-    margin_y = int((y_max - y_min) * 0.1)  # 10% margin
+class LeadingLines(NamedTuple):
+    """
+    Result of LeadingLineDetector.detect, in full-resolution image coordinates.
 
-    x_min = max(0, int(x_min - margin_x))
-    x_max = min(w, int(x_max + margin_x))
-    y_min = max(0, int(y_min - margin_y))
-    y_max = min(h, int(y_max + margin_y))
+    `lines` keeps the HoughLinesP layout (K, 1, 4) of (x1, y1, x2, y2), or is
+    None when nothing was found. `strengths` holds one score in [0, 1] per
+    line (its length relative to the image diagonal). `convergence` is the
+    least-squares meeting point of the lines, clipped to the frame.
+    """
+    lines: Optional[np.ndarray]
+    strengths: np.ndarray
+    convergence: Optional[Tuple[int, int]]
 
-    return (x_min, y_min, x_max - x_min, y_max - y_min)  # (x, y, w, h)
 
-def detect_leading_lines(image, pose_landmarks=None):
+def least_squares_convergence(segments, weights=None):
     """
-    Detects leading lines in an image and calculates the convergence point.
+    Finds the point closest to all lines through the given segments.
+
+    Minimizes the weighted sum of squared perpendicular distances to each
+    (infinite) line, which is a 2x2 linear solve. Returns None when the lines
+    are (nearly) parallel and no single meeting point exists.
 
     Args:
-        image (numpy array): The input image.
-        pose_landmarks (list): List of pose landmarks for bounding box calculation.
+        segments (numpy array): Segments of shape (K, 4) as (x1, y1, x2, y2).
+        weights (numpy array): Optional per-segment weights of shape (K,).
 
     Returns:
-        tuple: (lines, circle_center, bounding_box)
+        numpy array or None: The (x, y) point as floats.
+    """
+    segments = np.asarray(segments, dtype=np.float64).reshape(-1, 4)
+    if len(segments) < 2:
+        return None
+    direction = segments[:, 2:] - segments[:, :2]
+    length = np.hypot(direction[:, 0], direction[:, 1])
+    valid = length > 0
+    if np.count_nonzero(valid) < 2:
+        return None
+    normal = np.stack([-direction[valid, 1], direction[valid, 0]], axis=1) / length[valid, np.newaxis]
+    w = np.ones(len(normal)) if weights is None else np.asarray(weights, dtype=np.float64)[valid]
+
+    # Sum of w * n n^T and w * n n^T p over all lines
+    outer = normal[:, :, np.newaxis] * normal[:, np.newaxis, :] * w[:, np.newaxis, np.newaxis]
+    A = outer.sum(axis=0)
+    b = np.einsum('kij,kj->i', outer, segments[valid, :2])
+
+    # Near-singular A means all lines point the same way
+    eigenvalues = np.linalg.eigvalsh(A)
+    if eigenvalues[0] <= 1e-3 * eigenvalues[1]:
+        return None
+    return np.linalg.solve(A, b)
+
+
+class LeadingLineDetector:
+    """
+    Leading-line detection on a downscaled pyramid level.
+
+    The frame is reduced with pyrDown until its long side fits `max_size`,
+    and the Hough thresholds (given in full-resolution pixels) are scaled down
+    with it. Person boxes are blanked before edge detection, and the edges
+    along the blanked boxes' borders are dropped, so subjects do not produce
+    lines. Results are mapped back to full resolution.
     """
-    hitbox = get_person_bounding_box(pose_landmarks, image.shape) if pose_landmarks else None
 
-    # Convert to grayscale and apply contrast enhancement
-    gray = cvtColor(image, COLOR_BGR2GRAY)
-    gray = equalizeHist(gray)
-    blurred = GaussianBlur(gray, (3, 3), 0)
+    def __init__(self, max_size=640, canny_low=50, canny_high=150,
+                 hough_threshold=50, min_line_length=50, max_line_gap=10):
+        self.max_size = max_size
+        self.canny_low = canny_low
+        self.canny_high = canny_high
+        self.hough_threshold = hough_threshold
+        self.min_line_length = min_line_length
+        self.max_line_gap = max_line_gap
+
+    def downscale(self, image, is_rgb=False):
+        """Returns the equalized grayscale pyramid level and its scale relative to `image`."""
+        gray = image if image.ndim == 2 else cvtColor(image, COLOR_RGB2GRAY if is_rgb else COLOR_BGR2GRAY)
+        scale = 1.0
+        while max(gray.shape[:2]) > self.max_size:
+            gray = pyrDown(gray)
+            scale /= 2
+        return equalizeHist(gray), scale
+
+    def canny(self, gray):
+        """Canny edges of a pyramid level, before any person is masked out."""
+        return Canny(GaussianBlur(gray, (3, 3), 0), self.canny_low, self.canny_high, apertureSize=3)
+
+    def mask_edges(self, edges, boxes=(), scale=1.0):
+        """
+        A copy of `edges` (from `canny`) with the given full-resolution boxes
+        cleared, for callers that run edge detection before the pose is known.
+        Approximates `edges`: strong gradients just outside a box can survive
+        the 2 px pad, so prefer `edges` when the boxes are known up front.
+        """
+        if not boxes:
+            return edges
+        edges = edges.copy()
+        pad = 2
+        for x, y, w, h in (tuple(int(round(v * scale)) for v in box) for box in boxes):
+            edges[max(0, y-pad):y+h+pad, max(0, x-pad):x+w+pad] = 0
+        return edges
+
+    def edges(self, gray, boxes=(), scale=1.0):
+        """Canny edges of a pyramid level with the given full-resolution boxes masked out."""
+        blurred = GaussianBlur(gray, (3, 3), 0)
+        scaled_boxes = [tuple(int(round(v * scale)) for v in box) for box in boxes]
+        for x, y, w, h in scaled_boxes:
+            blurred[y:y+h, x:x+w] = 0
+        edges = Canny(blurred, self.canny_low, self.canny_high, apertureSize=3)
+        # Blanking creates a hard border around each box; drop those artificial edges
+        pad = 2
+        for x, y, w, h in scaled_boxes:
+            edges[max(0, y-pad):y+h+pad, max(0, x-pad):x+w+pad] = 0
+        return edges
 
-    # Mask out the bounding box area if detected
-    if hitbox:
-        x, y, w, h = hitbox
-        blurred[y:y+h, x:x+w] = 0  # Directly zero out pixels instead of bitwise_and
+    def lines_from_edges(self, edges, scale, image_shape) -> LeadingLines:
+        """Runs the Hough transform on an edge map and maps the result to full resolution."""
+        lines = HoughLinesP(edges, 1, np.pi / 180,
+                            threshold=max(10, int(round(self.hough_threshold * scale))),
+                            minLineLength=max(8, int(round(self.min_line_length * scale))),
+                            maxLineGap=max(2, int(round(self.max_line_gap * scale))))
+        if lines is None or len(lines) == 0:
+            return LeadingLines(None, np.empty(0, np.float32), None)
 
-    # Canny edge detection
-    edges = Canny(blurred, 50, 150, apertureSize=3)
+        segments = lines[:, 0, :].astype(np.float64)
+        lengths = np.hypot(segments[:, 2] - segments[:, 0], segments[:, 3] - segments[:, 1])
+        diagonal = np.hypot(*edges.shape[:2])
+        strengths = np.clip(lengths / diagonal, 0, 1).astype(np.float32)
 
-    # Detect lines using Probabilistic Hough Transform
-    lines = HoughLinesP(edges, 1, np.pi / 180, threshold=50, minLineLength=50, maxLineGap=10)
+        h, w = image_shape[:2]
+        point = least_squares_convergence(segments, lengths)
+        if point is None:
+            # Parallel lines: fall back to the length-weighted centre of the segments
+            midpoints = (segments[:, :2] + segments[:, 2:]) / 2
+            point = (midpoints * lengths[:, np.newaxis]).sum(axis=0) / lengths.sum()
+        point = point / scale
+        convergence = (int(np.clip(point[0], 0, w - 1)), int(np.clip(point[1], 0, h - 1)))
 
-    # Compute the convergence point (center of detected lines)
-    if lines is not None and len(lines) > 0:
-        midpoints = np.mean(lines[:, 0, :2] + lines[:, 0, 2:], axis=0).astype(int)
-        circle_center = tuple(midpoints)
-    else:
-        circle_center = None
+        full_lines = np.round(lines / scale).astype(np.int32)
+        return LeadingLines(full_lines, strengths, convergence)
 
-    return lines, circle_center, hitbox
+    def detect(self, image, boxes: Sequence[Tuple[int, int, int, int]] = (), is_rgb=False) -> LeadingLines:
+        """
+        Detects leading lines in a full-resolution image.
+
+        Args:
+            image (numpy array): BGR (or RGB with `is_rgb`) or grayscale image.
+            boxes (list): Person boxes (x, y, w, h) to exclude, in image coordinates.
+            is_rgb (bool): True if `image` is RGB rather than BGR.
+        """
+        gray, scale = self.downscale(image, is_rgb)
+        return self.lines_from_edges(self.edges(gray, boxes, scale), scale, image.shape)
+
+
+_default_detector = LeadingLineDetector()
+
+def detect_leading_lines(image, pose_landmarks=None, is_rgb=False):
+    """
+    Detects leading lines in an image and calculates the convergence point.
+
+    Args:
+        image (numpy array): The input image.
+        pose_landmarks (PoseLandmarks or list): Pose landmarks of one person for bounding box
+            calculation; use detect_leading_lines_batch for several people.
+        is_rgb (bool): True if `image` is RGB (e.g. the shared inference buffer) rather than BGR.
+
+    Returns:
+        tuple: (lines, circle_center, bounding_box)
+    """
+    if not is_empty(pose_landmarks) and as_landmark_array(pose_landmarks).ndim == 3:
+        raise ValueError("detect_leading_lines takes one pose; use detect_leading_lines_batch for a batch.")
+    hitbox = get_person_bounding_box(pose_landmarks, image.shape)
+    result = _default_detector.detect(image, [hitbox] if hitbox else (), is_rgb)
+    return result.lines, result.convergence, hitbox
+
+def detect_leading_lines_batch(image, poses=None, is_rgb=False):
+    """
+    detect_leading_lines for a group shot: every person in `poses`
+    ((N, 33, 3) / (N, 99) or stacked PoseLandmarks) is masked out.
+
+    Returns:
+        tuple: (lines, circle_center, bounding_boxes), with one (x, y, w, h) box per pose
+    """
+    hitboxes = ([tuple(int(v) for v in box) for box in get_person_bounding_boxes(poses, image.shape)]
+                if not is_empty(poses) else [])
+    result = _default_detector.detect(image, hitboxes, is_rgb)
+    return result.lines, result.convergence, hitboxes
 
 def draw_detected_lines(image, lines, bounding_box=None, circle_center=None):
     """
@@ -72,7 +239,8 @@ def draw_detected_lines(image, lines, bounding_box=None, circle_center=None):
     Args:
         image (numpy array): The image to draw on.
         lines (list): List of detected lines.
-        bounding_box (tuple): Bounding box of the person (x, y, w, h).
+        bounding_box (tuple or list): Bounding box of the person (x, y, w, h), or a list of
+            boxes as returned by detect_leading_lines_batch.
         circle_center (tuple): Convergence point of leading lines.
 
     Returns:
@@ -85,9 +253,9 @@ def draw_detected_lines(image, lines, bounding_box=None, circle_center=None):
         for x1, y1, x2, y2 in lines[:, 0]:  # Efficiently unpack lines
             line(output_image, (x1, y1), (x2, y2), (0, 255, 0), 2)
 
-    # Draw bounding box if available
-    if bounding_box:
-        x, y, w, h = bounding_box
+    # Draw bounding boxes if available
+    boxes = bounding_box if isinstance(bounding_box, list) else [bounding_box] if bounding_box else []
+    for x, y, w, h in boxes:
         rectangle(output_image, (x, y), (x + w, y + h), (255, 0, 0), 2)  # Blue box
 
     # Draw the convergence circle
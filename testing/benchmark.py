@@ -0,0 +1,245 @@
+"""
+Reproducible latency benchmark for the analysis pipeline.
+
+Times each stage separately on the bundled test_pics at several resolutions,
+plus the full /prediction endpoint through an in-process ASGI client, and
+reports p50/p95/p99, throughput and peak RSS. Results are saved as JSON so a
+later run can be compared against them.
+
+Usage:
+    python -m testing.benchmark --output bench/baseline.json
+    python -m testing.benchmark --compare bench/baseline.json
+"""
+import argparse
+import asyncio
+import glob
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+
+# The result cache would turn repeated uploads into cache hits
+os.environ.setdefault('FOTOFLOW_CACHE_ENTRIES', '0')
+
+import cv2
+import numpy as np
+
+from photography.leading_lines import detect_leading_lines
+from photography.rule_thirds import get_rule_thirds
+from utilities.images import read_image_from_memory
+from utilities.media_pipe import extract_pose_data
+from utilities.pose_classifier import make_prediction_data
+
+DEFAULT_SCALES = (0.5, 1.0, 2.0)
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far, in MB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KB, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def summarize(latencies, wall_time):
+    """Latency percentiles (ms) and throughput for a list of per-call timings (s)."""
+    if not latencies:
+        return {"skipped": "no successful calls"}
+    ms = np.asarray(latencies) * 1000
+    return {"count": len(ms),
+            "mean_ms": float(ms.mean()),
+            "p50_ms": float(np.percentile(ms, 50)),
+            "p95_ms": float(np.percentile(ms, 95)),
+            "p99_ms": float(np.percentile(ms, 99)),
+            "throughput_per_s": len(ms) / wall_time if wall_time > 0 else 0.0,
+            "peak_rss_mb": peak_rss_mb()
+            }
+
+
+def time_calls(fn, inputs, iterations, warmup=2):
+    """Calls `fn` on each input `iterations` times after a warmup; returns the summary."""
+    for data in inputs[:warmup]:
+        fn(data)
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(iterations):
+        for data in inputs:
+            t0 = time.perf_counter()
+            fn(data)
+            latencies.append(time.perf_counter() - t0)
+    return summarize(latencies, time.perf_counter() - started)
+
+
+def load_images(pattern, scale):
+    """Loads the test pictures resized by `scale`, as (encoded JPEG bytes, BGR array) pairs."""
+    images = []
+    for path in sorted(glob.glob(pattern)):
+        bgr = cv2.imread(path)
+        if bgr is None:
+            continue
+        if scale != 1.0:
+            bgr = cv2.resize(bgr, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA if scale < 1 else cv2.INTER_LINEAR)
+        ok, encoded = cv2.imencode('.jpg', bgr, [cv2.IMWRITE_JPEG_QUALITY, 90])
+        if ok:
+            images.append((encoded.tobytes(), bgr))
+    return images
+
+
+def bench_stages(images, iterations):
+    encoded = [data for data, _ in images]
+    frames = [bgr for _, bgr in images]
+    results = {"read_image_from_memory": time_calls(read_image_from_memory, encoded, iterations)}
+
+    try:
+        results["extract_pose_data"] = time_calls(extract_pose_data, frames, iterations)
+        poses = [pose for pose in map(extract_pose_data, frames) if pose]
+    except Exception as e:
+        # Usually the MediaPipe .task model is not present on this machine
+        results["extract_pose_data"] = {"skipped": str(e)}
+        poses = []
+    if not poses:
+        with open('pose_data.txt') as f:
+            poses = [[float(v) for v in f.read().split(',')]]
+
+    results["make_prediction_data"] = time_calls(make_prediction_data, poses, iterations)
+    results["detect_leading_lines"] = time_calls(lambda frame: detect_leading_lines(frame, poses[0]), frames, iterations)
+    results["get_rule_thirds"] = time_calls(lambda frame: get_rule_thirds(frame, highlight_point=(10, 10)),
+                                            frames, iterations)
+    return results
+
+
+async def _bench_endpoint(encoded, iterations, concurrency):
+    import httpx
+    from app.main import app
+
+    latencies, errors = [], {}
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url='http://bench') as client:
+            async def post(data):
+                t0 = time.perf_counter()
+                response = await client.post('/prediction', files={'image': ('bench.jpg', data, 'image/jpeg')})
+                return response.status_code, time.perf_counter() - t0
+
+            for data in encoded[:2]:
+                await post(data)
+            jobs = [data for _ in range(iterations) for data in encoded]
+            semaphore = asyncio.Semaphore(concurrency)
+
+            async def limited(data):
+                async with semaphore:
+                    status, latency = await post(data)
+                if status < 400:
+                    latencies.append(latency)
+                else:
+                    # e.g. 503 when the concurrency exceeds the inference queue bound
+                    errors[status] = errors.get(status, 0) + 1
+
+            started = time.perf_counter()
+            await asyncio.gather(*(limited(data) for data in jobs))
+            wall_time = time.perf_counter() - started
+    summary = summarize(latencies, wall_time)
+    summary["errors"] = {str(status): count for status, count in errors.items()}
+    summary["error_rate"] = sum(errors.values()) / len(jobs)
+    return summary
+
+
+def bench_endpoint(images, iterations, concurrency):
+    try:
+        return asyncio.run(_bench_endpoint([data for data, _ in images], iterations, concurrency))
+    except Exception as e:
+        return {"skipped": str(e)}
+
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = None
+    return {"python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "numpy": np.__version__,
+            "opencv": cv2.__version__,
+            "commit": commit,
+            "timestamp": time.strftime('%Y-%m-%dT%H:%M:%S')
+            }
+
+
+def run(pattern, scales, iterations, concurrency):
+    report = {"environment": environment(), "results": {}}
+    for scale in scales:
+        images = load_images(pattern, scale)
+        if not images:
+            raise SystemExit(f"No images match {pattern}")
+        h, w = images[0][1].shape[:2]
+        label = f"{scale:g}x"
+        print(f"Benchmarking {len(images)} images at {label} (first is {w}x{h})...", file=sys.stderr)
+        results = bench_stages(images, iterations)
+        results["endpoint_prediction"] = bench_endpoint(images, iterations, concurrency)
+        report["results"][label] = results
+    return report
+
+
+def compare(report, baseline, threshold):
+    """Prints p50/p95 changes against a baseline. Returns True if any stage regressed."""
+    regressed = False
+    print(f"{'stage':<34}{'p50 ms':>10}{'base':>10}{'delta':>9}{'p95 ms':>10}{'base':>10}{'delta':>9}")
+    for label, results in report["results"].items():
+        for stage, stats in results.items():
+            base = baseline.get("results", {}).get(label, {}).get(stage)
+            if "skipped" in stats or not base or "skipped" in base:
+                continue
+            row = f"{label + ' ' + stage:<34}"
+            for key in ("p50_ms", "p95_ms"):
+                change = (stats[key] - base[key]) / base[key] if base[key] else 0.0
+                flag = '  !' if change > threshold else ''
+                regressed |= change > threshold
+                row += f"{stats[key]:>10.2f}{base[key]:>10.2f}{change:>+8.0%}{flag}"
+            print(row)
+    return regressed
+
+
+def print_report(report):
+    print(f"{'stage':<34}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'per s':>10}{'RSS MB':>10}")
+    for label, results in report["results"].items():
+        for stage, stats in results.items():
+            name = f"{label + ' ' + stage:<34}"
+            if "skipped" in stats:
+                print(f"{name}skipped: {stats['skipped']}")
+            else:
+                print(f"{name}{stats['p50_ms']:>10.2f}{stats['p95_ms']:>10.2f}{stats['p99_ms']:>10.2f}"
+                      f"{stats['throughput_per_s']:>10.1f}{stats['peak_rss_mb']:>10.0f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the pose analysis pipeline.")
+    parser.add_argument('--images', default='test_pics/*.jpeg', help="Glob of input images.")
+    parser.add_argument('--scales', type=float, nargs='+', default=DEFAULT_SCALES,
+                        help="Resolution multipliers applied to the input images.")
+    parser.add_argument('--iterations', type=int, default=10, help="Passes over the image set per stage.")
+    parser.add_argument('--concurrency', type=int, default=4, help="Concurrent requests for the endpoint benchmark.")
+    parser.add_argument('--output', help="Write the JSON report here.")
+    parser.add_argument('--compare', help="Baseline JSON report to compare against.")
+    parser.add_argument('--threshold', type=float, default=0.10, help="Relative slowdown counted as a regression.")
+    args = parser.parse_args(argv)
+
+    report = run(args.images, args.scales, args.iterations, args.concurrency)
+    print_report(report)
+
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(report, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
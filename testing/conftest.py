@@ -0,0 +1,36 @@
+import os
+
+# Settings are read once at import; keep the app from loading MediaPipe at startup
+# and from answering repeated uploads out of the result cache
+os.environ.setdefault('FOTOFLOW_WARMUP', '0')
+os.environ.setdefault('FOTOFLOW_CACHE_ENTRIES', '0')
+
+import numpy as np
+import pytest
+
+from utilities.landmarks import PoseLandmarks
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture(autouse=True)
+def repo_root(monkeypatch):
+    """Model and image paths are relative to the repository root."""
+    monkeypatch.chdir(REPO_ROOT)
+
+
+@pytest.fixture
+def pose():
+    """The reference pose in pose_data.txt as PoseLandmarks."""
+    with open(os.path.join(REPO_ROOT, 'pose_data.txt')) as f:
+        values = np.asarray([float(v) for v in f.read().split(',')], dtype=np.float32)
+    return PoseLandmarks(values.reshape(33, 3), np.ones(33, np.float32), np.ones(33, np.float32))
+
+
+@pytest.fixture
+def stub_landmarker(monkeypatch, pose):
+    """Replaces MediaPipe (and its .task models) with a landmarker that always finds `pose`."""
+    import utilities.landmarker_cascade as cascade
+
+    monkeypatch.setattr(cascade, 'extract_landmarks', lambda rgb, **kwargs: pose)
+    return pose
@@ -0,0 +1,344 @@
+"""
+Pipelined live camera client.
+
+Capture, inference and rendering run concurrently so camera I/O never waits
+on the model:
+
+    capture thread --> FrameRing (bounded, drops oldest) --> inference thread
+          |                                                       |
+          +--> latest frame ---------> render (main thread) <-- latest result
+
+Overlays are drawn on the newest captured frame from the newest completed
+analysis, with FPS and end-to-end latency (capture to result) on screen.
+The source can be a camera index, a video file or synthetic frames, and
+--headless skips the window so the pipeline can be benchmarked.
+
+Usage:
+    python -m testing.live                       # default camera
+    python -m testing.live --source clip.mp4 --headless --frames 300
+    python -m testing.live --source synthetic --headless --frames 300
+"""
+import argparse
+import logging
+import sys
+import threading
+import time
+from collections import deque
+from typing import NamedTuple, Optional
+
+import cv2
+import numpy as np
+
+from photography.leading_lines import draw_detected_lines
+from photography.rule_thirds import get_rule_thirds
+from utilities.video_analysis import FrameAnalysis, VideoAnalysisPipeline
+
+SYNTHETIC_SIZE = (640, 480)
+# Consecutive failed frames after which the inference thread gives up
+MAX_CONSECUTIVE_ERRORS = 30
+
+logger = logging.getLogger(__name__)
+
+
+class CapturedFrame(NamedTuple):
+    index: int
+    image: np.ndarray
+    captured_at: float  # time.perf_counter()
+
+
+class InferenceResult(NamedTuple):
+    analysis: FrameAnalysis
+    captured_at: float
+    completed_at: float
+
+
+class FrameRing:
+    """
+    Bounded frame buffer between capture and inference.
+
+    When full, `put` drops the oldest frame rather than blocking the camera,
+    so inference always works on recent frames.
+    """
+
+    def __init__(self, capacity=2):
+        self._frames = deque(maxlen=capacity)
+        self._condition = threading.Condition()
+        self._closed = False
+        self.dropped = 0
+
+    def put(self, frame: CapturedFrame):
+        with self._condition:
+            if len(self._frames) == self._frames.maxlen:
+                self.dropped += 1
+            self._frames.append(frame)
+            self._condition.notify()
+
+    def get(self, timeout=None) -> Optional[CapturedFrame]:
+        """Oldest buffered frame; None once closed and drained, or on timeout."""
+        with self._condition:
+            if not self._condition.wait_for(lambda: self._frames or self._closed, timeout):
+                return None
+            return self._frames.popleft() if self._frames else None
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+
+class SyntheticSource:
+    """cv2.VideoCapture stand-in that draws a moving test pattern at `fps`."""
+
+    def __init__(self, size=SYNTHETIC_SIZE, fps=30.0):
+        self.width, self.height = size
+        self.interval = 1.0 / fps if fps else 0.0
+        self._index = 0
+        self._next_at = time.perf_counter()
+        # Static "background" lines for the leading-line detector
+        self._background = np.full((self.height, self.width, 3), 40, np.uint8)
+        for x in range(0, self.width, self.width // 8):
+            cv2.line(self._background, (x, self.height), (self.width // 2, self.height // 3), (200, 200, 200), 2)
+
+    def isOpened(self):
+        return True
+
+    def read(self):
+        if self.interval:
+            delay = self._next_at - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            self._next_at = max(self._next_at + self.interval, time.perf_counter())
+        frame = self._background.copy()
+        x = int((np.sin(self._index / 30.0) * 0.3 + 0.5) * self.width)
+        cv2.circle(frame, (x, self.height // 2), self.height // 8, (0, 180, 255), -1)
+        self._index += 1
+        return True, frame
+
+    def release(self):
+        pass
+
+
+def open_source(source, fps=30.0):
+    """Opens a camera index ("0"), a video file path or "synthetic"."""
+    if source == 'synthetic':
+        return SyntheticSource(fps=fps)
+    if source.isdigit():
+        cap = cv2.VideoCapture(int(source))
+        cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc('M', 'J', 'P', 'G'))
+        return cap
+    return cv2.VideoCapture(source)
+
+
+class LivePipeline:
+    """
+    Runs capture and inference threads; the caller renders from `latest_frame()` / `latest_result()`.
+
+    A frame the pipeline fails on is logged, counted in `errors` and skipped.
+    After `max_consecutive_errors` failures in a row the inference thread
+    stops everything and leaves the last exception in `error`.
+    """
+
+    def __init__(self, cap, pipeline: VideoAnalysisPipeline, buffer_size=2, mirror=False, max_frames=None,
+                 max_consecutive_errors=MAX_CONSECUTIVE_ERRORS):
+        self.cap = cap
+        self.pipeline = pipeline
+        self.mirror = mirror
+        self.max_frames = max_frames
+        self.max_consecutive_errors = max_consecutive_errors
+        self.ring = FrameRing(buffer_size)
+        self.stopped = threading.Event()
+        self.captured = 0
+        self.inferred = 0
+        self.errors = 0
+        self.error: Optional[BaseException] = None
+        self.latencies = []
+        self._lock = threading.Lock()
+        self._latest_frame: Optional[CapturedFrame] = None
+        self._latest_result: Optional[InferenceResult] = None
+        self._threads = [threading.Thread(target=self._capture_loop, name='capture', daemon=True),
+                         threading.Thread(target=self._inference_loop, name='inference', daemon=True)]
+
+    def start(self):
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+        self.ring.close()
+        for thread in self._threads:
+            thread.join()
+
+    @property
+    def finished(self):
+        """True once the source has ended and every buffered frame was analyzed."""
+        return not any(thread.is_alive() for thread in self._threads)
+
+    def latest_frame(self) -> Optional[CapturedFrame]:
+        with self._lock:
+            return self._latest_frame
+
+    def latest_result(self) -> Optional[InferenceResult]:
+        with self._lock:
+            return self._latest_result
+
+    def _capture_loop(self):
+        try:
+            while not self.stopped.is_set():
+                if self.max_frames is not None and self.captured >= self.max_frames:
+                    break
+                ret, image = self.cap.read()
+                if not ret:
+                    break
+                if self.mirror:
+                    image = cv2.flip(image, 1)
+                frame = CapturedFrame(self.captured, image, time.perf_counter())
+                self.captured += 1
+                with self._lock:
+                    self._latest_frame = frame
+                self.ring.put(frame)
+        finally:
+            self.ring.close()
+
+    def _inference_loop(self):
+        consecutive_errors = 0
+        while True:
+            frame = self.ring.get()
+            if frame is None:
+                break
+            timestamp_ms = int(frame.captured_at * 1000)
+            try:
+                analysis = self.pipeline.process(frame.image, timestamp_ms=timestamp_ms)
+            except Exception as e:
+                self.errors += 1
+                consecutive_errors += 1
+                logger.exception("Analysis failed on frame %d", frame.index)
+                if consecutive_errors >= self.max_consecutive_errors:
+                    self.error = e
+                    self.stopped.set()
+                    self.ring.close()
+                    break
+                continue
+            consecutive_errors = 0
+            completed_at = time.perf_counter()
+            self.inferred += 1
+            self.latencies.append(completed_at - frame.captured_at)
+            with self._lock:
+                self._latest_result = InferenceResult(analysis, frame.captured_at, completed_at)
+
+
+class RateMeter:
+    """Events per second over a sliding window."""
+
+    def __init__(self, window=1.0):
+        self.window = window
+        self._times = deque()
+
+    def tick(self, now=None):
+        now = time.perf_counter() if now is None else now
+        self._times.append(now)
+        while self._times and now - self._times[0] > self.window:
+            self._times.popleft()
+
+    @property
+    def rate(self):
+        if len(self._times) < 2:
+            return 0.0
+        span = self._times[-1] - self._times[0]
+        return (len(self._times) - 1) / span if span > 0 else 0.0
+
+
+def render(frame: CapturedFrame, result: Optional[InferenceResult], render_fps, inference_fps, dropped):
+    """Draws the latest analysis, FPS and latency on a copy of `frame`."""
+    output = frame.image
+    lines = [f"render {render_fps:5.1f} fps  inference {inference_fps:5.1f} fps  dropped {dropped}"]
+    if result is not None:
+        analysis = result.analysis
+        output = draw_detected_lines(output, analysis.lines, analysis.bounding_box, analysis.convergence)
+        if analysis.prediction is not None:
+            output, _ = get_rule_thirds(output, highlight_point=analysis.convergence, posture=analysis.prediction)
+            lines.append(f"pose: {analysis.prediction}  gaze: {analysis.gaze}")
+        latency_ms = (result.completed_at - result.captured_at) * 1000
+        age_ms = (time.perf_counter() - result.captured_at) * 1000
+        lines.append(f"latency {latency_ms:5.1f} ms  result age {age_ms:5.1f} ms")
+        lines.append(f"ran: {', '.join(analysis.recomputed) or '-'}")
+    else:
+        output = output.copy()
+    for i, text in enumerate(lines):
+        cv2.putText(output, text, (10, 30 + 30 * i), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2)
+    return output
+
+
+def summarize(live: LivePipeline, wall_time):
+    ms = np.asarray(live.latencies) * 1000 if live.latencies else np.zeros(1)
+    return {"captured": live.captured,
+            "inferred": live.inferred,
+            "errors": live.errors,
+            "dropped": live.ring.dropped,
+            "capture_fps": live.captured / wall_time if wall_time > 0 else 0.0,
+            "inference_fps": live.inferred / wall_time if wall_time > 0 else 0.0,
+            "latency_p50_ms": float(np.percentile(ms, 50)),
+            "latency_p95_ms": float(np.percentile(ms, 95)),
+            "stage_runs": dict(live.pipeline.stage_runs)
+            }
+
+
+def run(source='0', headless=False, max_frames=None, buffer_size=2, fps=30.0, mirror=None):
+    cap = open_source(source, fps)
+    if not cap.isOpened():
+        raise SystemExit(f"Error: Could not open {source}.")
+    if mirror is None:
+        mirror = source.isdigit()  # Mirror cameras like the original client
+
+    pipeline = VideoAnalysisPipeline()
+    live = LivePipeline(cap, pipeline, buffer_size, mirror, max_frames).start()
+    render_rate, inference_rate = RateMeter(), RateMeter()
+    last_inferred = 0
+    started = time.perf_counter()
+    try:
+        while not live.finished:
+            if live.inferred != last_inferred:
+                inference_rate.tick()
+                last_inferred = live.inferred
+            if headless:
+                time.sleep(0.005)
+                continue
+            frame = live.latest_frame()
+            if frame is not None:
+                render_rate.tick()
+                output = render(frame, live.latest_result(), render_rate.rate, inference_rate.rate, live.ring.dropped)
+                cv2.imshow('Video Feed', output)
+            if cv2.waitKey(1) & 0xFF == ord('q'):
+                break
+    except KeyboardInterrupt:
+        pass
+    finally:
+        live.stop()
+        wall_time = time.perf_counter() - started
+        pipeline.close()
+        cap.release()
+        if not headless:
+            cv2.destroyAllWindows()
+    if live.error is not None:
+        raise SystemExit(f"Error: Analysis failed on {live.max_consecutive_errors} frames in a row: {live.error}")
+    return summarize(live, wall_time)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Live pose and composition overlay with pipelined stages.")
+    parser.add_argument('--source', default='0', help="Camera index, video file, or 'synthetic'.")
+    parser.add_argument('--headless', action='store_true', help="Don't open a window; print statistics at the end.")
+    parser.add_argument('--frames', type=int, help="Stop after capturing this many frames.")
+    parser.add_argument('--buffer', type=int, default=2, help="Frames buffered between capture and inference.")
+    parser.add_argument('--fps', type=float, default=30.0, help="Frame rate of the synthetic source (0 = unpaced).")
+    args = parser.parse_args(argv)
+
+    if args.headless and args.frames is None and (args.source.isdigit() or args.source == 'synthetic'):
+        parser.error("--headless with a camera or synthetic source needs --frames")
+    stats = run(args.source, args.headless, args.frames, args.buffer, args.fps)
+    for key, value in stats.items():
+        print(f"{key}: {value:.1f}" if isinstance(value, float) else f"{key}: {value}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
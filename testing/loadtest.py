@@ -0,0 +1,580 @@
+"""
+Load generator and saturation sweep for the HTTP service.
+
+Starts the app locally with `app.serve` (or targets a running server with
+--url), replays the test_pics as /prediction uploads and /pose-data requests,
+and steps the offered load up until the service saturates. Load is either
+closed-loop (a fixed number of clients, each sending its next request when
+the last one returns) or open-loop (Poisson arrivals at a fixed rate; latency
+is measured from the scheduled send time, so a stalled server cannot hide
+its queueing delay by slowing the client down).
+
+Each step reports throughput, p50/p95/p99 latency, error rates by status,
+and the CPU use and RSS of every server process (master, workers and any
+process-pool executors), sampled from /proc. The knee of each sweep is the
+last step before latency or errors break the SLO, or throughput stops
+growing; its throughput divided by the cores the workers can use gives the
+sustainable requests per second per core. Reports are JSON, like
+testing.benchmark, so a later run can be compared against them.
+
+Usage:
+    python -m testing.loadtest --workers 1 2 4 --concurrency 1 2 4 8 16 32 --output bench/load.json
+    python -m testing.loadtest --rates 5 10 20 40 --env FOTOFLOW_EXECUTOR=process
+    python -m testing.loadtest --url http://127.0.0.1:8000 --concurrency 4 8 16
+    python -m testing.loadtest --compare bench/load.json
+"""
+import argparse
+import asyncio
+import glob
+import json
+import os
+import random
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+from typing import Dict, List, NamedTuple, Optional
+
+import numpy as np
+
+from testing.benchmark import environment
+
+DEFAULT_MIX = 'prediction=3,pose-data=1'
+# Past this many requests in flight an open-loop run counts new arrivals as dropped
+DEFAULT_MAX_IN_FLIGHT = 512
+# A step adding less throughput than this (relative) is past the knee
+MIN_THROUGHPUT_GAIN = 0.05
+PROC_SAMPLE_INTERVAL = 0.25
+
+
+class Request(NamedTuple):
+    endpoint: str
+    files: Optional[dict]
+    json: Optional[dict]
+
+
+class Result(NamedTuple):
+    endpoint: str
+    status: Optional[int]  # None when the request failed without a response
+    latency: float  # Seconds
+    error: Optional[str]
+
+
+def parse_mix(spec: str) -> Dict[str, float]:
+    """Parses 'prediction=3,pose-data=1' into endpoint weights."""
+    mix = {}
+    for entry in spec.split(','):
+        name, sep, weight = entry.strip().partition('=')
+        if name not in ('prediction', 'pose-data'):
+            raise ValueError(f"Unknown endpoint {name!r} in the request mix.")
+        mix[name] = float(weight) if sep else 1.0
+    if not any(weight > 0 for weight in mix.values()):
+        raise ValueError("The request mix needs a positive weight.")
+    return mix
+
+
+def build_requests(pattern: str, mix: Dict[str, float], count: int = 64, seed: int = 0) -> List[Request]:
+    """
+    A shuffled, repeating schedule of requests in the proportions of `mix`.
+    /pose-data sends the image path, which the server resolves relative to
+    its own working directory (the repository root for a local server).
+    """
+    paths = sorted(path for path in glob.glob(pattern) if os.path.isfile(path))
+    if not paths:
+        raise SystemExit(f"No images match {pattern}")
+    uploads = {}
+    for path in paths:
+        with open(path, 'rb') as f:
+            uploads[path] = f.read()
+
+    rng = random.Random(seed)
+    names = list(mix)
+    requests = []
+    for i, endpoint in enumerate(rng.choices(names, weights=[mix[name] for name in names], k=count)):
+        path = paths[i % len(paths)]
+        if endpoint == 'prediction':
+            files = {'image': (os.path.basename(path), uploads[path], 'image/jpeg')}
+            requests.append(Request('/prediction', files, None))
+        else:
+            requests.append(Request('/pose-data', None, {'image_name': path}))
+    return requests
+
+
+# ---------------------------------------------------------------- server processes
+
+def _read_stat(pid: int):
+    """(parent pid, CPU seconds used) of a process from /proc, or None if it is gone."""
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            stat = f.read()
+    except OSError:
+        return None
+    # The command name may contain spaces; the fields after it are fixed
+    fields = stat[stat.rindex(')') + 2:].split()
+    ticks = os.sysconf('SC_CLK_TCK')
+    return int(fields[1]), (int(fields[11]) + int(fields[12])) / ticks
+
+
+def _read_rss_mb(pid: int) -> Optional[float]:
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def descendants(root: int) -> Dict[int, int]:
+    """`root` and every process below it, mapped to their depth below `root`."""
+    children = {}
+    for entry in os.listdir('/proc'):
+        if entry.isdigit():
+            stat = _read_stat(int(entry))
+            if stat is not None:
+                children.setdefault(stat[0], []).append(int(entry))
+    depths, frontier = {root: 0}, [root]
+    while frontier:
+        pid = frontier.pop()
+        for child in children.get(pid, ()):
+            depths[child] = depths[pid] + 1
+            frontier.append(child)
+    return depths
+
+
+class ProcessSampler:
+    """
+    Samples CPU time and RSS of a server's process tree in a background
+    thread. `roles` names the processes by depth below the root, e.g.
+    ('master', 'worker', 'executor') for app.serve. Processes that appear
+    mid-step (replaced workers, lazily started pools) are picked up at the
+    next sample. Does nothing where /proc is unavailable.
+    """
+
+    def __init__(self, root: Optional[int], roles=('master', 'worker', 'executor'),
+                 interval: float = PROC_SAMPLE_INTERVAL):
+        self.root = root if root is not None and os.path.isdir('/proc') else None
+        self.roles = roles
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._samples = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        now = time.perf_counter()
+        for pid, depth in descendants(self.root).items():
+            stat = _read_stat(pid)
+            rss = _read_rss_mb(pid)
+            if stat is None or rss is None:
+                continue
+            with self._lock:
+                sample = self._samples.get(pid)
+                if sample is None:
+                    role = self.roles[min(depth, len(self.roles) - 1)]
+                    self._samples[pid] = {"role": role, "first": (now, stat[1]), "last": (now, stat[1]),
+                                          "rss_peak": rss, "rss_sum": rss, "count": 1}
+                else:
+                    sample["last"] = (now, stat[1])
+                    sample["rss_peak"] = max(sample["rss_peak"], rss)
+                    sample["rss_sum"] += rss
+                    sample["count"] += 1
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def start(self):
+        """Starts a new measurement window."""
+        if self.root is None:
+            return
+        with self._lock:
+            self._samples = {}
+        self._sample()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name='proc-sampler', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> Optional[List[dict]]:
+        """Ends the window; returns per-process CPU (% of one core) and RSS, or None without /proc."""
+        if self.root is None:
+            return None
+        self._stop.set()
+        self._thread.join()
+        self._sample()
+        processes = []
+        with self._lock:
+            for pid, sample in sorted(self._samples.items()):
+                (t0, cpu0), (t1, cpu1) = sample["first"], sample["last"]
+                processes.append({"pid": pid, "role": sample["role"],
+                                  "cpu_percent": 100 * (cpu1 - cpu0) / (t1 - t0) if t1 > t0 else 0.0,
+                                  "rss_mb_mean": sample["rss_sum"] / sample["count"],
+                                  "rss_mb_peak": sample["rss_peak"]})
+        return processes
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class LocalServer:
+    """
+    The app served by `app.serve` with `workers` preforked workers on a free
+    local port, as a context manager. `env` adds FOTOFLOW_* settings; the
+    result cache is off unless `env` turns it on, since a replayed image set
+    would otherwise measure cache hits.
+    """
+
+    def __init__(self, workers: int, env: Optional[Dict[str, str]] = None, startup_timeout: float = 120.0):
+        self.workers = workers
+        self.port = free_port()
+        self.url = f'http://127.0.0.1:{self.port}'
+        self.env = {**os.environ, 'FOTOFLOW_CACHE_ENTRIES': '0', **(env or {})}
+        self.startup_timeout = startup_timeout
+        self.process = None
+
+    def __enter__(self) -> 'LocalServer':
+        command = [sys.executable, '-m', 'app.serve', '--host', '127.0.0.1', '--port', str(self.port),
+                   '--workers', str(self.workers), '--log-level', 'warning']
+        self.process = subprocess.Popen(command, env=self.env)
+        try:
+            wait_until_up(self.url, self.startup_timeout, self.process)
+        except BaseException:
+            self.__exit__(None, None, None)
+            raise
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.process.poll() is None:
+            self.process.send_signal(signal.SIGTERM)
+            try:
+                self.process.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+        return False
+
+
+def wait_until_up(url: str, timeout: float, process: Optional[subprocess.Popen] = None):
+    """
+    Waits for /labels to answer. /ready is not used: it stays 503 when
+    landmarker warm-up fails, yet the server still serves requests.
+    """
+    import httpx
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise SystemExit(f"Server exited with status {process.returncode} during startup.")
+        try:
+            if httpx.get(f'{url}/labels', timeout=2).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.25)
+    raise SystemExit(f"Server at {url} did not come up within {timeout:.0f}s.")
+
+
+def readiness(url: str, timeout: float = 60.0) -> dict:
+    """The /ready body once warm-up has finished (or failed), so steps don't time the warm-up."""
+    import httpx
+
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            state = httpx.get(f'{url}/ready', timeout=5).json()
+        except (httpx.HTTPError, ValueError) as e:
+            return {"ready": False, "error": str(e)}
+        if state.get("ready") or state.get("warmup_seconds") is not None or time.monotonic() > deadline:
+            return state
+        time.sleep(0.25)
+
+
+# ---------------------------------------------------------------- load
+
+async def _send(client, request: Request, scheduled: float) -> Result:
+    try:
+        response = await client.post(request.endpoint, files=request.files, json=request.json)
+        status, error = response.status_code, None
+    except Exception as e:
+        status, error = None, type(e).__name__
+    return Result(request.endpoint, status, time.perf_counter() - scheduled, error)
+
+
+async def closed_loop(client, requests: List[Request], concurrency: int, duration: float) -> List[Result]:
+    """`concurrency` clients, each sending back to back for `duration` seconds."""
+    results = []
+    stop_at = time.perf_counter() + duration
+
+    async def user(offset):
+        i = offset
+        while time.perf_counter() < stop_at:
+            results.append(await _send(client, requests[i % len(requests)], time.perf_counter()))
+            i += concurrency
+
+    await asyncio.gather(*(user(i) for i in range(concurrency)))
+    return results
+
+
+async def open_loop(client, requests: List[Request], rate: float, duration: float,
+                    max_in_flight: int = DEFAULT_MAX_IN_FLIGHT, seed: int = 0) -> List[Result]:
+    """
+    Poisson arrivals at `rate` per second for `duration` seconds. Latency
+    counts from each request's scheduled time. Arrivals that find
+    `max_in_flight` requests outstanding are recorded as dropped.
+    """
+    rng = random.Random(seed)
+    results, tasks = [], set()
+
+    def done(task):
+        tasks.discard(task)
+        results.append(task.result())
+
+    started = time.perf_counter()
+    scheduled, i = started, 0
+    while True:
+        scheduled += rng.expovariate(rate)
+        if scheduled - started >= duration:
+            break
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        request = requests[i % len(requests)]
+        i += 1
+        if len(tasks) >= max_in_flight:
+            results.append(Result(request.endpoint, None, 0.0, 'dropped'))
+            continue
+        task = asyncio.ensure_future(_send(client, request, scheduled))
+        task.add_done_callback(done)
+        tasks.add(task)
+    if tasks:
+        await asyncio.wait(tasks)
+    return results
+
+
+def summarize(results: List[Result], wall_time: float) -> dict:
+    """Throughput, latency percentiles of successful requests (ms) and errors by status or exception."""
+    ok = np.asarray([result.latency for result in results if result.status is not None and result.status < 400])
+    errors = {}
+    for result in results:
+        if result.status is None or result.status >= 400:
+            key = str(result.status) if result.status is not None else result.error
+            errors[key] = errors.get(key, 0) + 1
+    summary = {"requests": len(results),
+               "ok": len(ok),
+               "throughput_per_s": len(ok) / wall_time if wall_time > 0 else 0.0,
+               "error_rate": sum(errors.values()) / len(results) if results else 0.0,
+               "errors": errors}
+    if len(ok):
+        ms = ok * 1000
+        summary.update({"mean_ms": float(ms.mean()),
+                        "p50_ms": float(np.percentile(ms, 50)),
+                        "p95_ms": float(np.percentile(ms, 95)),
+                        "p99_ms": float(np.percentile(ms, 99))})
+    endpoints = {}
+    for result in results:
+        counts = endpoints.setdefault(result.endpoint, {"requests": 0, "errors": 0})
+        counts["requests"] += 1
+        counts["errors"] += result.status is None or result.status >= 400
+    summary["endpoints"] = endpoints
+    return summary
+
+
+def _client_cpu_seconds() -> float:
+    usage = os.times()
+    return usage.user + usage.system
+
+
+async def run_step(url: str, requests: List[Request], mode: str, level: float, duration: float,
+                   timeout: float, max_in_flight: int, sampler: ProcessSampler) -> dict:
+    import httpx
+
+    connections = int(level) if mode == 'closed' else max_in_flight
+    limits = httpx.Limits(max_connections=connections, max_keepalive_connections=connections)
+    async with httpx.AsyncClient(base_url=url, timeout=timeout, limits=limits) as client:
+        # Opens the connections and lets any lazy per-worker setup happen outside the window
+        await asyncio.gather(*(_send(client, requests[i % len(requests)], time.perf_counter())
+                               for i in range(min(connections, 8))))
+        sampler.start()
+        cpu_started, started = _client_cpu_seconds(), time.perf_counter()
+        if mode == 'closed':
+            results = await closed_loop(client, requests, int(level), duration)
+        else:
+            results = await open_loop(client, requests, level, duration, max_in_flight)
+        wall_time = time.perf_counter() - started
+        client_cpu = _client_cpu_seconds() - cpu_started
+        processes = sampler.stop()
+
+    summary = summarize(results, wall_time)
+    summary["concurrency" if mode == 'closed' else "offered_rate_per_s"] = level
+    # A load generator near 100% of a core is measuring itself, not the server
+    summary["client_cpu_percent"] = 100 * client_cpu / wall_time
+    if processes is not None:
+        summary["processes"] = processes
+        workers = [p for p in processes if p["role"] == 'worker'] or processes
+        summary["server_cpu_percent"] = sum(p["cpu_percent"] for p in processes)
+        summary["server_rss_mb"] = sum(p["rss_mb_peak"] for p in processes)
+        summary["worker_cpu_percent"] = sum(p["cpu_percent"] for p in workers) / max(1, len(workers))
+    return summary
+
+
+def within_slo(step: dict, slo_ms: float, max_error_rate: float) -> bool:
+    return step["error_rate"] <= max_error_rate and step.get("p99_ms", float('inf')) <= slo_ms
+
+
+def find_knee(steps: List[dict], slo_ms: float, max_error_rate: float) -> Optional[int]:
+    """
+    Index of the last step before the SLO breaks or throughput stops growing
+    (by less than MIN_THROUGHPUT_GAIN), or None if even the first step breaks
+    the SLO.
+    """
+    knee = None
+    for i, step in enumerate(steps):
+        if not within_slo(step, slo_ms, max_error_rate):
+            break
+        if knee is not None and step["throughput_per_s"] < steps[knee]["throughput_per_s"] * (1 + MIN_THROUGHPUT_GAIN):
+            break
+        knee = i
+    return knee
+
+
+def sweep(url: str, requests: List[Request], mode: str, levels: List[float], args,
+          sampler: ProcessSampler) -> dict:
+    steps = []
+    for level in levels:
+        label = f"concurrency {level:g}" if mode == 'closed' else f"{level:g} req/s"
+        print(f"  {label} for {args.duration:g}s...", file=sys.stderr)
+        step = asyncio.run(run_step(url, requests, mode, level, args.duration, args.timeout,
+                                    args.max_in_flight, sampler))
+        steps.append(step)
+        if not args.full_sweep and not within_slo(step, args.slo_ms, args.max_error_rate):
+            break  # Saturated; heavier steps would only pile up more errors
+    knee = find_knee(steps, args.slo_ms, args.max_error_rate)
+    return {"steps": steps, "knee": knee,
+            "sustainable_rps": steps[knee]["throughput_per_s"] if knee is not None else 0.0}
+
+
+def run(args) -> dict:
+    mode = 'open' if args.rates else 'closed'
+    levels = args.rates or args.concurrency
+    requests = build_requests(args.images, parse_mix(args.mix))
+    env = dict(entry.split('=', 1) for entry in args.env)
+    report = {"environment": environment(),
+              "config": {"mode": mode, "levels": levels, "duration_s": args.duration, "mix": args.mix,
+                         "images": args.images, "slo_p99_ms": args.slo_ms, "max_error_rate": args.max_error_rate,
+                         "env": env, "url": args.url},
+              "results": {}}
+    cores = os.cpu_count() or 1
+
+    if args.url:
+        print(f"Load testing {args.url}...", file=sys.stderr)
+        result = sweep(args.url, requests, mode, levels, args, ProcessSampler(args.pid))
+        result["readiness"] = readiness(args.url)
+        report["results"]["remote"] = result
+        return report
+
+    for workers in args.workers:
+        print(f"Starting {workers} workers...", file=sys.stderr)
+        with LocalServer(workers, env) as server:
+            ready = readiness(server.url)
+            if not ready.get("ready"):
+                print(f"  warning: server is not ready ({ready}); results may not be representative",
+                      file=sys.stderr)
+            result = sweep(server.url, requests, mode, levels, args, ProcessSampler(server.process.pid))
+        result["readiness"] = ready
+        result["rps_per_core"] = result["sustainable_rps"] / min(workers, cores)
+        report["results"][f"workers={workers}"] = result
+    return report
+
+
+def print_report(report):
+    mode = report["config"]["mode"]
+    level_key, level_name = ("concurrency", 'conc') if mode == 'closed' else ("offered_rate_per_s", 'rate')
+    print(f"{'':<12}{level_name:>6}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'errors':>8}"
+          f"{'srv CPU%':>10}{'wkr CPU%':>10}{'RSS MB':>8}{'cli CPU%':>10}")
+    for label, result in report["results"].items():
+        for i, step in enumerate(result["steps"]):
+            row = f"{label if i == 0 else '':<12}{step[level_key]:>6g}{step['throughput_per_s']:>9.1f}"
+            for key in ("p50_ms", "p95_ms", "p99_ms"):
+                row += f"{step[key]:>9.1f}" if key in step else f"{'-':>9}"
+            row += f"{step['error_rate']:>8.1%}"
+            for key, fmt in (("server_cpu_percent", '.0f'), ("worker_cpu_percent", '.0f'), ("server_rss_mb", '.0f')):
+                width = 8 if key == "server_rss_mb" else 10
+                row += f"{step[key]:>{width}{fmt}}" if key in step else f"{'-':>{width}}"
+            row += f"{step['client_cpu_percent']:>10.0f}"
+            print(row + ('  <- knee' if i == result["knee"] else ''))
+        line = f"{label}: sustainable {result['sustainable_rps']:.1f} req/s"
+        if "rps_per_core" in result:
+            line += f", {result['rps_per_core']:.1f} req/s per core"
+        print(line)
+
+
+def compare(report, baseline, threshold) -> bool:
+    """Prints sustainable throughput against a baseline. Returns True if any sweep regressed."""
+    regressed = False
+    print(f"{'':<14}{'req/s':>10}{'base':>10}{'delta':>9}")
+    for label, result in report["results"].items():
+        base = baseline.get("results", {}).get(label)
+        if not base:
+            continue
+        current, previous = result["sustainable_rps"], base["sustainable_rps"]
+        change = (current - previous) / previous if previous else 0.0
+        flag = '  !' if change < -threshold else ''
+        regressed |= change < -threshold
+        print(f"{label:<14}{current:>10.1f}{previous:>10.1f}{change:>+8.0%}{flag}")
+    return regressed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the FotoFlow API and find its saturation point.")
+    parser.add_argument('--url', help="Target a running server instead of starting one.")
+    parser.add_argument('--pid', type=int, help="Server process to sample CPU and RSS from, with --url.")
+    parser.add_argument('--workers', type=int, nargs='+', default=[1], help="Worker counts to sweep.")
+    parser.add_argument('--env', nargs='*', default=[], metavar='KEY=VALUE',
+                        help="Settings for the started server, e.g. FOTOFLOW_EXECUTOR=process.")
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 2, 4, 8, 16, 32],
+                        help="Closed-loop client counts to step through.")
+    parser.add_argument('--rates', type=float, nargs='+',
+                        help="Open-loop arrival rates (req/s) to step through instead of --concurrency.")
+    parser.add_argument('--duration', type=float, default=10.0, help="Seconds per step.")
+    parser.add_argument('--images', default='test_pics/*.jpeg', help="Glob of images to replay.")
+    parser.add_argument('--mix', default=DEFAULT_MIX, help="Endpoint weights, e.g. prediction=3,pose-data=1.")
+    parser.add_argument('--timeout', type=float, default=30.0, help="Per-request timeout in seconds.")
+    parser.add_argument('--max-in-flight', type=int, default=DEFAULT_MAX_IN_FLIGHT,
+                        help="Open-loop requests outstanding before new arrivals are dropped.")
+    parser.add_argument('--slo-ms', type=float, default=1000.0, help="p99 latency a sustainable step must meet.")
+    parser.add_argument('--max-error-rate', type=float, default=0.01,
+                        help="Error rate a sustainable step must stay under.")
+    parser.add_argument('--full-sweep', action='store_true', help="Keep stepping after the SLO breaks.")
+    parser.add_argument('--output', help="Write the JSON report here.")
+    parser.add_argument('--compare', help="Baseline JSON report to compare against.")
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help="Relative drop in sustainable throughput counted as a regression.")
+    args = parser.parse_args(argv)
+    if any('=' not in entry for entry in args.env):
+        parser.error("--env entries must be KEY=VALUE")
+    if not args.url and not hasattr(os, 'fork'):
+        parser.error("starting a local server needs app.serve (POSIX); start one yourself and pass --url")
+
+    report = run(args)
+    print_report(report)
+
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(report, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
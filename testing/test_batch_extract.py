@@ -0,0 +1,34 @@
+import numpy as np
+
+from utilities.batch_extract import ShardWriter
+from utilities.landmarks import NUM_FEATURES, NUM_LANDMARKS
+
+
+def _first_run(output_dir):
+    writer = ShardWriter(str(output_dir), shard_size=10)
+    writer.add('found.jpg', np.zeros(NUM_FEATURES), np.ones(NUM_LANDMARKS))
+    writer.add('nobody.jpg', None, None)
+    writer.add('broken.jpg', None, None, error="could not decode image")
+    writer.merge()
+
+
+def test_resume_retries_failed_images(tmp_path):
+    _first_run(tmp_path)
+    writer = ShardWriter(str(tmp_path), shard_size=10)
+    assert writer.completed_paths() == {'found.jpg', 'nobody.jpg'}
+    assert writer.completed_paths(retry_missing=True) == {'found.jpg'}
+    assert (tmp_path / 'failed.txt').read_text() == 'broken.jpg\n'
+    assert (tmp_path / 'missing.txt').read_text() == 'nobody.jpg\n'
+
+
+def test_retried_image_is_recorded_once(tmp_path):
+    _first_run(tmp_path)
+    writer = ShardWriter(str(tmp_path), shard_size=10)
+    writer.forget(['broken.jpg', 'nobody.jpg'])
+    writer.add('broken.jpg', np.zeros(NUM_FEATURES), np.ones(NUM_LANDMARKS))
+    writer.add('nobody.jpg', None, None)
+    assert writer.merge() == 2
+
+    assert (tmp_path / 'failed.txt').read_text() == ''
+    assert (tmp_path / 'missing.txt').read_text() == 'nobody.jpg\n'
+    assert (tmp_path / 'paths.txt').read_text().splitlines() == ['found.jpg', 'broken.jpg']
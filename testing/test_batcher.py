@@ -0,0 +1,81 @@
+import asyncio
+
+import pytest
+
+from app.batcher import MicroBatcher
+
+
+def test_concurrent_submits_share_a_batch():
+    calls = []
+
+    def double(items):
+        calls.append(list(items))
+        return [2 * item for item in items]
+
+    async def main():
+        batcher = MicroBatcher(double, max_batch=3, max_wait=0.01)
+        results = await asyncio.gather(*(batcher.submit(i) for i in range(5)))
+        await batcher.close()
+        return results
+
+    assert asyncio.run(main()) == [0, 2, 4, 6, 8]
+    # The first item finds the batcher idle and runs alone; the rest queue behind it
+    assert calls == [[0], [1, 2, 3], [4]]
+
+
+def test_batch_failure_reaches_every_caller():
+    def fail(items):
+        raise ValueError("bad batch")
+
+    async def main():
+        batcher = MicroBatcher(fail, max_batch=2, max_wait=0.01)
+        return await asyncio.gather(batcher.submit(1), batcher.submit(2), return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert all(isinstance(result, ValueError) for result in results)
+
+
+def test_wrong_result_count_is_an_error():
+    async def main():
+        batcher = MicroBatcher(lambda items: items + [None], max_batch=2, max_wait=0.01)
+        return await asyncio.gather(batcher.submit(1), batcher.submit(2), return_exceptions=True)
+
+    assert all(isinstance(result, RuntimeError) for result in asyncio.run(main()))
+
+
+def test_max_batch_must_be_positive():
+    with pytest.raises(ValueError):
+        MicroBatcher(lambda items: items, max_batch=0)
+
+
+def test_lone_item_does_not_wait_for_the_timer():
+    async def main():
+        batcher = MicroBatcher(lambda items: items, max_batch=32, max_wait=10.0)
+        return await asyncio.wait_for(batcher.submit(1), timeout=1.0)
+
+    assert asyncio.run(main()) == 1
+
+
+def test_queued_items_run_when_the_batch_ahead_finishes():
+    calls = []
+    release = None
+
+    async def runner(fn, items):
+        calls.append(list(items))
+        if len(calls) == 1:
+            await release.wait()
+        return fn(items)
+
+    async def main():
+        nonlocal release
+        release = asyncio.Event()
+        batcher = MicroBatcher(lambda items: items, max_batch=32, max_wait=10.0, runner=runner)
+        first = asyncio.ensure_future(batcher.submit(0))
+        await asyncio.sleep(0)
+        rest = asyncio.gather(*(batcher.submit(i) for i in range(1, 4)))
+        await asyncio.sleep(0.01)
+        release.set()
+        return await asyncio.wait_for(asyncio.gather(first, rest), timeout=1.0)
+
+    assert asyncio.run(main()) == [0, [1, 2, 3]]
+    assert calls == [[0], [1, 2, 3]]
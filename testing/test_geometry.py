@@ -0,0 +1,100 @@
+import numpy as np
+import pytest
+
+from photography.leading_lines import get_person_bounding_box, get_person_bounding_boxes
+from utilities.landmarks import PoseLandmarks
+from utilities.media_pipe import find_pitch, find_pose, find_roll, find_yaw
+
+
+# The per-landmark list formulas the vectorized helpers replaced, on flat (x, y, z) lists
+
+def _baseline_roll(landmarks):
+    return landmarks[3 * 3 + 1] - landmarks[6 * 3 + 1]
+
+
+def _baseline_yaw(landmarks):
+    left_eye, right_eye, nose_tip = landmarks[3 * 3], landmarks[6 * 3], landmarks[0]
+    return (nose_tip - left_eye) - (right_eye - nose_tip)
+
+
+def _baseline_pitch(landmarks):
+    eye_y = (landmarks[3 * 3 + 1] + landmarks[6 * 3 + 1]) / 2
+    mou_y = (landmarks[9 * 3 + 1] + landmarks[10 * 3 + 1]) / 2
+    e2n = eye_y - landmarks[1]
+    n2m = landmarks[1] - mou_y
+    return e2n / n2m if n2m != 0 else 0
+
+
+def _baseline_pose(landmarks):
+    LMx = np.array(landmarks[0:30:3])
+    LMy = np.array(landmarks[1:30:3])
+    dPx_eyes = max((LMx[3] - LMx[1]), 1)
+    angle = np.arctan((LMy[3] - LMy[1]) / dPx_eyes)
+    alpha, beta = np.cos(angle), np.sin(angle)
+    LMxr = alpha * LMx + beta * LMy
+    LMyr = -beta * LMx + alpha * LMy
+    dXtot = (LMxr[3] - LMxr[1] + LMxr[4] - LMxr[2]) / 2
+    dYtot = (LMyr[2] - LMyr[1] + LMyr[4] - LMyr[3]) / 2
+    dXnose = (LMxr[3] - LMxr[0] + LMxr[4] - LMxr[0]) / 2
+    dYnose = (LMyr[2] - LMyr[0] + LMyr[4] - LMyr[0]) / 2
+    yaw = (-90 + 90 / 0.5 * dXnose / dXtot) + 230 if dXtot != 0 else 0
+    pitch = (-90 + 90 / 0.5 * dYnose / dYtot) if dYtot != 0 else 0
+    return angle * 180 / np.pi, yaw, pitch
+
+
+def _baseline_bounding_box(landmarks, image_shape):
+    h, w, _ = image_shape
+    x_coords = np.array(landmarks[0::3]) * w
+    y_coords = np.array(landmarks[1::3]) * h
+    x_min, x_max = np.min(x_coords), np.max(x_coords)
+    y_min, y_max = np.min(y_coords), np.max(y_coords)
+    margin_x = int((x_max - x_min) * 0.2)
+    margin_y = int((y_max - y_min) * 0.1)
+    x_min = max(0, int(x_min - margin_x))
+    x_max = min(w, int(x_max + margin_x))
+    y_min = max(0, int(y_min - margin_y))
+    y_max = min(h, int(y_max + margin_y))
+    return x_min, y_min, x_max - x_min, y_max - y_min
+
+
+@pytest.fixture
+def poses(pose):
+    """The reference pose plus jittered copies, some pushed past the frame edges."""
+    rng = np.random.default_rng(0)
+    xyz = pose.xyz + rng.normal(0, 0.1, (64, 33, 3)).astype(np.float32)
+    return np.concatenate([pose.xyz[np.newaxis], xyz])
+
+
+def _flat(xyz):
+    return [float(v) for v in xyz.reshape(-1)]
+
+
+def test_head_angles_match_baseline(poses):
+    for xyz in poses:
+        flat = _flat(xyz)
+        assert find_roll(xyz) == pytest.approx(_baseline_roll(flat), abs=1e-6)
+        assert find_yaw(xyz) == pytest.approx(_baseline_yaw(flat), abs=1e-6)
+        assert find_pitch(xyz) == pytest.approx(_baseline_pitch(flat), rel=1e-4, abs=1e-6)
+        assert find_pose(flat) == pytest.approx(_baseline_pose(flat), rel=1e-4, abs=1e-4)
+
+
+def test_batched_head_angles_match_single_poses(poses):
+    rolls, yaws, pitches = find_pose(poses)
+    assert rolls.shape == yaws.shape == pitches.shape == (len(poses),)
+    for i, xyz in enumerate(poses):
+        assert (rolls[i], yaws[i], pitches[i]) == pytest.approx(find_pose(xyz), rel=1e-5, abs=1e-5)
+
+
+def test_bounding_boxes_match_baseline(poses):
+    image_shape = (480, 640, 3)
+    boxes = get_person_bounding_boxes(poses, image_shape)
+    assert boxes.shape == (len(poses), 4)
+    for xyz, box in zip(poses, boxes):
+        expected = _baseline_bounding_box(_flat(xyz), image_shape)
+        assert tuple(int(v) for v in box) == expected
+        assert get_person_bounding_box(PoseLandmarks(xyz, None, None), image_shape) == expected
+
+
+def test_no_pose_has_no_bounding_box():
+    assert get_person_bounding_box(None, (480, 640, 3)) is None
+    assert get_person_bounding_box([], (480, 640, 3)) is None
@@ -0,0 +1,73 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.graph import StageGraph
+
+
+def _sleeping_graph(calls):
+    graph = StageGraph()
+
+    def stage(name, deps, seconds, optional=()):
+        @graph.stage(name, deps, optional)
+        def run(*args):
+            calls.append(name)
+            time.sleep(seconds)
+            return name
+        return run
+
+    stage('decode', ['image'], 0.0)
+    stage('landmarks', ['decode'], 0.6)
+    stage('gray', ['decode'], 0.1)
+    stage('edges', ['gray'], 0.2)
+    stage('box', ['landmarks'], 0.0)
+    stage('lines', ['edges', 'box'], 0.0, optional=['box'])
+    return graph
+
+
+@pytest.mark.parametrize('targets', [['lines', 'box'], ['box', 'lines']])
+def test_independent_branches_overlap(targets):
+    graph = _sleeping_graph([])
+    with ThreadPoolExecutor(4) as pool:
+        started = time.perf_counter()
+        values = graph.run(targets, {'image': 'image'}, pool=pool)
+        elapsed = time.perf_counter() - started
+    assert values['lines'] == 'lines'
+    # The critical path is decode -> landmarks (0.6 s); gray -> edges (0.3 s) runs alongside
+    assert elapsed < 0.75
+
+
+def test_runs_sequentially_without_pool():
+    calls = []
+    values = _sleeping_graph(calls).run(['edges'], {'image': 'image'})
+    assert values['edges'] == 'edges'
+    assert calls == ['decode', 'gray', 'edges']
+
+
+def test_unrequested_optional_dep_is_not_planned():
+    calls = []
+    graph = _sleeping_graph(calls)
+    assert 'landmarks' not in graph.plan(['lines'], ['image'])
+    with ThreadPoolExecutor(4) as pool:
+        values = graph.run(['lines'], {'image': 'image'}, pool=pool)
+    assert values['box'] is None
+    assert 'landmarks' not in calls and 'box' not in calls
+
+
+def test_requested_optional_dep_is_planned_first():
+    order = _sleeping_graph([]).plan(['lines', 'box'], ['image'])
+    assert order.index('box') < order.index('lines')
+    assert order.index('landmarks') < order.index('box')
+
+
+def test_missing_required_dep_skips_stage():
+    graph = StageGraph()
+    graph.stage('decode', ['image'])(lambda image: None)
+    graph.stage('gray', ['decode'])(lambda decoded: pytest.fail("ran on a failed decode"))
+    assert graph.run(['gray'], {'image': b''})['gray'] is None
+
+
+def test_unknown_stage():
+    with pytest.raises(KeyError):
+        StageGraph().plan(['nope'])
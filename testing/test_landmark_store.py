@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+from utilities.landmark_store import LandmarkStore, normalize_poses
+
+
+@pytest.fixture
+def poses(pose):
+    """The reference pose jittered along a few directions, like a real pose collection."""
+    rng = np.random.default_rng(0)
+    directions = rng.normal(size=(4, 99))
+    weights = rng.normal(scale=0.02, size=(500, 4))
+    return (pose.xyz.reshape(-1) + weights @ directions).astype(np.float32)
+
+
+def test_normalization_ignores_position_and_scale(pose):
+    moved = pose.xyz.copy()
+    moved[:, :2] = moved[:, :2] * 0.5 + 0.2
+    assert np.allclose(normalize_poses(moved.reshape(-1)), normalize_poses(pose.xyz.reshape(-1)), atol=1e-5)
+
+
+def test_exact_and_indexed_search_agree(tmp_path, poses):
+    store = LandmarkStore(str(tmp_path), create=True)
+    store.append(poses, [{"i": i} for i in range(len(poses))])
+    exact = store.nearest(poses[42], k=5)
+    assert exact[0].row == 42 and exact[0].metadata == {"i": 42}
+
+    store.build_index(components=8)
+    indexed = store.nearest(poses[42], k=5, candidates=64)
+    assert [n.row for n in indexed] == [n.row for n in exact]
+
+
+def test_rows_appended_after_indexing_are_found(tmp_path, poses):
+    store = LandmarkStore(str(tmp_path), create=True)
+    store.append(poses[:400])
+    store.build_index(components=8)
+    store.append(poses[400:], [{"late": True}] * 100)
+
+    reopened = LandmarkStore(str(tmp_path))
+    assert len(reopened) == len(poses)
+    nearest = reopened.nearest(poses[450], k=1)[0]
+    assert nearest.row == 450 and nearest.metadata == {"late": True}
+
+
+def test_append_validates_input(tmp_path, poses):
+    store = LandmarkStore(str(tmp_path), create=True)
+    with pytest.raises(ValueError):
+        store.append(poses[:2], [{}])
+    bad = poses[:1].copy()
+    bad[0, 0] = np.nan
+    with pytest.raises(ValueError):
+        store.append(bad)
+    assert len(store) == 0
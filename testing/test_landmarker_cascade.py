@@ -0,0 +1,91 @@
+import asyncio
+
+import httpx
+import pytest
+
+import utilities.landmarker_cascade as cascade_module
+from utilities.landmarker_cascade import LandmarkerCascade, LatencyBudget
+from utilities.landmarks import PoseLandmarks
+from utilities.result_cache import ResultCache
+from testing.test_prediction import _jpeg
+
+
+@pytest.fixture
+def variants(monkeypatch, pose):
+    """A 'lite' landmarker that finds a weak pose and a 'full' one that finds a confident one."""
+    weak = PoseLandmarks(pose.xyz, pose.visibility * 0.2, pose.presence * 0.2)
+    runs = []
+
+    def landmarker(rgb, model_asset_path=None):
+        runs.append(model_asset_path)
+        return weak if model_asset_path == 'lite.task' else pose
+
+    monkeypatch.setattr(cascade_module, 'extract_landmarks', landmarker)
+    return runs
+
+
+def _cascade():
+    return LandmarkerCascade((('lite', 'lite.task'), ('full', 'full.task')))
+
+
+def test_cascade_escalates_a_weak_pose(variants):
+    result = _cascade().run(None)
+
+    assert result.tried == ('lite', 'full')
+    assert result.variant == 'full'
+    assert not result.budget_limited
+
+
+def test_cascade_stops_at_a_confident_pose(monkeypatch, pose):
+    monkeypatch.setattr(cascade_module, 'extract_landmarks', lambda rgb, **kwargs: pose)
+    result = _cascade().run(None)
+
+    assert result.tried == ('lite',)
+    assert not result.budget_limited
+
+
+def test_cascade_does_not_escalate_past_the_budget(variants):
+    result = _cascade().run(None, LatencyBudget.from_ms(1))
+
+    assert result.tried == ('lite',)
+    assert result.variant == 'lite'
+    assert result.budget_limited
+
+
+def test_cascade_does_not_escalate_when_overloaded(variants):
+    result = _cascade().run(None, LatencyBudget(load=1.0))
+
+    assert result.tried == ('lite',)
+    assert result.budget_limited
+
+
+def test_cascade_learns_variant_latency(variants):
+    cascade = _cascade()
+    cascade._observe('full', 10.0)
+
+    assert not cascade.affordable('full', LatencyBudget.from_ms(1000))
+    assert cascade.run(None, LatencyBudget.from_ms(1000)).tried == ('lite',)
+
+
+def test_budget_limited_results_are_not_cached(monkeypatch, variants):
+    from app import main, stages
+
+    monkeypatch.setattr(main, 'result_cache', ResultCache(max_entries=16))
+    monkeypatch.setattr(stages, 'landmarker_cascade', _cascade)
+
+    async def post(image_data, headers=None):
+        async with main.app.router.lifespan_context(main.app):
+            transport = httpx.ASGITransport(app=main.app)
+            async with httpx.AsyncClient(transport=transport, base_url='http://test') as client:
+                return await client.post('/prediction', headers=headers,
+                                         files={'image': ('test.jpg', image_data, 'image/jpeg')})
+
+    image_data = _jpeg()
+
+    assert asyncio.run(post(image_data, {'X-Latency-Budget-Ms': '1'})).status_code == 200
+    assert variants == ['lite.task']
+    # The rushed answer must not be served to a request that can afford the full cascade
+    assert asyncio.run(post(image_data)).status_code == 200
+    assert variants == ['lite.task', 'lite.task', 'full.task']
+    assert asyncio.run(post(image_data)).status_code == 200
+    assert len(variants) == 3
@@ -0,0 +1,79 @@
+import cv2
+import numpy as np
+import pytest
+
+from photography.leading_lines import (
+    LeadingLineDetector, detect_leading_lines, detect_leading_lines_batch, draw_detected_lines, least_squares_convergence
+)
+
+
+def _converging_lines(width=1280, height=960, point=(640, 320)):
+    """A dark frame with bright lines fanning out from `point` to the bottom edge."""
+    image = np.full((height, width, 3), 30, np.uint8)
+    for x in range(0, width + 1, width // 8):
+        cv2.line(image, (x, height - 1), point, (220, 220, 220), 4)
+    return image
+
+
+def test_convergence_of_lines_through_one_point():
+    point = np.array([100.0, 50.0])
+    directions = np.array([[10, 0], [0, 10], [7, 7], [-5, 9]])
+    segments = np.hstack([point + directions, point + 3 * directions])
+    assert least_squares_convergence(segments) == pytest.approx(point)
+
+
+def test_convergence_weights_favour_strong_lines():
+    # Two lines meet at (0, 0); a third, nearly parallel to the first, passes through (0, 10)
+    segments = [[-10, 0, 10, 0], [0, -10, 0, 10], [-10, 10, 10, 10.5]]
+    light = least_squares_convergence(segments, [100, 100, 1])
+    heavy = least_squares_convergence(segments, [1, 100, 100])
+    assert np.hypot(*light) < 1
+    assert heavy[1] > 5
+
+
+def test_convergence_needs_two_crossing_lines():
+    assert least_squares_convergence([[0, 0, 10, 10]]) is None
+    assert least_squares_convergence([[0, 0, 10, 0], [0, 5, 10, 5]]) is None
+    # Zero-length segments carry no direction
+    assert least_squares_convergence([[0, 0, 10, 0], [3, 3, 3, 3]]) is None
+
+
+def test_detector_downscales_large_frames():
+    detector = LeadingLineDetector(max_size=640)
+    gray, scale = detector.downscale(_converging_lines())
+    assert scale == 0.5
+    assert gray.shape == (480, 640)
+
+
+def test_downscaled_detection_matches_full_resolution():
+    image = _converging_lines()
+    full = LeadingLineDetector(max_size=2000).detect(image)
+    reduced = LeadingLineDetector(max_size=640).detect(image)
+
+    assert full.lines is not None and reduced.lines is not None
+    # Lines come back in full-resolution coordinates
+    assert reduced.lines[..., 0::2].max() > 640
+    assert np.hypot(reduced.convergence[0] - 640, reduced.convergence[1] - 320) < 16
+    assert np.hypot(full.convergence[0] - 640, full.convergence[1] - 320) < 8
+
+
+def test_person_box_is_excluded():
+    image = _converging_lines()
+    box = (0, 0, 1280, 960)
+    assert LeadingLineDetector().detect(image, [box]).lines is None
+
+
+def test_batch_detection_returns_a_box_per_person(pose):
+    image = _converging_lines()
+    poses = np.stack([pose.xyz, pose.xyz * 0.5])
+
+    lines, center, boxes = detect_leading_lines_batch(image, poses)
+    assert isinstance(boxes, list) and len(boxes) == 2
+    _, _, box = detect_leading_lines(image, pose)
+    assert box == boxes[0]
+    assert draw_detected_lines(image, lines, boxes, center).shape == image.shape
+    assert draw_detected_lines(image, lines, box, center).shape == image.shape
+
+    with pytest.raises(ValueError):
+        detect_leading_lines(image, poses)
+    assert detect_leading_lines_batch(image)[2] == []
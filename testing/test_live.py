@@ -0,0 +1,41 @@
+from testing.live import LivePipeline, SyntheticSource
+
+
+class FlakyPipeline:
+    """Stands in for VideoAnalysisPipeline; fails on the frames whose number is in `failing`."""
+
+    def __init__(self, failing):
+        self.failing = failing
+        self.calls = 0
+
+    def process(self, frame, timestamp_ms=None):
+        self.calls += 1
+        if self.calls in self.failing:
+            raise RuntimeError("landmarker crashed")
+        return self.calls
+
+
+def _run(pipeline, frames=10, **kwargs):
+    live = LivePipeline(SyntheticSource(fps=0), pipeline, buffer_size=frames, max_frames=frames, **kwargs).start()
+    for thread in live._threads:
+        thread.join(timeout=10)
+    return live
+
+
+def test_failed_frames_are_skipped():
+    live = _run(FlakyPipeline({2, 5}))
+
+    assert live.finished
+    assert live.errors == 2
+    assert live.inferred == 8
+    assert live.error is None
+    assert live.latest_result().analysis == 10
+
+
+def test_repeated_failures_stop_the_pipeline():
+    live = _run(FlakyPipeline(set(range(1, 100))), frames=50, max_consecutive_errors=3)
+
+    assert live.finished
+    assert live.errors == 3
+    assert live.inferred == 0
+    assert isinstance(live.error, RuntimeError)
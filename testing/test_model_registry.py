@@ -0,0 +1,114 @@
+import os
+import shutil
+
+import numpy as np
+import pytest
+
+from utilities.compiled_model import CompiledPoseClassifier, export, validation_set
+from utilities.model_registry import (
+    DEFAULT_ENCODER_PATH, DEFAULT_MODEL_PATH, DEFAULT_SCALER_PATH, ModelArtifacts, ModelRegistry
+)
+
+
+@pytest.fixture
+def artifacts(tmp_path):
+    """Copies of the shipped pickles, so tests can rewrite them."""
+    paths = [shutil.copy(path, tmp_path) for path in (DEFAULT_MODEL_PATH, DEFAULT_ENCODER_PATH, DEFAULT_SCALER_PATH)]
+    return ModelArtifacts(*paths)
+
+
+def _age(path, seconds):
+    """Moves `path`'s mtime `seconds` into the past."""
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns - int(seconds * 1e9)))
+
+
+def test_compiled_model_matches_sklearn(artifacts):
+    import joblib
+
+    compiled = CompiledPoseClassifier.load(export(*artifacts))
+    model, encoder, scaler = (joblib.load(path) for path in artifacts)
+    poses = validation_set(samples=5000)
+
+    scaled = scaler.transform(poses)
+    assert compiled.predict(poses) == encoder.inverse_transform(model.predict(scaled)).tolist()
+    assert np.array_equal(compiled.predict_proba(poses), model.predict_proba(scaled))
+
+
+def test_registry_prefers_current_export(artifacts):
+    for path in artifacts:
+        _age(path, 60)
+    export(*artifacts)
+    registry = ModelRegistry(artifacts, check_interval=None)
+    registry.load()
+    assert registry._loaded.sources == (artifacts.compiled_path,)
+
+
+def test_export_is_not_shared_across_encoders(artifacts):
+    for path in artifacts:
+        _age(path, 60)
+    export(*artifacts)
+    other = artifacts._replace(encoder_path=shutil.copy(artifacts.encoder_path,
+                                                        os.path.join(os.path.dirname(artifacts.encoder_path),
+                                                                     'label_encoder_other.pkl')))
+    _age(other.encoder_path, 60)
+    assert other.compiled_path != artifacts.compiled_path
+
+    registry = ModelRegistry(other, check_interval=None)
+    registry.load()
+    assert registry._loaded.sources == tuple(other)
+
+
+def test_registry_ignores_export_older_than_pickles(artifacts):
+    export(*artifacts)
+    _age(artifacts.compiled_path, 60)
+    registry = ModelRegistry(artifacts, check_interval=None)
+    registry.load()
+    assert registry._loaded.sources == tuple(artifacts)
+
+
+def test_retrained_pickles_replace_export(artifacts):
+    for path in artifacts:
+        _age(path, 60)
+    export(*artifacts)
+    registry = ModelRegistry(artifacts, check_interval=None)
+    registry.load()
+
+    # Retraining rewrites the pickles after the export was built
+    exported = os.stat(artifacts.compiled_path).st_mtime_ns
+    os.utime(artifacts.model_path, ns=(exported, exported + 10**9))
+    assert registry.reload_if_changed()
+    assert registry._loaded.sources == tuple(artifacts)
+
+
+def test_registry_survives_corrupt_artifact(artifacts, pose):
+    registry = ModelRegistry(artifacts, check_interval=0.0, prefer_compiled=False)
+    expected = registry.predict(pose.xyz.reshape(-1))
+
+    # A deploy leaves a truncated pickle behind
+    with open(artifacts.model_path, 'r+b') as f:
+        f.truncate(100)
+    assert registry.predict(pose.xyz.reshape(-1)) == expected
+    assert not registry.reload_if_changed()
+
+    # The next check after the deploy completes picks up the fixed file
+    shutil.copy(DEFAULT_MODEL_PATH, artifacts.model_path)
+    assert registry.reload_if_changed()
+    assert registry.predict(pose.xyz.reshape(-1)) == expected
+
+
+def test_registry_first_load_failure_raises(artifacts):
+    with open(artifacts.model_path, 'wb') as f:
+        f.write(b'corrupt')
+    with pytest.raises(Exception):
+        ModelRegistry(artifacts, prefer_compiled=False).load()
+
+
+def test_registry_version_changes_with_a_redeploy(artifacts):
+    registry = ModelRegistry(artifacts, check_interval=0)
+    version = registry.version()
+    assert registry.version() == version
+
+    stat = os.stat(artifacts.model_path)
+    os.utime(artifacts.model_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert registry.version() != version
@@ -0,0 +1,185 @@
+import asyncio
+import time
+
+import cv2
+import httpx
+import numpy as np
+
+from app import stages
+
+
+def _jpeg(width=320, height=240):
+    image = np.random.default_rng(0).integers(0, 255, (height, width, 3), dtype=np.uint8)
+    return cv2.imencode('.jpg', image)[1].tobytes()
+
+
+async def _post_prediction(image_data):
+    from app.main import app
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url='http://test') as client:
+            return await client.post('/prediction', files={'image': ('test.jpg', image_data, 'image/jpeg')})
+
+
+async def _post_batch(files, headers=None):
+    from app.main import app
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url='http://test') as client:
+            return await client.post('/prediction/batch', files=files, headers=headers)
+
+
+def test_prediction_decodes_upload_once(monkeypatch, stub_landmarker):
+    decodes = []
+    decode = stages.read_image_for_inference
+
+    def counting_decode(image_data):
+        decodes.append(len(image_data))
+        return decode(image_data)
+
+    monkeypatch.setattr(stages, 'read_image_for_inference', counting_decode)
+    response = asyncio.run(_post_prediction(_jpeg()))
+
+    assert response.status_code == 200
+    assert 'prediction' in response.json()
+    assert len(decodes) == 1
+
+
+def test_prediction_describes_pose_off_the_event_loop(monkeypatch, stub_landmarker):
+    import threading
+
+    threads = []
+    describe = stages.describe_pose
+
+    def recording_describe(*args):
+        threads.append(threading.current_thread())
+        return describe(*args)
+
+    monkeypatch.setattr(stages, 'describe_pose', recording_describe)
+    response = asyncio.run(_post_prediction(_jpeg()))
+
+    assert response.status_code == 200
+    assert 'prediction' in response.json()
+    assert threads and threading.main_thread() not in threads
+
+
+def test_prediction_rejects_undecodable_upload(stub_landmarker):
+    response = asyncio.run(_post_prediction(b'not an image'))
+    assert response.status_code == 400
+
+
+async def _post_analyze(image_data, requested):
+    from app.main import app
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url='http://test') as client:
+            return await client.post('/analyze', params={'stages': requested},
+                                     files={'image': ('test.jpg', image_data, 'image/jpeg')})
+
+
+def test_analyze_lines_alone_skips_pose(monkeypatch, stub_landmarker):
+    import utilities.landmarker_cascade as cascade
+
+    calls = []
+    monkeypatch.setattr(cascade, 'extract_landmarks', lambda rgb, **kwargs: calls.append(1) or stub_landmarker)
+    response = asyncio.run(_post_analyze(_jpeg(), 'lines'))
+
+    assert response.status_code == 200
+    assert 'leading_lines' in response.json()
+    assert calls == []
+
+    response = asyncio.run(_post_analyze(_jpeg(), 'box,lines'))
+    assert response.json()['bounding_box'] is not None
+    assert calls
+
+
+def test_prediction_batch_passes_latency_budget(monkeypatch, stub_landmarker):
+    budgets = []
+    extract = stages.extract_upload
+
+    def recording_extract(image_data, budget=None):
+        budgets.append(budget)
+        return extract(image_data, budget)
+
+    monkeypatch.setattr(stages, 'extract_upload', recording_extract)
+
+    files = [('images', (f'{i}.jpg', _jpeg(), 'image/jpeg')) for i in range(2)]
+    started = time.time()
+    response = asyncio.run(_post_batch(files, {'X-Latency-Budget-Ms': '100'}))
+    finished = time.time()
+    assert response.status_code == 200
+    assert len(budgets) == 2
+    assert all(started + 0.1 <= budget.deadline <= finished + 0.1 for budget in budgets)
+
+
+def test_similar_poses_passes_latency_budget(monkeypatch, stub_landmarker):
+    import dataclasses
+
+    from app import main
+
+    class EmptyStore:
+        def nearest(self, pose_data, k):
+            return []
+
+    budgets = []
+    extract = stages._extract
+
+    def recording_extract(image_data, timer, budget):
+        budgets.append(budget)
+        return extract(image_data, timer, budget)
+
+    monkeypatch.setattr(main, 'settings', dataclasses.replace(main.settings, landmark_store='store'))
+    monkeypatch.setattr(stages, 'get_landmark_store', lambda path: EmptyStore())
+    monkeypatch.setattr(stages, '_extract', recording_extract)
+
+    async def post():
+        async with main.app.router.lifespan_context(main.app):
+            transport = httpx.ASGITransport(app=main.app)
+            async with httpx.AsyncClient(transport=transport, base_url='http://test') as client:
+                return await client.post('/similar-poses', headers={'X-Latency-Budget-Ms': '100'},
+                                         files={'image': ('test.jpg', _jpeg(), 'image/jpeg')})
+
+    started = time.time()
+    response = asyncio.run(post())
+    finished = time.time()
+    assert response.status_code == 200
+    assert response.json() == {"matches": []}
+    assert len(budgets) == 1
+    assert started + 0.1 <= budgets[0].deadline <= finished + 0.1
+
+
+def test_prediction_batch_larger_than_executor_capacity(stub_landmarker):
+    from app.main import inference
+
+    count = inference.capacity + 3
+    files = [('images', (f'{i}.jpg', _jpeg(), 'image/jpeg')) for i in range(count)]
+    response = asyncio.run(_post_batch(files))
+
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert [result["filename"] for result in results] == [f'{i}.jpg' for i in range(count)]
+    assert all('prediction' in result for result in results)
+
+
+def test_prediction_batch_reports_failures_per_image(monkeypatch, stub_landmarker):
+    import utilities.landmarker_cascade as cascade
+
+    def flaky_landmarker(rgb, **kwargs):
+        if rgb.shape[0] == 100:
+            raise RuntimeError("landmarker crashed")
+        return stub_landmarker
+
+    monkeypatch.setattr(cascade, 'extract_landmarks', flaky_landmarker)
+    files = [('images', ('good.jpg', _jpeg(), 'image/jpeg')),
+             ('images', ('bad.jpg', _jpeg(100, 100), 'image/jpeg')),
+             ('images', ('junk.jpg', b'not an image', 'image/jpeg'))]
+    response = asyncio.run(_post_batch(files))
+
+    assert response.status_code == 200
+    good, bad, junk = response.json()["results"]
+    assert 'prediction' in good and good["bounding_box"] is not None
+    assert bad["filename"] == 'bad.jpg' and "landmarker crashed" in bad["error"]
+    assert junk == {"filename": 'junk.jpg', "error": "Could not decode image."}
@@ -0,0 +1,70 @@
+import time
+
+from utilities.result_cache import MISSING, ResultCache, content_key
+
+
+def test_lru_eviction():
+    cache = ResultCache(max_entries=2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1  # 'b' is now least recently used
+    cache.put('c', 3)
+    assert cache.get('b') is MISSING
+    assert cache.get('a') == 1 and cache.get('c') == 3
+    assert cache.stats()["evictions"] == 1
+
+
+def test_none_is_a_cached_value():
+    cache = ResultCache()
+    cache.put('nobody', None)
+    assert cache.get('nobody') is None
+    assert cache.get('unknown') is MISSING
+
+
+def test_entries_expire():
+    cache = ResultCache(ttl=0.05)
+    cache.put('a', 1)
+    time.sleep(0.1)
+    assert cache.get('a') is MISSING
+    assert cache.stats()["expirations"] == 1
+
+
+def test_disk_tier_is_shared(tmp_path):
+    ResultCache(disk_dir=str(tmp_path)).put('a', {"prediction": "forward"})
+    other_worker = ResultCache(disk_dir=str(tmp_path))
+    assert other_worker.get('a') == {"prediction": "forward"}
+    assert other_worker.stats()["disk_hits"] == 1
+
+
+def test_content_key_depends_on_bytes_and_namespace():
+    assert content_key('prediction', b'abc') == content_key('prediction', b'abc')
+    assert content_key('prediction', b'abc') != content_key('prediction', b'abd')
+    assert content_key('prediction', b'abc') != content_key('landmarks', b'abc')
+
+
+def test_disabled_cache_skips_both_tiers(tmp_path):
+    cache = ResultCache(max_entries=0, disk_dir=str(tmp_path))
+    cache.put('a', 1)
+    assert list(tmp_path.iterdir()) == []
+
+    ResultCache(disk_dir=str(tmp_path)).put('a', 1)
+    assert cache.get('a') is MISSING
+
+
+def test_disk_tier_is_pruned_to_its_budget(tmp_path):
+    cache = ResultCache(disk_dir=str(tmp_path), disk_max_bytes=8 * 1024)
+    for i in range(32):
+        cache.put(f'key-{i:02d}', bytes(1024))
+
+    files = [path for path in tmp_path.rglob('*') if path.is_file()]
+    assert sum(path.stat().st_size for path in files) <= 8 * 1024
+    # The most recently stored entries survive the sweep
+    assert ResultCache(disk_dir=str(tmp_path)).get('key-31') == bytes(1024)
+
+
+def test_disk_sweep_removes_expired_entries(tmp_path):
+    cache = ResultCache(ttl=0.05, disk_dir=str(tmp_path))
+    cache.put('a', 1)
+    time.sleep(0.1)
+    cache.sweep_disk()
+    assert [path for path in tmp_path.rglob('*') if path.is_file()] == []
@@ -0,0 +1,59 @@
+import os
+
+import numpy as np
+import pytest
+
+from app.shared_frames import RingFull, SharedFrame, SharedFrameRing, StaleFrame
+
+
+@pytest.fixture
+def ring():
+    ring = SharedFrameRing(2, 64 * 64 * 3)
+    yield ring
+    ring.close()
+
+
+def _frame(value=7):
+    return np.full((64, 64, 3), value, np.uint8)
+
+
+def test_frame_round_trip(ring):
+    lease = ring.acquire('test')
+    ref = ring.write(lease, _frame())
+    with SharedFrame(ref) as frame:
+        assert np.array_equal(frame, _frame())
+        assert not frame.flags.writeable
+    assert ring.release(lease)
+    assert not ring.release(lease)
+    assert ring.in_use == 0
+
+
+def test_ring_full_and_oversized_frames(ring):
+    leases = [ring.acquire(), ring.acquire()]
+    with pytest.raises(RingFull):
+        ring.acquire()
+    with pytest.raises(ValueError):
+        ring.write(leases[0], np.zeros((65, 64, 3), np.uint8))
+
+
+def test_reclaimed_slot_is_stale(ring):
+    lease = ring.acquire('hung handler')
+    ref = ring.write(lease, _frame())
+    assert ring.reclaim_leaked(max_age=0.0) == [lease]
+    assert ring.leaked == 1
+    with pytest.raises(StaleFrame):
+        with SharedFrame(ref):
+            pass
+    # The reclaimed slot can be leased again
+    ref = ring.write(ring.acquire(), _frame(9))
+    with SharedFrame(ref) as frame:
+        assert frame[0, 0, 0] == 9
+
+
+def test_close_unlinks_segment():
+    ring = SharedFrameRing(1, 16)
+    path = f'/dev/shm/{ring.name.lstrip("/")}'
+    if not os.path.exists(path):
+        pytest.skip("shared memory is not backed by /dev/shm here")
+    ring.close()
+    assert not os.path.exists(path)
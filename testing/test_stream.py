@@ -0,0 +1,30 @@
+import cv2
+import numpy as np
+from fastapi.testclient import TestClient
+
+import app.streaming as streaming
+
+
+def _jpeg():
+    return cv2.imencode('.jpg', np.zeros((120, 160, 3), np.uint8))[1].tobytes()
+
+
+def test_stream_survives_failing_frames(monkeypatch):
+    from app.main import app
+
+    def broken_landmarker(*args, **kwargs):
+        raise RuntimeError("Unable to open model")
+
+    monkeypatch.setattr(streaming, 'create_pose_landmarker', broken_landmarker)
+    with TestClient(app) as client, client.websocket_connect('/stream') as websocket:
+        websocket.send_bytes(_jpeg())
+        failed = websocket.receive_json()
+        assert failed["frame"] == 0 and "Unable to open model" in failed["error"]
+
+        websocket.send_bytes(b'not an image')
+        undecodable = websocket.receive_json()
+        assert undecodable["frame"] == 1 and "error" in undecodable
+
+        # The session is still open for the next frame
+        websocket.send_bytes(_jpeg())
+        assert websocket.receive_json()["frame"] == 2
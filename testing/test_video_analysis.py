@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+
+import utilities.video_analysis as video_analysis
+from utilities.video_analysis import OneEuroFilter, VideoAnalysisPipeline
+
+
+def _static_run(monkeypatch, found, frames=30):
+    monkeypatch.setattr(video_analysis, 'extract_landmarks', lambda rgb, mode, timestamp_ms, landmarker: found)
+    pipeline = VideoAnalysisPipeline(landmarker=object(), max_keyframe_interval=10)
+    frame = np.full((240, 320, 3), 128, np.uint8)
+    analyses = [pipeline.process(frame, timestamp_ms=i * 33) for i in range(frames)]
+    return pipeline, analyses
+
+
+@pytest.mark.parametrize('with_person', [True, False])
+def test_static_frames_only_run_landmarks_on_keyframes(monkeypatch, pose, with_person):
+    pipeline, analyses = _static_run(monkeypatch, pose if with_person else None)
+
+    assert pipeline.stage_runs['landmarks'] == 3
+    assert [a.frame_index for a in analyses if 'landmarks' in a.recomputed] == [0, 10, 20]
+    assert all((a.landmarks is not None) == with_person for a in analyses)
+
+
+def test_one_euro_filter_passes_a_constant_signal():
+    smoother = OneEuroFilter()
+    for i in range(10):
+        estimate = smoother(np.full((33, 3), 0.5), i / 30)
+    assert np.allclose(estimate, 0.5)
+
+
+def test_one_euro_filter_smooths_jitter():
+    rng = np.random.default_rng(0)
+    noisy = 0.5 + rng.normal(0, 0.01, (300, 33, 3))
+    smoother = OneEuroFilter()
+    smoothed = np.array([smoother(x, i / 30) for i, x in enumerate(noisy)])
+    assert smoothed[30:].std() < noisy[30:].std() / 2
+
+
+def test_one_euro_filter_follows_fast_motion():
+    smoother = OneEuroFilter(beta=10.0)
+    for i in range(30):
+        estimate = smoother(np.array([i / 10]), i / 30)
+    assert abs(estimate[0] - 2.9) < 0.1
+    # The filtered velocity (3 units/s) extrapolates the next sample
+    assert abs(smoother.predict(30 / 30)[0] - 3.0) < 0.1
+
+
+def test_one_euro_filter_reset_forgets_the_signal():
+    smoother = OneEuroFilter()
+    smoother(np.zeros(3), 0.0)
+    smoother.reset()
+    assert smoother.predict(1.0) is None
+    assert np.array_equal(smoother(np.ones(3), 1.0), np.ones(3))
@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+
+from app import wire
+
+
+@pytest.mark.parametrize('accept, expected', [
+    (None, wire.JSON_MEDIA_TYPE),
+    ('application/x-fotoflow-pose', wire.BINARY_MEDIA_TYPE),
+    ('application/json;q=0.5, application/x-fotoflow-pose', wire.BINARY_MEDIA_TYPE),
+    ('application/x-fotoflow-pose;q=0.2, application/json', wire.JSON_MEDIA_TYPE),
+    ('text/html, */*', wire.JSON_MEDIA_TYPE),
+    ('application/x-fotoflow-pose;q=0', wire.JSON_MEDIA_TYPE),
+])
+def test_negotiate(accept, expected):
+    assert wire.negotiate(accept) == expected
+
+
+def test_binary_round_trip(pose):
+    payload = wire.encode_binary(pose.xyz, (10, 20, 30, 40), label_id=2)
+    assert len(payload) == 420
+    decoded = wire.decode_binary(payload)
+    assert decoded["label_id"] == 2
+    assert decoded["bounding_box"] == (10, 20, 30, 40)
+    assert np.array_equal(decoded["landmarks"], pose.xyz)
+
+
+def test_binary_without_person():
+    payload = wire.encode_binary()
+    assert len(payload) == 24
+    assert wire.decode_binary(payload) == {"label_id": -1, "bounding_box": None, "landmarks": None}
+
+
+def test_binary_rejects_foreign_payload():
+    with pytest.raises(ValueError):
+        wire.decode_binary(b'JUNK' + bytes(20))
@@ -0,0 +1,251 @@
+"""
+Batch pose extraction for building training sets.
+
+Walks a directory of photos, extracts landmarks on a process pool (one
+PoseLandmarker per worker process) and streams them into NumPy shards that
+are merged into memory-mappable arrays at the end:
+
+    output/landmarks.npy   float32 (N, 99), same layout as pose_data.txt
+    output/visibility.npy  float32 (N, 33)
+    output/paths.txt       N image paths, one per row
+    output/missing.txt     images where no person was found
+    output/failed.txt      images that could not be read or processed
+
+Interrupted runs resume from the last completed shard. Failed images are
+retried on every resume; images without a person only with --retry-missing.
+
+Usage:
+    python -m utilities.batch_extract test_pics/ output/ --workers 8
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+import numpy as np
+
+from utilities.images import DEFAULT_INFERENCE_SIZE, read_image_for_inference
+from utilities.landmarks import NUM_FEATURES, NUM_LANDMARKS
+from utilities.media_pipe import DEFAULT_MODEL_ASSET_PATH, create_pose_landmarker, extract_landmarks
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp')
+CHECKPOINT_FILE = 'checkpoint.json'
+
+# Per-process state, set up by _init_worker
+_worker_landmarker = None
+_worker_target_size = DEFAULT_INFERENCE_SIZE
+
+
+def find_images(root):
+    """Returns all image paths under `root`, sorted for a stable row order."""
+    paths = []
+    for directory, _, files in os.walk(root):
+        for name in files:
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                paths.append(os.path.join(directory, name))
+    return sorted(paths)
+
+
+def _init_worker(model_asset_path, target_size):
+    global _worker_landmarker, _worker_target_size
+    _worker_landmarker = create_pose_landmarker('IMAGE', model_asset_path)
+    _worker_target_size = target_size
+
+
+def _extract_one(path):
+    """
+    Worker task: returns (path, landmarks (99,), visibility (33,), error).
+    Landmarks are None when no person was found or on failure; only
+    failures set `error`.
+    """
+    try:
+        with open(path, 'rb') as f:
+            decoded = read_image_for_inference(f.read(), _worker_target_size)
+        if decoded is None:
+            return path, None, None, "could not decode image"
+        landmarks = extract_landmarks(decoded.rgb, landmarker=_worker_landmarker)
+    except Exception as e:
+        print(f"Failed to process {path}: {e}", file=sys.stderr)
+        return path, None, None, str(e) or type(e).__name__
+    if landmarks is None:
+        return path, None, None, None
+    return path, landmarks.flat, landmarks.visibility, None
+
+
+class ShardWriter:
+    """Buffers results and flushes them as numbered .npy shards with a checkpoint."""
+
+    def __init__(self, output_dir, shard_size):
+        self.output_dir = output_dir
+        self.shard_dir = os.path.join(output_dir, 'shards')
+        self.shard_size = shard_size
+        os.makedirs(self.shard_dir, exist_ok=True)
+        self.checkpoint = self._read_checkpoint()
+        self._paths, self._landmarks, self._visibility, self._missing, self._failed = [], [], [], [], []
+
+    def _read_checkpoint(self):
+        path = os.path.join(self.output_dir, CHECKPOINT_FILE)
+        checkpoint = {"shards": [], "missing": [], "failed": []}
+        if os.path.exists(path):
+            with open(path) as f:
+                checkpoint.update(json.load(f))
+        return checkpoint
+
+    def _write_checkpoint(self):
+        path = os.path.join(self.output_dir, CHECKPOINT_FILE)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.checkpoint, f)
+        os.replace(tmp_path, path)
+
+    def completed_paths(self, retry_missing=False):
+        """
+        Image paths earlier (possibly interrupted) runs are done with: stored
+        poses, plus images without a person unless `retry_missing`. Failed
+        images are never done, so every resume retries them.
+        """
+        done = set() if retry_missing else set(self.checkpoint["missing"])
+        for shard in self.checkpoint["shards"]:
+            with open(os.path.join(self.shard_dir, f'paths-{shard:05d}.txt')) as f:
+                done.update(f.read().splitlines())
+        return done
+
+    def forget(self, paths):
+        """Drops `paths` from the missing and failed lists before they are retried."""
+        paths = set(paths)
+        for key in ("missing", "failed"):
+            self.checkpoint[key] = [path for path in self.checkpoint[key] if path not in paths]
+
+    def add(self, path, landmarks, visibility, error=None):
+        if error is not None:
+            self._failed.append(path)
+        elif landmarks is None:
+            self._missing.append(path)
+        else:
+            self._paths.append(path)
+            self._landmarks.append(landmarks)
+            self._visibility.append(visibility)
+        if len(self._paths) + len(self._missing) + len(self._failed) >= self.shard_size:
+            self.flush()
+
+    def flush(self):
+        if not self._paths and not self._missing and not self._failed:
+            return
+        if self._paths:
+            shard = len(self.checkpoint["shards"])
+            np.save(os.path.join(self.shard_dir, f'landmarks-{shard:05d}.npy'),
+                    np.asarray(self._landmarks, dtype=np.float32))
+            np.save(os.path.join(self.shard_dir, f'visibility-{shard:05d}.npy'),
+                    np.asarray(self._visibility, dtype=np.float32))
+            with open(os.path.join(self.shard_dir, f'paths-{shard:05d}.txt'), 'w') as f:
+                f.write('\n'.join(self._paths) + '\n')
+            self.checkpoint["shards"].append(shard)
+        self.checkpoint["missing"].extend(self._missing)
+        self.checkpoint["failed"].extend(self._failed)
+        # The checkpoint is only updated once the shard files are complete
+        self._write_checkpoint()
+        self._paths, self._landmarks, self._visibility, self._missing, self._failed = [], [], [], [], []
+
+    def merge(self):
+        """Concatenates all shards into landmarks.npy / visibility.npy / paths.txt."""
+        self.flush()
+        shards = self.checkpoint["shards"]
+        counts = [np.load(os.path.join(self.shard_dir, f'landmarks-{shard:05d}.npy'), mmap_mode='r').shape[0]
+                  for shard in shards]
+        total = sum(counts)
+
+        landmarks_out = np.lib.format.open_memmap(os.path.join(self.output_dir, 'landmarks.npy'), mode='w+',
+                                                  dtype=np.float32, shape=(total, NUM_FEATURES))
+        visibility_out = np.lib.format.open_memmap(os.path.join(self.output_dir, 'visibility.npy'), mode='w+',
+                                                   dtype=np.float32, shape=(total, NUM_LANDMARKS))
+        row = 0
+        with open(os.path.join(self.output_dir, 'paths.txt'), 'w') as paths_out:
+            for shard, count in zip(shards, counts):
+                landmarks_out[row:row + count] = np.load(os.path.join(self.shard_dir, f'landmarks-{shard:05d}.npy'))
+                visibility_out[row:row + count] = np.load(os.path.join(self.shard_dir, f'visibility-{shard:05d}.npy'))
+                with open(os.path.join(self.shard_dir, f'paths-{shard:05d}.txt')) as f:
+                    paths_out.write(f.read())
+                row += count
+        landmarks_out.flush()
+        visibility_out.flush()
+
+        with open(os.path.join(self.output_dir, 'missing.txt'), 'w') as f:
+            f.write(''.join(f'{path}\n' for path in self.checkpoint["missing"]))
+        with open(os.path.join(self.output_dir, 'failed.txt'), 'w') as f:
+            f.write(''.join(f'{path}\n' for path in self.checkpoint["failed"]))
+        return total
+
+
+class ProgressReporter:
+    """Prints processed count, throughput and ETA to stderr at most every `interval` seconds."""
+
+    def __init__(self, total, interval=2.0):
+        self.total = total
+        self.interval = interval
+        self.done = 0
+        self.started = time.monotonic()
+        self._last_report = 0.0
+
+    def update(self, count=1):
+        self.done += count
+        now = time.monotonic()
+        if now - self._last_report >= self.interval or self.done == self.total:
+            self._last_report = now
+            print(self.summary(), file=sys.stderr)
+
+    def summary(self):
+        elapsed = max(time.monotonic() - self.started, 1e-9)
+        rate = self.done / elapsed
+        remaining = (self.total - self.done) / rate if rate > 0 else float('inf')
+        return f"{self.done}/{self.total} images, {rate:.1f} img/s, elapsed {elapsed:.0f}s, ETA {remaining:.0f}s"
+
+
+def run(input_dir, output_dir, workers=None, shard_size=1000,
+        model_asset_path=DEFAULT_MODEL_ASSET_PATH, target_size=DEFAULT_INFERENCE_SIZE, retry_missing=False):
+    """
+    Extracts landmarks for every image under `input_dir`. Returns the number
+    of poses stored. Images that failed in an earlier run are retried, as are
+    images without a person with `retry_missing`.
+    """
+    writer = ShardWriter(output_dir, shard_size)
+    done = writer.completed_paths(retry_missing)
+    pending = [path for path in find_images(input_dir) if path not in done]
+    if done:
+        print(f"Resuming: {len(done)} images already processed.", file=sys.stderr)
+    writer.forget(pending)
+
+    progress = ProgressReporter(len(pending))
+    if pending:
+        # Spawn rather than fork: MediaPipe's native threads don't survive fork()
+        context = multiprocessing.get_context('spawn')
+        with context.Pool(workers, initializer=_init_worker, initargs=(model_asset_path, target_size)) as pool:
+            for path, landmarks, visibility, error in pool.imap_unordered(_extract_one, pending, chunksize=8):
+                writer.add(path, landmarks, visibility, error)
+                progress.update()
+
+    total = writer.merge()
+    print(f"Stored {total} poses in {output_dir} ({len(writer.checkpoint['missing'])} images without a person, "
+          f"{len(writer.checkpoint['failed'])} failed).", file=sys.stderr)
+    return total
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Extract pose landmarks for a directory of images.")
+    parser.add_argument('input_dir', help="Directory to search for images (recursively).")
+    parser.add_argument('output_dir', help="Directory for shards, checkpoint and merged arrays.")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="Worker processes (default: all cores).")
+    parser.add_argument('--shard-size', type=int, default=1000, help="Images per checkpointed shard.")
+    parser.add_argument('--model', default=DEFAULT_MODEL_ASSET_PATH, help="MediaPipe pose landmarker .task file.")
+    parser.add_argument('--target-size', type=int, default=DEFAULT_INFERENCE_SIZE,
+                        help="Long side images are downscaled to before inference.")
+    parser.add_argument('--retry-missing', action='store_true',
+                        help="Also retry images an earlier run found no person in (failed ones always are).")
+    args = parser.parse_args(argv)
+    run(args.input_dir, args.output_dir, args.workers, args.shard_size, args.model, args.target_size,
+        args.retry_missing)
+
+
+if __name__ == '__main__':
+    main()
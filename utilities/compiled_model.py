@@ -0,0 +1,221 @@
+"""
+NumPy-only inference for the pose classifier.
+
+`export` compiles the scikit-learn scaler, random forest and label encoder
+into one .npz file holding flat arrays: every tree's nodes concatenated,
+leaf class probabilities, the scaler's mean/scale and the label names.
+`CompiledPoseClassifier` evaluates it with plain NumPy, so serving needs
+neither sklearn nor joblib and loads in milliseconds.
+
+The evaluation mirrors sklearn step for step (float64 scaling, float32
+features compared against float64 thresholds, normalized leaf
+probabilities summed tree by tree, first argmax), so predictions and
+probabilities are bit-identical. `--validate` checks that on a validation
+set before the artifact is written.
+
+Usage:
+    python -m utilities.compiled_model
+    python -m utilities.compiled_model --scaler models/pose-classifier/scaler_test.pkl --validate output/landmarks.npy
+"""
+import argparse
+import os
+import sys
+import time
+from typing import List, Optional
+
+import numpy as np
+
+from utilities.landmarks import NUM_FEATURES
+
+FORMAT_VERSION = 1
+
+
+def compiled_path_for(model_path: str, encoder_path: str, scaler_path: str) -> str:
+    """
+    Where the compiled artifact for a model/encoder/scaler triple lives, e.g.
+    pose_classifier_test-label_encoder_test-scaler.npz.
+    """
+    encoder_name = os.path.splitext(os.path.basename(encoder_path))[0]
+    scaler_name = os.path.splitext(os.path.basename(scaler_path))[0]
+    return f'{os.path.splitext(model_path)[0]}-{encoder_name}-{scaler_name}.npz'
+
+
+class CompiledPoseClassifier:
+    """
+    A compiled scaler + random forest + label encoder.
+
+    Trees are stored as one node table. Leaves point to themselves, so a batch
+    walks every tree in lockstep for `max_depth` steps with no branching.
+    """
+
+    def __init__(self, arrays):
+        self.mean = arrays["mean"]
+        self.scale = arrays["scale"]
+        self.roots = arrays["roots"]
+        self.left = arrays["left"]
+        self.right = arrays["right"]
+        # Interleaved (left, right) pairs, so one gather picks the next node
+        self.children = np.stack([self.left, self.right], axis=1).ravel()
+        self.feature = arrays["feature"]
+        self.threshold = arrays["threshold"]
+        self.leaf_proba = arrays["leaf_proba"]
+        self.max_depth = int(arrays["max_depth"])
+        self.classes: List[str] = arrays["classes"].tolist()
+
+    @classmethod
+    def load(cls, path: str) -> 'CompiledPoseClassifier':
+        with np.load(path, allow_pickle=False) as data:
+            if int(data["format_version"]) != FORMAT_VERSION:
+                raise ValueError(f"{path} has format version {int(data['format_version'])}, "
+                                 f"expected {FORMAT_VERSION}.")
+            return cls({name: data[name] for name in data.files})
+
+    def predict_proba(self, pose_batch: np.ndarray) -> np.ndarray:
+        """Class probabilities (N, classes) for an (N, 99) batch."""
+        scaled = (np.asarray(pose_batch, dtype=np.float64) - self.mean) / self.scale
+        features = scaled.astype(np.float32).ravel()
+
+        # (trees, N) current node per tree and sample; take() on flat arrays beats fancy indexing
+        row_offsets = (np.arange(len(scaled)) * scaled.shape[1])[np.newaxis, :]
+        nodes = np.repeat(self.roots[:, np.newaxis], len(scaled), axis=1)
+        for _ in range(self.max_depth):
+            go_right = features.take(row_offsets + self.feature.take(nodes)) > self.threshold.take(nodes)
+            nodes = self.children.take(nodes * 2 + go_right)
+
+        # Accumulate tree by tree like RandomForestClassifier, so the sums round identically
+        leaf_proba = self.leaf_proba[nodes]  # (trees, N, classes)
+        proba = np.zeros(leaf_proba.shape[1:], dtype=np.float64)
+        for tree_proba in leaf_proba:
+            proba += tree_proba
+        proba /= len(self.roots)
+        return proba
+
+    def predict(self, pose_batch: np.ndarray) -> List[str]:
+        """Predicted labels for an (N, 99) batch."""
+        proba = self.predict_proba(pose_batch)
+        return [self.classes[i] for i in np.argmax(proba, axis=1)]
+
+
+def compile_arrays(model, scaler, label_encoder) -> dict:
+    """Flattens fitted sklearn objects into the arrays CompiledPoseClassifier evaluates."""
+    if getattr(model, 'n_outputs_', 1) != 1:
+        raise ValueError("Only single-output classifiers can be compiled.")
+    if not (scaler.with_mean and scaler.with_std):
+        raise ValueError("Only a StandardScaler with mean and std can be compiled.")
+
+    roots, lefts, rights, features, thresholds, leaf_probas = [], [], [], [], [], []
+    offset = 0
+    for estimator in model.estimators_:
+        tree = estimator.tree_
+        ids = np.arange(tree.node_count)
+        is_leaf = tree.children_left == -1
+        roots.append(offset)
+        lefts.append(np.where(is_leaf, ids, tree.children_left) + offset)
+        rights.append(np.where(is_leaf, ids, tree.children_right) + offset)
+        features.append(np.where(is_leaf, 0, tree.feature))
+        thresholds.append(np.where(is_leaf, 0.0, tree.threshold))
+        # DecisionTreeClassifier.predict_proba normalizes the leaf values the same way
+        proba = tree.value[:, 0, :model.n_classes_].copy()
+        normalizer = proba.sum(axis=1)[:, np.newaxis]
+        normalizer[normalizer == 0.0] = 1.0
+        proba /= normalizer
+        leaf_probas.append(proba)
+        offset += tree.node_count
+
+    classes = np.asarray(label_encoder.classes_)[np.asarray(model.classes_)]
+    return {"format_version": np.array(FORMAT_VERSION),
+            "mean": np.asarray(scaler.mean_, dtype=np.float64),
+            "scale": np.asarray(scaler.scale_, dtype=np.float64),
+            "roots": np.asarray(roots, dtype=np.int32),
+            "left": np.concatenate(lefts).astype(np.int32),
+            "right": np.concatenate(rights).astype(np.int32),
+            "feature": np.concatenate(features).astype(np.int32),
+            "threshold": np.concatenate(thresholds).astype(np.float64),
+            "leaf_proba": np.concatenate(leaf_probas),
+            "max_depth": np.array(max(estimator.tree_.max_depth for estimator in model.estimators_)),
+            "classes": classes.astype(str)
+            }
+
+
+def validation_set(path: Optional[str] = None, samples: int = 5000, seed: int = 0) -> np.ndarray:
+    """
+    Loads an (N, 99) validation set (e.g. batch_extract's landmarks.npy), or
+    synthesizes one around pose_data.txt: the reference pose with noise at
+    several scales plus uniformly random vectors, to reach many leaves.
+    """
+    if path:
+        return np.load(path, mmap_mode='r').reshape(-1, NUM_FEATURES)
+    rng = np.random.default_rng(seed)
+    with open('pose_data.txt') as f:
+        reference = np.array([float(v) for v in f.read().split(',')])
+    noise_scales = rng.choice([0.01, 0.05, 0.1, 0.3], size=(samples // 2, 1))
+    around_reference = reference + rng.normal(size=(samples // 2, NUM_FEATURES)) * noise_scales
+    uniform = rng.uniform(-1.0, 2.0, size=(samples - samples // 2, NUM_FEATURES))
+    return np.vstack([around_reference, uniform])
+
+
+def validate(compiled: CompiledPoseClassifier, model, scaler, label_encoder, pose_batch) -> bool:
+    """Compares compiled and sklearn outputs; prints a report and returns True if identical."""
+    pose_batch = np.asarray(pose_batch, dtype=np.float64)
+    started = time.perf_counter()
+    scaled = scaler.transform(pose_batch)
+    expected_proba = model.predict_proba(scaled)
+    expected = label_encoder.inverse_transform(model.predict(scaled)).tolist()
+    sklearn_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    proba = compiled.predict_proba(pose_batch)
+    predicted = compiled.predict(pose_batch)
+    compiled_seconds = time.perf_counter() - started
+
+    mismatches = sum(a != b for a, b in zip(expected, predicted))
+    identical = mismatches == 0 and np.array_equal(proba, expected_proba)
+    print(f"{len(pose_batch)} samples: {mismatches} label mismatches, "
+          f"max |proba diff| {np.abs(proba - expected_proba).max():.3g}, "
+          f"sklearn {sklearn_seconds * 1000:.1f} ms, compiled {compiled_seconds * 1000:.1f} ms", file=sys.stderr)
+    return identical
+
+
+def export(model_path: str, encoder_path: str, scaler_path: str, output_path: Optional[str] = None,
+           validation: Optional[np.ndarray] = None) -> str:
+    """Compiles the three pickles into `output_path` (default: compiled_path_for). Returns the path."""
+    import joblib
+
+    model = joblib.load(model_path)
+    label_encoder = joblib.load(encoder_path)
+    scaler = joblib.load(scaler_path)
+    arrays = compile_arrays(model, scaler, label_encoder)
+
+    if validation is not None:
+        if not validate(CompiledPoseClassifier(arrays), model, scaler, label_encoder, validation):
+            raise ValueError("Compiled classifier does not reproduce the sklearn predictions.")
+
+    output_path = output_path or compiled_path_for(model_path, encoder_path, scaler_path)
+    tmp_path = output_path + '.tmp.npz'
+    np.savez(tmp_path, **arrays)
+    os.replace(tmp_path, output_path)
+    return output_path
+
+
+def main(argv=None):
+    from utilities.model_registry import DEFAULT_ENCODER_PATH, DEFAULT_MODEL_PATH, DEFAULT_SCALER_PATH
+
+    parser = argparse.ArgumentParser(description="Compile the sklearn pose classifier to a NumPy-only artifact.")
+    parser.add_argument('--model', default=DEFAULT_MODEL_PATH, help="RandomForestClassifier pickle.")
+    parser.add_argument('--encoder', default=DEFAULT_ENCODER_PATH, help="LabelEncoder pickle.")
+    parser.add_argument('--scaler', default=DEFAULT_SCALER_PATH, help="StandardScaler pickle.")
+    parser.add_argument('--output', help="Artifact path (default: next to the model, named after all three pickles).")
+    parser.add_argument('--validate', metavar='NPY', nargs='?', const='',
+                        help="Check bit-identical predictions first, on an (N, 99) .npy or a synthetic set.")
+    args = parser.parse_args(argv)
+
+    validation = validation_set(args.validate or None) if args.validate is not None else None
+    try:
+        path = export(args.model, args.encoder, args.scaler, args.output, validation)
+    except ValueError as e:
+        raise SystemExit(str(e))
+    print(f"Wrote {path} ({os.path.getsize(path) / 1024:.0f} KB).", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
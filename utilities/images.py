@@ -1,18 +1,173 @@
-from cv2 import imdecode, IMREAD_COLOR
+from cv2 import (
+    imdecode, resize, cvtColor, IMREAD_COLOR, IMREAD_REDUCED_COLOR_2, IMREAD_REDUCED_COLOR_4,
+    IMREAD_REDUCED_COLOR_8, INTER_AREA, COLOR_BGR2RGB, COLOR_GRAY2RGB, COLOR_YUV2RGB_NV12
+)
+from typing import NamedTuple, Optional, Tuple
 import numpy as np
 
+# Long side (pixels) images are brought down to before pose inference.
+# The pose models run on ~256 px crops, so anything above this is wasted decode work.
+DEFAULT_INFERENCE_SIZE = 640
+
+# libjpeg can decode directly at 1/2, 1/4 or 1/8 scale, largest reduction first
+_REDUCED_DECODE_FLAGS = ((8, IMREAD_REDUCED_COLOR_8), (4, IMREAD_REDUCED_COLOR_4), (2, IMREAD_REDUCED_COLOR_2))
+_JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+# Uncompressed pixel layouts accepted by read_raw_frame, with bytes per pixel
+RAW_FRAME_FORMATS = {"gray": 1.0, "nv12": 1.5, "bgr": 3.0, "rgb": 3.0}
+
+
+class DecodedImage(NamedTuple):
+    """
+    An image decoded for inference.
+
+    `rgb` is the (possibly downscaled) RGB buffer shared by every analysis
+    stage; `original_shape` is the (h, w, 3) shape of the full-resolution
+    image so results can be reported in the client's coordinates.
+    """
+    rgb: np.ndarray
+    original_shape: Tuple[int, int, int]
+
+    @property
+    def scale(self) -> float:
+        """Inference-size width divided by original width."""
+        return self.rgb.shape[1] / self.original_shape[1]
+
+    def to_original(self, points):
+        """Maps pixel coordinates in `rgb` back to the full-resolution image."""
+        if points is None:
+            return None
+        return (np.asarray(points, dtype=np.float64) / self.scale).round().astype(int)
+
+
 def read_image_from_memory(image_data):
     """
     Reads an image from raw bytes in memory using OpenCV.
-    
+
     :param image_data: Raw image data (e.g., bytes)
     :return: Decoded BGR image or None if decoding fails
     """
     # Convert raw bytes into a NumPy array
     image_array = np.frombuffer(image_data, np.uint8)
-    
+
     # Decode the image
     bgr_image = imdecode(image_array, IMREAD_COLOR)
-    
+
     return bgr_image
 
+
+def peek_image_size(image_data) -> Optional[Tuple[int, int]]:
+    """
+    Reads the (width, height) of a JPEG or PNG from its header without decoding.
+
+    :param image_data: Raw image data (e.g., bytes)
+    :return: (width, height) or None for other formats or truncated headers
+    """
+    data = memoryview(image_data)
+    if len(data) >= 24 and data[:8] == b'\x89PNG\r\n\x1a\n':
+        return int.from_bytes(data[16:20], 'big'), int.from_bytes(data[20:24], 'big')
+    if len(data) < 4 or data[:2] != b'\xff\xd8':
+        return None
+
+    i = 2
+    while i + 4 <= len(data):
+        if data[i] != 0xFF:
+            return None
+        marker = data[i + 1]
+        if marker == 0xFF:  # Fill byte
+            i += 1
+            continue
+        if marker in (0x01, 0xD8) or 0xD0 <= marker <= 0xD7:  # Markers without a length
+            i += 2
+            continue
+        segment_length = int.from_bytes(data[i + 2:i + 4], 'big')
+        if marker in _JPEG_SOF_MARKERS:
+            if i + 9 > len(data):
+                return None
+            height = int.from_bytes(data[i + 5:i + 7], 'big')
+            width = int.from_bytes(data[i + 7:i + 9], 'big')
+            return width, height
+        i += 2 + segment_length
+    return None
+
+
+def read_image_for_inference(image_data, target_size=DEFAULT_INFERENCE_SIZE) -> Optional[DecodedImage]:
+    """
+    Decodes raw image bytes straight to an inference-size RGB buffer.
+
+    JPEGs are decoded at a reduced scale (1/2, 1/4 or 1/8) when the long side
+    stays at or above `target_size`, so a 12 MP photo never materializes at
+    full resolution. The result is then downscaled once to `target_size` and
+    converted to RGB once.
+
+    :param image_data: Raw image data (e.g., bytes)
+    :param target_size: Long side of the returned buffer, or None to keep full size.
+    :return: DecodedImage or None if decoding fails
+    """
+    image_array = np.frombuffer(image_data, np.uint8)
+    header_size = peek_image_size(image_data)
+
+    flag = IMREAD_COLOR
+    is_jpeg = len(image_data) >= 2 and image_data[:2] == b'\xff\xd8'
+    if target_size and header_size and is_jpeg:
+        long_side = max(header_size)
+        for factor, reduced_flag in _REDUCED_DECODE_FLAGS:
+            if long_side / factor >= target_size:
+                flag = reduced_flag
+                break
+
+    bgr_image = imdecode(image_array, flag)
+    if bgr_image is None:
+        return None
+
+    h, w = bgr_image.shape[:2]
+    if header_size is None:
+        original_shape = (h, w, 3)
+    else:
+        original_w, original_h = header_size
+        # EXIF rotation is applied by imdecode, so follow the decoded orientation
+        if (h > w) != (original_h > original_w):
+            original_w, original_h = original_h, original_w
+        original_shape = (original_h, original_w, 3)
+
+    if target_size and max(h, w) > target_size:
+        ratio = target_size / max(h, w)
+        bgr_image = resize(bgr_image, (max(1, round(w * ratio)), max(1, round(h * ratio))),
+                           interpolation=INTER_AREA)
+
+    return DecodedImage(cvtColor(bgr_image, COLOR_BGR2RGB), original_shape)
+
+
+def read_raw_frame(frame_data, width: int, height: int, pixel_format: str = "gray") -> DecodedImage:
+    """
+    Wraps an uncompressed preview frame for inference without decoding.
+
+    The bytes are viewed in place with np.frombuffer; the only copy is the
+    conversion to RGB, which "rgb" frames skip entirely.
+
+    :param frame_data: Raw pixel bytes (bytes, bytearray or memoryview).
+    :param width: Frame width in pixels.
+    :param height: Frame height in pixels.
+    :param pixel_format: One of RAW_FRAME_FORMATS ("gray", "nv12", "bgr", "rgb").
+    :return: DecodedImage whose original shape is the frame's own shape
+    :raises ValueError: For unknown formats or a size that doesn't match the data
+    """
+    if pixel_format not in RAW_FRAME_FORMATS:
+        raise ValueError(f"Unknown pixel format: {pixel_format}")
+    if width <= 0 or height <= 0 or (pixel_format == "nv12" and (width % 2 or height % 2)):
+        raise ValueError(f"Invalid frame size {width}x{height} for {pixel_format}")
+    expected = int(width * height * RAW_FRAME_FORMATS[pixel_format])
+    pixels = np.frombuffer(frame_data, np.uint8)
+    if pixels.size != expected:
+        raise ValueError(f"Expected {expected} bytes for a {width}x{height} {pixel_format} frame, got {pixels.size}")
+
+    if pixel_format == "gray":
+        rgb = cvtColor(pixels.reshape(height, width), COLOR_GRAY2RGB)
+    elif pixel_format == "nv12":
+        # Full-size Y plane followed by the interleaved half-size UV plane
+        rgb = cvtColor(pixels.reshape(height * 3 // 2, width), COLOR_YUV2RGB_NV12)
+    elif pixel_format == "bgr":
+        rgb = cvtColor(pixels.reshape(height, width, 3), COLOR_BGR2RGB)
+    else:
+        rgb = pixels.reshape(height, width, 3)
+    return DecodedImage(rgb, (height, width, 3))
@@ -0,0 +1,432 @@
+"""
+Append-only, memory-mapped landmark store with nearest-neighbour pose search.
+
+A store is a directory:
+
+    landmarks.f32     float32 (N, 99) rows, same layout as pose_data.txt
+    metadata.jsonl    one JSON object per row (source path, label, ...)
+    metadata.idx      uint64 (N,) byte offset of each row's metadata line
+    projections.f32   float32 (N, D) PCA projections of the normalized poses
+    index.npz         PCA mean and components used for the projections
+    store.json        manifest; its row counts are the commit point
+
+Rows are only ever appended. An append writes the data files first and then
+replaces the manifest, so readers (which map only the committed rows) never
+see a half-written row, and a writer that crashed midway is rolled back to
+the last manifest on the next append.
+
+Poses are compared after `normalize_poses`: x/y only, centered on the hips
+and scaled by torso length, so where the person stood and how large they
+appear don't matter. `nearest` scans the low-dimensional projections for a
+shortlist, then re-ranks the shortlist exactly on the full normalized poses,
+which keeps queries in the milliseconds even at millions of rows.
+
+Usage:
+    python -m utilities.landmark_store import poses/ output/ pose_data.txt --label forward
+    python -m utilities.landmark_store index poses/
+    python -m utilities.landmark_store query poses/ pose_data.txt -k 5
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterable, List, NamedTuple, Optional
+
+import numpy as np
+
+from utilities.landmarks import NUM_FEATURES, NUM_LANDMARKS, as_pose_vectors
+
+try:
+    import fcntl
+except ImportError:  # Windows: appends are not guarded against concurrent writers
+    fcntl = None
+
+FORMAT_VERSION = 1
+MANIFEST_FILE = 'store.json'
+LANDMARKS_FILE = 'landmarks.f32'
+METADATA_FILE = 'metadata.jsonl'
+METADATA_INDEX_FILE = 'metadata.idx'
+PROJECTIONS_FILE = 'projections.f32'
+INDEX_FILE = 'index.npz'
+LOCK_FILE = '.lock'
+
+DEFAULT_COMPONENTS = 16
+DEFAULT_INDEX_SAMPLE = 200_000  # Rows the PCA is fitted on
+DEFAULT_CANDIDATES = 256  # Shortlist size re-ranked exactly, at least 32 * k
+
+# MediaPipe BlazePose landmark indices
+_LEFT_SHOULDER, _RIGHT_SHOULDER, _LEFT_HIP, _RIGHT_HIP = 11, 12, 23, 24
+NORMALIZED_FEATURES = NUM_LANDMARKS * 2
+
+# Rows processed at once when projecting or scanning without an index
+_CHUNK_ROWS = 65536
+
+
+def normalize_poses(pose_batch) -> np.ndarray:
+    """
+    Maps (N, 99) poses to translation- and scale-invariant float32 (N, 66) vectors.
+
+    Only x/y are kept (MediaPipe's z is too noisy to compare across shots),
+    centered on the hip midpoint and divided by the torso length (hip midpoint
+    to shoulder midpoint). Poses with a degenerate torso fall back to their
+    largest x/y extent.
+    """
+    xy = as_pose_vectors(pose_batch).reshape(-1, NUM_LANDMARKS, 3)[:, :, :2]
+    hips = (xy[:, _LEFT_HIP] + xy[:, _RIGHT_HIP]) / 2
+    shoulders = (xy[:, _LEFT_SHOULDER] + xy[:, _RIGHT_SHOULDER]) / 2
+    scale = np.hypot(*(shoulders - hips).T)
+    extent = (xy.max(axis=1) - xy.min(axis=1)).max(axis=1)
+    scale = np.where(scale > 1e-6, scale, extent)
+    scale[scale <= 1e-6] = 1.0
+    normalized = (xy - hips[:, np.newaxis]) / scale[:, np.newaxis, np.newaxis]
+    return normalized.reshape(-1, NORMALIZED_FEATURES).astype(np.float32)
+
+
+class Neighbor(NamedTuple):
+    """One search result: the store row, its distance in normalized-pose units and its metadata."""
+    row: int
+    distance: float
+    metadata: dict
+
+
+class _Manifest(NamedTuple):
+    rows: int = 0
+    metadata_bytes: int = 0
+    indexed_rows: int = 0  # Rows with a projection; 0 without an index
+    components: int = 0
+    generation: int = 0  # Bumped on every write, so readers know to re-map
+
+
+def _read_rows(path: str, dtype, width: int, rows: int) -> np.ndarray:
+    """Maps the first `rows` rows of a raw file read-only (an empty array for none)."""
+    if rows == 0:
+        return np.empty((0, width), dtype)
+    return np.memmap(path, dtype=dtype, mode='r', shape=(rows, width))
+
+
+class LandmarkStore:
+    """
+    An append-only pose store in directory `root`, see the module docstring.
+
+    Any number of threads and processes may read while one process appends;
+    readers pick up new rows on their next call. Appends from several
+    processes are serialized with a lock file where fcntl is available.
+    """
+
+    def __init__(self, root: str, create: bool = False):
+        self.root = root
+        if not os.path.exists(self._path(MANIFEST_FILE)):
+            if not create:
+                raise FileNotFoundError(f"No landmark store at {root}.")
+            os.makedirs(root, exist_ok=True)
+            self._write_manifest(_Manifest())
+        self._lock = threading.Lock()
+        self._state = None
+        self._refresh()
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.root, name)
+
+    def _write_manifest(self, manifest: _Manifest):
+        path = self._path(MANIFEST_FILE)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(dict(manifest._asdict(), format_version=FORMAT_VERSION, features=NUM_FEATURES), f)
+        os.replace(tmp_path, path)
+
+    def _read_manifest(self) -> _Manifest:
+        path = self._path(MANIFEST_FILE)
+        with open(path) as f:
+            manifest = json.load(f)
+        if manifest["format_version"] != FORMAT_VERSION:
+            raise ValueError(f"{path} has format version {manifest['format_version']}, expected {FORMAT_VERSION}.")
+        return _Manifest(*(manifest[field] for field in _Manifest._fields))
+
+    def _refresh(self):
+        """Re-maps the files if the manifest changed since the last call. Returns the current state."""
+        # The manifest is a few dozen bytes; reading it is cheaper than any query
+        manifest = self._read_manifest()
+        state = self._state
+        if state is not None and state["manifest"].generation == manifest.generation:
+            return state
+        with self._lock:
+            state = {"manifest": manifest,
+                     "landmarks": _read_rows(self._path(LANDMARKS_FILE), np.float32, NUM_FEATURES, manifest.rows),
+                     "offsets": _read_rows(self._path(METADATA_INDEX_FILE), np.uint64, 1, manifest.rows)[:, 0],
+                     "projections": None, "mean": None, "components": None, "norms": None}
+            if manifest.indexed_rows:
+                with np.load(self._path(INDEX_FILE)) as index:
+                    state["mean"], state["components"] = index["mean"], index["components"]
+                projections = _read_rows(self._path(PROJECTIONS_FILE), np.float32, manifest.components,
+                                         manifest.indexed_rows)
+                state["projections"] = projections
+                # Squared norms turn each distance into one dot product at query time
+                state["norms"] = np.einsum('ij,ij->i', projections, projections)
+            self._state = state
+        return state
+
+    def __len__(self) -> int:
+        return self._refresh()["manifest"].rows
+
+    @property
+    def vectors(self) -> np.ndarray:
+        """Read-only float32 (N, 99) view of every committed row."""
+        return self._refresh()["landmarks"]
+
+    @property
+    def indexed(self) -> bool:
+        return self._refresh()["manifest"].indexed_rows > 0
+
+    def metadata(self, row: int) -> dict:
+        """The metadata stored with `row`."""
+        return self._metadata(self._refresh(), [row])[0]
+
+    def _metadata(self, state, rows) -> List[dict]:
+        entries = []
+        with open(self._path(METADATA_FILE), 'rb') as f:
+            for row in rows:
+                if not 0 <= row < state["manifest"].rows:
+                    raise IndexError(f"Row {row} is not in the store.")
+                f.seek(int(state["offsets"][row]))
+                entries.append(json.loads(f.readline()))
+        return entries
+
+    @contextmanager
+    def _writing(self):
+        """Exclusive writer section; yields the manifest with any uncommitted tail truncated away."""
+        with open(self._path(LOCK_FILE), 'a') as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                manifest = self._read_manifest()
+                for name, size in ((LANDMARKS_FILE, manifest.rows * NUM_FEATURES * 4),
+                                   (METADATA_FILE, manifest.metadata_bytes),
+                                   (METADATA_INDEX_FILE, manifest.rows * 8),
+                                   (PROJECTIONS_FILE, manifest.indexed_rows * manifest.components * 4)):
+                    path = self._path(name)
+                    if os.path.exists(path) and os.path.getsize(path) > size:
+                        os.truncate(path, size)
+                yield manifest
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def append(self, poses, metadata: Optional[Iterable[dict]] = None) -> range:
+        """
+        Appends poses ((99,), (N, 99), (N, 33, 3) or PoseLandmarks) with one
+        metadata dict per pose. New rows are projected right away if the
+        store has an index. Returns the range of the new row numbers.
+        """
+        vectors = np.ascontiguousarray(as_pose_vectors(poses), dtype=np.float32)
+        metadata = list(metadata) if metadata is not None else [{} for _ in range(len(vectors))]
+        if len(metadata) != len(vectors):
+            raise ValueError(f"Got {len(metadata)} metadata entries for {len(vectors)} poses.")
+        if not np.isfinite(vectors).all():
+            raise ValueError("Poses must not contain NaN or infinite values.")
+        if len(vectors) == 0:
+            return range(len(self), len(self))
+
+        with self._writing() as manifest:
+            lines = [(json.dumps(entry, separators=(',', ':')) + '\n').encode() for entry in metadata]
+            offsets = manifest.metadata_bytes + np.cumsum([0] + [len(line) for line in lines[:-1]], dtype=np.uint64)
+
+            with open(self._path(LANDMARKS_FILE), 'ab') as f:
+                f.write(vectors.tobytes())
+            with open(self._path(METADATA_FILE), 'ab') as f:
+                f.write(b''.join(lines))
+            with open(self._path(METADATA_INDEX_FILE), 'ab') as f:
+                f.write(offsets.astype(np.uint64).tobytes())
+
+            indexed_rows = manifest.indexed_rows
+            if indexed_rows and indexed_rows == manifest.rows:
+                with np.load(self._path(INDEX_FILE)) as index:
+                    projections = (normalize_poses(vectors) - index["mean"]) @ index["components"].T
+                with open(self._path(PROJECTIONS_FILE), 'ab') as f:
+                    f.write(projections.astype(np.float32).tobytes())
+                indexed_rows += len(vectors)
+
+            rows = manifest.rows + len(vectors)
+            self._write_manifest(manifest._replace(rows=rows,
+                                                   metadata_bytes=manifest.metadata_bytes + sum(map(len, lines)),
+                                                   indexed_rows=indexed_rows, generation=manifest.generation + 1))
+        return range(manifest.rows, rows)
+
+    def build_index(self, components: int = DEFAULT_COMPONENTS, sample_size: int = DEFAULT_INDEX_SAMPLE,
+                    seed: int = 0) -> int:
+        """
+        Fits a PCA on (a sample of) the normalized poses and projects every
+        row. Rows appended afterwards are projected as they arrive, so this
+        only needs re-running when the pose distribution has shifted.
+        Returns the number of rows indexed.
+        """
+        components = min(components, NORMALIZED_FEATURES)
+        with self._writing() as manifest:
+            if manifest.rows == 0:
+                raise ValueError("Cannot index an empty store.")
+            landmarks = _read_rows(self._path(LANDMARKS_FILE), np.float32, NUM_FEATURES, manifest.rows)
+            sample = landmarks
+            if manifest.rows > sample_size:
+                rows = np.sort(np.random.default_rng(seed).choice(manifest.rows, sample_size, replace=False))
+                sample = landmarks[rows]
+            normalized = normalize_poses(sample).astype(np.float64)
+            mean = normalized.mean(axis=0)
+            _, _, vt = np.linalg.svd(normalized - mean, full_matrices=False)
+            basis = np.zeros((components, NORMALIZED_FEATURES))
+            basis[:len(vt[:components])] = vt[:components]  # Fewer samples than components: pad with zeros
+            mean, basis = mean.astype(np.float32), basis.astype(np.float32)
+
+            tmp_path = self._path(PROJECTIONS_FILE + '.tmp')
+            with open(tmp_path, 'wb') as f:
+                for start in range(0, manifest.rows, _CHUNK_ROWS):
+                    chunk = normalize_poses(landmarks[start:start + _CHUNK_ROWS])
+                    f.write(((chunk - mean) @ basis.T).astype(np.float32).tobytes())
+            np.savez(self._path(INDEX_FILE + '.tmp.npz'), mean=mean, components=basis)
+            os.replace(self._path(INDEX_FILE + '.tmp.npz'), self._path(INDEX_FILE))
+            os.replace(tmp_path, self._path(PROJECTIONS_FILE))
+            self._write_manifest(manifest._replace(indexed_rows=manifest.rows, components=components,
+                                                   generation=manifest.generation + 1))
+        return manifest.rows
+
+    def _shortlist(self, state, query: np.ndarray, count: int) -> np.ndarray:
+        """Rows whose projections are closest to the query, plus every row not yet indexed."""
+        manifest = state["manifest"]
+        projected = (query - state["mean"]) @ state["components"].T
+        # |p - q|^2 up to the constant |q|^2
+        scores = state["norms"] - 2.0 * (state["projections"] @ projected)
+        if count < len(scores):
+            shortlist = np.argpartition(scores, count)[:count]
+        else:
+            shortlist = np.arange(len(scores))
+        return np.concatenate([shortlist, np.arange(manifest.indexed_rows, manifest.rows)])
+
+    def nearest(self, pose, k: int = 5, candidates: int = DEFAULT_CANDIDATES) -> List[Neighbor]:
+        """
+        The `k` stored poses closest to `pose` after normalization, nearest first.
+
+        With an index, the `max(candidates, 32 * k)` best rows by projection
+        are re-ranked on their full normalized poses; without one, every row
+        is compared exactly (fine for small stores).
+        """
+        state = self._refresh()
+        rows = state["manifest"].rows
+        if rows == 0 or k <= 0:
+            return []
+        query = normalize_poses(pose)[0]
+        landmarks = state["landmarks"]
+
+        if state["projections"] is not None:
+            shortlist = np.sort(self._shortlist(state, query, max(candidates, 32 * k)))
+            distances = np.linalg.norm(normalize_poses(landmarks[shortlist]) - query, axis=1)
+        else:
+            shortlist = np.arange(rows)
+            distances = np.concatenate([np.linalg.norm(normalize_poses(landmarks[start:start + _CHUNK_ROWS]) - query,
+                                                       axis=1)
+                                        for start in range(0, rows, _CHUNK_ROWS)])
+
+        best = np.argsort(distances, kind='stable')[:k]
+        rows = [int(shortlist[i]) for i in best]
+        return [Neighbor(row, float(distances[i]), metadata)
+                for row, i, metadata in zip(rows, best, self._metadata(state, rows))]
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_landmark_store(root: str) -> LandmarkStore:
+    """Returns the shared store for `root`, opening it once."""
+    store = _stores.get(root)
+    if store is None:
+        with _stores_lock:
+            store = _stores.get(root) or _stores.setdefault(root, LandmarkStore(root))
+    return store
+
+
+def read_pose_file(path: str) -> np.ndarray:
+    """Reads a comma-separated pose text file (save_pose_data_to_file) as a (99,) vector."""
+    with open(path) as f:
+        values = np.array([float(v) for v in f.read().replace('\n', ',').split(',') if v.strip()])
+    if values.size != NUM_FEATURES:
+        raise ValueError(f"{path} holds {values.size} values, expected {NUM_FEATURES}.")
+    return values
+
+
+def iter_import_batches(source: str, label: Optional[str] = None, batch_rows: int = _CHUNK_ROWS):
+    """
+    Yields (poses (N, 99), metadata) batches from `source`: a batch_extract
+    output directory (landmarks.npy + paths.txt), an (N, 99) .npy file, a
+    pose text file, or a directory of pose text files.
+    """
+    extra = {"label": label} if label else {}
+    if os.path.isdir(source) and os.path.exists(os.path.join(source, 'landmarks.npy')):
+        landmarks = np.load(os.path.join(source, 'landmarks.npy'), mmap_mode='r')
+        with open(os.path.join(source, 'paths.txt')) as f:
+            paths = f.read().splitlines()
+        for start in range(0, len(landmarks), batch_rows):
+            yield (landmarks[start:start + batch_rows],
+                   [dict(extra, source=path) for path in paths[start:start + batch_rows]])
+    elif os.path.isdir(source):
+        paths = sorted(os.path.join(directory, name) for directory, _, files in os.walk(source)
+                       for name in files if name.endswith('.txt'))
+        for start in range(0, len(paths), batch_rows):
+            chunk = paths[start:start + batch_rows]
+            yield np.stack([read_pose_file(path) for path in chunk]), [dict(extra, source=path) for path in chunk]
+    elif source.endswith('.npy'):
+        landmarks = np.load(source, mmap_mode='r').reshape(-1, NUM_FEATURES)
+        for start in range(0, len(landmarks), batch_rows):
+            yield (landmarks[start:start + batch_rows],
+                   [dict(extra, source=source, source_row=row)
+                    for row in range(start, min(start + batch_rows, len(landmarks)))])
+    else:
+        yield read_pose_file(source)[np.newaxis], [dict(extra, source=source)]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manage and query a landmark store.")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    import_parser = commands.add_parser('import', help="Append poses to a store, creating it if needed.")
+    import_parser.add_argument('store')
+    import_parser.add_argument('sources', nargs='+',
+                               help="batch_extract output directories, .npy files, pose text files or directories.")
+    import_parser.add_argument('--label', help="Label recorded in every imported row's metadata.")
+
+    index_parser = commands.add_parser('index', help="(Re)build the similarity index.")
+    index_parser.add_argument('store')
+    index_parser.add_argument('--components', type=int, default=DEFAULT_COMPONENTS)
+    index_parser.add_argument('--sample', type=int, default=DEFAULT_INDEX_SAMPLE, help="Rows to fit the PCA on.")
+
+    query_parser = commands.add_parser('query', help="Print the stored poses closest to a pose text file.")
+    query_parser.add_argument('store')
+    query_parser.add_argument('pose')
+    query_parser.add_argument('-k', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    if args.command == 'import':
+        store = LandmarkStore(args.store, create=True)
+        for source in args.sources:
+            imported = 0
+            for poses, metadata in iter_import_batches(source, args.label):
+                imported += len(store.append(poses, metadata))
+            print(f"{source}: {imported} poses", file=sys.stderr)
+        print(f"{args.store} holds {len(store)} poses.", file=sys.stderr)
+    elif args.command == 'index':
+        started = time.perf_counter()
+        rows = LandmarkStore(args.store).build_index(args.components, args.sample)
+        print(f"Indexed {rows} poses in {time.perf_counter() - started:.1f}s.", file=sys.stderr)
+    else:
+        store = LandmarkStore(args.store)
+        pose = read_pose_file(args.pose)
+        started = time.perf_counter()
+        neighbors = store.nearest(pose, args.k)
+        elapsed = time.perf_counter() - started
+        for neighbor in neighbors:
+            print(f"{neighbor.distance:.4f}\t{neighbor.row}\t{json.dumps(neighbor.metadata)}")
+        print(f"{len(neighbors)} of {len(store)} poses in {elapsed * 1000:.1f} ms.", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,181 @@
+"""
+Latency-budget-aware cascade over MediaPipe pose landmarker variants.
+
+MediaPipe ships the pose landmarker in three sizes: lite, full and heavy,
+each slower and more accurate than the last. A request runs the cheapest
+installed variant first. If the pose it finds is weak (low presence or
+visibility on the head and torso), or it finds no one, the request
+escalates to the next variant, as long as the expected run time of that
+variant still fits the request's remaining latency budget.
+
+Expected run times are learned per variant (an exponential moving average),
+and are inflated by the current load, so that a backed-up server falls
+back to the cheap model instead of growing its queue.
+"""
+import os
+import threading
+import time
+from typing import Dict, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from utilities.landmarks import PoseLandmarks
+from utilities.media_pipe import DEFAULT_MODEL_ASSET_PATH, extract_landmarks
+
+# Cheapest first; variants whose model file is missing are left out of the cascade
+DEFAULT_VARIANTS = (
+    ('lite', DEFAULT_MODEL_ASSET_PATH),
+    ('full', 'models/mediapipe/pose_landmarker_full.task'),
+    ('heavy', 'models/mediapipe/pose_landmarker_heavy.task'),
+)
+# Starting latency estimates (seconds) until a variant has been measured
+PRIOR_SECONDS = {'lite': 0.03, 'full': 0.06, 'heavy': 0.2}
+DEFAULT_PRIOR_SECONDS = 0.1
+DEFAULT_MIN_CONFIDENCE = 0.6
+
+# Nose, shoulders and hips: present in any framing worth classifying, unlike hands and feet
+_CORE_LANDMARKS = [0, 11, 12, 23, 24]
+
+
+class LatencyBudget(NamedTuple):
+    """
+    How long a request may still take, made picklable for process executors.
+
+    `deadline` is a time.time() timestamp, or None for no limit. `load` is
+    the executor's queue depth per worker when the request was admitted;
+    expected run times are multiplied by (1 + load).
+    """
+    deadline: Optional[float] = None
+    load: float = 0.0
+
+    @classmethod
+    def from_ms(cls, budget_ms: Optional[float], load: float = 0.0) -> 'LatencyBudget':
+        """A budget starting now; None or a non-positive value means no limit."""
+        deadline = time.time() + budget_ms / 1000 if budget_ms is not None and budget_ms > 0 else None
+        return cls(deadline, load)
+
+    def remaining(self) -> float:
+        return float('inf') if self.deadline is None else self.deadline - time.time()
+
+    @property
+    def overloaded(self) -> bool:
+        """At least a full round of requests is already waiting for workers."""
+        return self.load >= 1.0
+
+
+class CascadeResult(NamedTuple):
+    """
+    The most confident pose found, the variant that found it and every
+    variant tried, in order. `budget_limited` is set when the pose stayed
+    below the confidence threshold because the budget or the load stopped
+    escalation; a larger budget could have found a better one.
+    """
+    landmarks: Optional[PoseLandmarks]
+    variant: str
+    confidence: float
+    tried: Tuple[str, ...]
+    budget_limited: bool = False
+
+
+def pose_confidence(landmarks: Optional[PoseLandmarks]) -> float:
+    """Lowest of mean presence and mean visibility over the head and torso landmarks; 0 for no pose."""
+    if landmarks is None:
+        return 0.0
+    return float(min(np.mean(landmarks.presence[_CORE_LANDMARKS]),
+                     np.mean(landmarks.visibility[_CORE_LANDMARKS])))
+
+
+def installed_variants(variants: Sequence[Tuple[str, str]] = DEFAULT_VARIANTS) -> Tuple[Tuple[str, str], ...]:
+    """
+    The variants whose model file exists. If none do, the first variant is
+    kept anyway, so the missing model fails loudly at the first request.
+    """
+    installed = tuple((name, path) for name, path in variants if os.path.exists(path))
+    return installed or tuple(variants[:1])
+
+
+def parse_variants(spec: str) -> Tuple[Tuple[str, str], ...]:
+    """Parses 'lite=path,full=path,...' (cheapest first) as used by FOTOFLOW_LANDMARKER_VARIANTS."""
+    variants = []
+    for entry in spec.split(','):
+        name, sep, path = entry.strip().partition('=')
+        if not sep or not name or not path:
+            raise ValueError(f"Expected name=path, got {entry!r}.")
+        variants.append((name.strip(), path.strip()))
+    return tuple(variants)
+
+
+class LandmarkerCascade:
+    """
+    Runs landmarker variants cheapest first under a latency budget, see the
+    module docstring. Thread-safe; the landmarkers themselves come from the
+    shared pools in utilities.media_pipe.
+    """
+
+    def __init__(self, variants: Sequence[Tuple[str, str]], min_confidence: float = DEFAULT_MIN_CONFIDENCE,
+                 smoothing: float = 0.2):
+        if not variants:
+            raise ValueError("A cascade needs at least one variant.")
+        self.variants = tuple(variants)
+        self.min_confidence = min_confidence
+        self.smoothing = smoothing
+        self._lock = threading.Lock()
+        self._expected: Dict[str, float] = {name: PRIOR_SECONDS.get(name, DEFAULT_PRIOR_SECONDS)
+                                            for name, _ in self.variants}
+
+    def expected_seconds(self, variant: str) -> float:
+        return self._expected[variant]
+
+    def _observe(self, variant: str, seconds: float):
+        with self._lock:
+            self._expected[variant] += self.smoothing * (seconds - self._expected[variant])
+
+    def affordable(self, variant: str, budget: LatencyBudget) -> bool:
+        """True if `variant` is expected to finish within the remaining budget at the current load."""
+        return self._expected[variant] * (1.0 + budget.load) <= budget.remaining()
+
+    def run(self, rgb_image, budget: LatencyBudget = LatencyBudget(), timer=None) -> CascadeResult:
+        """
+        Detects the pose in `rgb_image`, escalating while the result is below
+        `min_confidence` and the next variant is affordable. Never escalates
+        when overloaded. Each variant's run is timed as stage
+        `landmarks_<variant>` on `timer` (a StageTimer), if given.
+        """
+        tried = []
+        best = None
+        limited = False
+        for i, (name, path) in enumerate(self.variants):
+            if i > 0 and (budget.overloaded or not self.affordable(name, budget)):
+                limited = True
+                break
+            started = time.perf_counter()
+            if timer is not None:
+                with timer.stage(f'landmarks_{name}'):
+                    landmarks = extract_landmarks(rgb_image, model_asset_path=path)
+            else:
+                landmarks = extract_landmarks(rgb_image, model_asset_path=path)
+            self._observe(name, time.perf_counter() - started)
+            tried.append(name)
+            confidence = pose_confidence(landmarks)
+            # A heavier model is not always more sure of itself; keep the best answer
+            if best is None or confidence > best.confidence:
+                best = CascadeResult(landmarks, name, confidence, ())
+            if confidence >= self.min_confidence:
+                break
+        return best._replace(tried=tuple(tried), budget_limited=limited)
+
+
+_cascades = {}
+_cascades_lock = threading.Lock()
+
+
+def get_landmarker_cascade(variants: Sequence[Tuple[str, str]] = DEFAULT_VARIANTS,
+                           min_confidence: float = DEFAULT_MIN_CONFIDENCE) -> LandmarkerCascade:
+    """Returns the shared cascade over the installed subset of `variants`, creating it once."""
+    key = (tuple(variants), min_confidence)
+    cascade = _cascades.get(key)
+    if cascade is None:
+        with _cascades_lock:
+            cascade = _cascades.get(key) or _cascades.setdefault(
+                key, LandmarkerCascade(installed_variants(variants), min_confidence))
+    return cascade
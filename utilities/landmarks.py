@@ -0,0 +1,95 @@
+from typing import NamedTuple, Optional, Sequence
+
+import numpy as np
+
+NUM_LANDMARKS = 33  # MediaPipe BlazePose landmarks per person
+NUM_FEATURES = NUM_LANDMARKS * 3  # Flattened (x, y, z) vector fed to the classifier
+
+
+class PoseLandmarks(NamedTuple):
+    """
+    Pose landmarks for one person, or a stack of people, as NumPy arrays.
+
+    `xyz` holds normalized (x, y, z) coordinates with shape (33, 3), or
+    (N, 33, 3) for a batch. `visibility` and `presence` hold the matching
+    per-landmark MediaPipe scores with shape (33,) or (N, 33). MediaPipe
+    reports float32 values, so float32 storage loses nothing.
+    """
+    xyz: np.ndarray
+    visibility: np.ndarray
+    presence: np.ndarray
+
+    @classmethod
+    def from_mediapipe(cls, landmarks) -> 'PoseLandmarks':
+        """Builds the container from one entry of a PoseLandmarkerResult.pose_landmarks."""
+        values = np.array([(lm.x, lm.y, lm.z, lm.visibility or 0.0, lm.presence or 0.0) for lm in landmarks],
+                          dtype=np.float32)
+        return cls(values[:, :3], values[:, 3].copy(), values[:, 4].copy())
+
+    @classmethod
+    def stack(cls, poses: Sequence['PoseLandmarks']) -> 'PoseLandmarks':
+        """Stacks single poses into one batch of shape (N, 33, 3)."""
+        if not poses:
+            return cls(np.empty((0, NUM_LANDMARKS, 3), np.float32),
+                       np.empty((0, NUM_LANDMARKS), np.float32),
+                       np.empty((0, NUM_LANDMARKS), np.float32))
+        return cls(np.stack([pose.xyz for pose in poses]),
+                   np.stack([pose.visibility for pose in poses]),
+                   np.stack([pose.presence for pose in poses]))
+
+    @property
+    def is_batch(self) -> bool:
+        return self.xyz.ndim == 3
+
+    @property
+    def flat(self) -> np.ndarray:
+        """The classifier layout: (99,) for one pose, (N, 99) for a batch."""
+        return self.xyz.reshape(self.xyz.shape[:-2] + (NUM_FEATURES,))
+
+    def tolist(self):
+        """Flattened (x, y, z) list, the format used by the JSON API and pose data files."""
+        return self.flat.astype(np.float64).tolist()
+
+
+def is_empty(landmarks) -> bool:
+    """True for None or an empty landmark list/array."""
+    if landmarks is None:
+        return True
+    if isinstance(landmarks, PoseLandmarks):
+        return landmarks.xyz.size == 0
+    return len(landmarks) == 0
+
+
+def as_landmark_array(landmarks) -> np.ndarray:
+    """
+    Returns landmarks as a float64 array of shape (33, 3) or (N, 33, 3).
+
+    Accepts a PoseLandmarks container, a flattened (x, y, z) list or (99,)
+    array, a (33, 3) array, or batches of those ((N, 99) / (N, 33, 3)).
+    """
+    if isinstance(landmarks, PoseLandmarks):
+        landmarks = landmarks.xyz
+    array = np.asarray(landmarks, dtype=np.float64)
+    if array.shape[-1] == NUM_FEATURES:
+        array = array.reshape(array.shape[:-1] + (NUM_LANDMARKS, 3))
+    if array.ndim not in (2, 3) or array.shape[-1] != 3:
+        raise ValueError(f"Expected landmarks of shape (33, 3) or (N, 33, 3), got {array.shape}.")
+    return array
+
+
+def as_pose_vectors(landmarks) -> np.ndarray:
+    """Returns landmarks as classifier input of shape (N, 99); a single pose gives N = 1."""
+    array = as_landmark_array(landmarks)
+    return array.reshape(-1, NUM_FEATURES)
+
+
+def unbatch(values: np.ndarray, landmarks: np.ndarray):
+    """Returns a plain Python scalar when `landmarks` held a single pose."""
+    return values.item() if landmarks.ndim == 2 else values
+
+
+def as_optional_vector(pose_data) -> Optional[np.ndarray]:
+    """Flattened (99,) vector for one pose, or None when no pose was found."""
+    if is_empty(pose_data):
+        return None
+    return as_pose_vectors(pose_data)[0]
@@ -1,78 +1,242 @@
-import mediapipe as mp
-from mediapipe.tasks import python
-from mediapipe.tasks.python import vision
 import numpy as np
+import os
+import queue
+import threading
+from contextlib import contextmanager
 from cv2 import imread,cvtColor,COLOR_BGR2RGB
 from utilities.images import read_image_from_memory
+from utilities.landmarks import PoseLandmarks, as_landmark_array, unbatch
 
-# Singleton pattern for efficient PoseLandmarker initialization
-_landmarker = None
-
-def get_pose_landmarker(running_mode='IMAGE'):
-    """Initializes the PoseLandmarker model only once (singleton)."""
-    global _landmarker
-    if _landmarker is None:
-        BaseOptions = mp.tasks.BaseOptions
-        PoseLandmarker = mp.tasks.vision.PoseLandmarker
-        PoseLandmarkerOptions = mp.tasks.vision.PoseLandmarkerOptions
-        VisionRunningMode = mp.tasks.vision.RunningMode
-
-        # Determine the running mode
-        if running_mode.upper() == 'IMAGE':
-            mode = VisionRunningMode.IMAGE
-        elif running_mode.upper() == 'VIDEO':
-            mode = VisionRunningMode.VIDEO
-        else:
-            raise ValueError("Invalid running mode. Use 'IMAGE' or 'VIDEO'.")
-
-        # Create a pose landmarker instance with the specified mode:
-        options = PoseLandmarkerOptions(
-            base_options=BaseOptions(model_asset_path='models/mediapipe/pose_landmarker_lite.task'),
-            running_mode=mode
-        )
-        _landmarker = vision.PoseLandmarker.create_from_options(options)
-    return _landmarker
-
-def extract_landmarks(rgb_image, running_mode='IMAGE', frame_count=None):
+DEFAULT_MODEL_ASSET_PATH = 'models/mediapipe/pose_landmarker_lite.task'
+# Max landmarker instances per (running mode, model asset); one per core by default
+DEFAULT_POOL_SIZE = os.cpu_count() or 1
+# Most people a multi-person landmarker reports per image
+DEFAULT_MAX_POSES = 5
+
+_mp = None
+
+
+def _mediapipe():
     """
-    Extracts pose landmarks from an RGB image using MediaPipe PoseLandmarker.
+    Imports MediaPipe on first use. Its import also pulls in matplotlib and
+    takes about a second, which processes that never run a landmarker skip.
+    """
+    global _mp
+    if _mp is None:
+        import mediapipe
+        _mp = mediapipe
+    return _mp
 
-    :param rgb_image: RGB image as a NumPy array.
-    :param running_mode: 'IMAGE' or 'VIDEO' depending on the context.
-    :param frame_count: Frame count for VIDEO mode (required if running_mode is 'VIDEO').
-    :return: Flattened list of (x, y, z) landmarks or None if no landmarks detected.
+
+def _vision_running_mode(running_mode):
+    """Maps 'IMAGE' / 'VIDEO' to the MediaPipe RunningMode enum."""
+    VisionRunningMode = _mediapipe().tasks.vision.RunningMode
+    if running_mode.upper() == 'IMAGE':
+        return VisionRunningMode.IMAGE
+    elif running_mode.upper() == 'VIDEO':
+        return VisionRunningMode.VIDEO
+    raise ValueError("Invalid running mode. Use 'IMAGE' or 'VIDEO'.")
+
+
+def create_pose_landmarker(running_mode='IMAGE', model_asset_path=DEFAULT_MODEL_ASSET_PATH, num_poses=1):
+    """Creates a new PoseLandmarker instance owned by the caller, detecting up to `num_poses` people."""
+    mp = _mediapipe()
+    BaseOptions = mp.tasks.BaseOptions
+    PoseLandmarkerOptions = mp.tasks.vision.PoseLandmarkerOptions
+
+    # Create a pose landmarker instance with the specified mode:
+    options = PoseLandmarkerOptions(
+        base_options=BaseOptions(model_asset_path=model_asset_path),
+        running_mode=_vision_running_mode(running_mode),
+        num_poses=num_poses
+    )
+    return mp.tasks.vision.PoseLandmarker.create_from_options(options)
+
+
+class LandmarkerPool:
+    """
+    A bounded pool of PoseLandmarker instances sharing one running mode, model
+    and maximum number of poses.
+
+    A MediaPipe task instance must not be used by two threads at once, so each
+    call checks an instance out for its exclusive use and returns it afterwards.
+    Instances are created lazily up to `size`; beyond that callers wait for one
+    to be returned. Idle instances are handed out last-in first-out, so a single
+    thread keeps getting the same instance back (which keeps VIDEO-mode
+    timestamps monotonic for that instance).
     """
-    detector = get_pose_landmarker(running_mode)
-    
-    # Convert OpenCV image (RGB) to MediaPipe Image format
-    mp_image = mp.Image(image_format=mp.ImageFormat.SRGB, data=rgb_image)
 
-    # Detect pose landmarks based on the running mode
+    def __init__(self, running_mode='IMAGE', model_asset_path=DEFAULT_MODEL_ASSET_PATH, size=DEFAULT_POOL_SIZE,
+                 num_poses=1):
+        if size < 1:
+            raise ValueError("Pool size must be at least 1.")
+        self.running_mode = running_mode.upper()
+        self.model_asset_path = model_asset_path
+        self.size = size
+        self.num_poses = num_poses
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def acquire(self, timeout=None):
+        """Checks out an idle landmarker, creating one if the pool is not full yet."""
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            can_create = self._created < self.size
+            if can_create:
+                self._created += 1
+        if can_create:
+            try:
+                return create_pose_landmarker(self.running_mode, self.model_asset_path, self.num_poses)
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+        return self._idle.get(timeout=timeout)
+
+    def release(self, landmarker):
+        """Returns a checked-out landmarker to the pool."""
+        self._idle.put(landmarker)
+
+    @contextmanager
+    def checkout(self, timeout=None):
+        landmarker = self.acquire(timeout)
+        try:
+            yield landmarker
+        finally:
+            self.release(landmarker)
+
+    def warm(self, count=None, timeout=None):
+        """
+        Creates up to `count` instances (default: the whole pool) ahead of use
+        and runs one blank detection on each, so MediaPipe's graph setup is
+        not paid by the first requests. Returns the number warmed.
+        """
+        count = min(count or self.size, self.size)
+        mp = _mediapipe()
+        blank = mp.Image(image_format=mp.ImageFormat.SRGB, data=np.zeros((64, 64, 3), np.uint8))
+        landmarkers = []
+        try:
+            for i in range(count):
+                landmarker = self.acquire(timeout)
+                landmarkers.append(landmarker)
+                _detect(landmarker, blank, self.running_mode, i)
+        finally:
+            for landmarker in landmarkers:
+                self.release(landmarker)
+        return len(landmarkers)
+
+    def close(self):
+        """Closes all idle instances. Checked-out instances are closed by their holders."""
+        while True:
+            try:
+                landmarker = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            landmarker.close()
+            with self._lock:
+                self._created -= 1
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+_pool_size = DEFAULT_POOL_SIZE
+
+
+def set_landmarker_pool_size(size):
+    """Sets the size used for pools created from now on (e.g. one per executor worker)."""
+    global _pool_size
+    _pool_size = size
+
+
+def get_landmarker_pool(running_mode='IMAGE', model_asset_path=DEFAULT_MODEL_ASSET_PATH, num_poses=1):
+    """Returns the shared pool for a running mode, model asset and pose count, creating it once."""
+    key = (running_mode.upper(), model_asset_path, num_poses)
+    pool = _pools.get(key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.setdefault(key, LandmarkerPool(running_mode, model_asset_path, _pool_size, num_poses))
+    return pool
+
+def _detect(detector, mp_image, running_mode, frame_count):
     if running_mode.upper() == 'IMAGE':
-        detection_result = detector.detect(mp_image)
+        return detector.detect(mp_image)
     elif running_mode.upper() == 'VIDEO':
         if frame_count is None:
             raise ValueError("frame_count must be provided for VIDEO mode.")
-        detection_result = detector.detect_for_video(mp_image, frame_count)
-    else:
-        raise ValueError("Invalid running mode. Use 'IMAGE' or 'VIDEO'.")
+        return detector.detect_for_video(mp_image, frame_count)
+    raise ValueError("Invalid running mode. Use 'IMAGE' or 'VIDEO'.")
+
+
+def extract_landmarks(rgb_image, running_mode='IMAGE', frame_count=None,
+                      landmarker=None, model_asset_path=DEFAULT_MODEL_ASSET_PATH):
+    """
+    Extracts pose landmarks from an RGB image using MediaPipe PoseLandmarker.
+
+    :param rgb_image: RGB image as a NumPy array.
+    :param running_mode: 'IMAGE' or 'VIDEO' depending on the context.
+    :param frame_count: Frame count for VIDEO mode (required if running_mode is 'VIDEO').
+    :param landmarker: Optional caller-owned landmarker (e.g. one per video stream);
+                       otherwise an instance is checked out of the shared pool.
+    :param model_asset_path: MediaPipe model used when checking out of the pool.
+    :return: PoseLandmarks for the first detected person or None if no landmarks detected.
+    """
+    detection_result = _run_landmarker(rgb_image, running_mode, frame_count, landmarker, model_asset_path, 1)
 
-    # Return landmarks as a NumPy array (flattened)
+    # Return landmarks as NumPy arrays
     if detection_result.pose_landmarks:
-        return np.array([[lm.x, lm.y, lm.z] for lm in detection_result.pose_landmarks[0]]).flatten().tolist()
+        return PoseLandmarks.from_mediapipe(detection_result.pose_landmarks[0])
     
     print("No landmarks detected in the image.")
     return None
 
 
-def extract_pose_data(image, running_mode='IMAGE', frame_count=None):
+def extract_all_landmarks(rgb_image, num_poses=DEFAULT_MAX_POSES, running_mode='IMAGE', frame_count=None,
+                          landmarker=None, model_asset_path=DEFAULT_MODEL_ASSET_PATH):
+    """
+    Extracts the landmarks of up to `num_poses` people in one landmarker pass.
+
+    MediaPipe runs its person detector once over the image and the landmark
+    model on each person's crop, so extra people cost a small crop each
+    rather than another full-image pass.
+
+    :param rgb_image: RGB image as a NumPy array.
+    :param num_poses: Most people to report; pools are kept per value.
+    :param running_mode: 'IMAGE' or 'VIDEO' depending on the context.
+    :param frame_count: Frame count for VIDEO mode (required if running_mode is 'VIDEO').
+    :param landmarker: Optional caller-owned landmarker created with the same `num_poses`.
+    :param model_asset_path: MediaPipe model used when checking out of the pool.
+    :return: PoseLandmarks batch of shape (N, 33, 3), with N = 0 if no one was found.
+    """
+    detection_result = _run_landmarker(rgb_image, running_mode, frame_count, landmarker, model_asset_path,
+                                       num_poses)
+    return PoseLandmarks.stack([PoseLandmarks.from_mediapipe(pose) for pose in detection_result.pose_landmarks])
+
+
+def _run_landmarker(rgb_image, running_mode, frame_count, landmarker, model_asset_path, num_poses):
+    # Convert OpenCV image (RGB) to MediaPipe Image format
+    mp = _mediapipe()
+    mp_image = mp.Image(image_format=mp.ImageFormat.SRGB, data=rgb_image)
+
+    # Detect pose landmarks based on the running mode
+    if landmarker is not None:
+        return _detect(landmarker, mp_image, running_mode, frame_count)
+    with get_landmarker_pool(running_mode, model_asset_path, num_poses).checkout() as detector:
+        return _detect(detector, mp_image, running_mode, frame_count)
+
+
+def extract_pose_landmarks(image, running_mode='IMAGE', frame_count=None, landmarker=None):
     """
     Extracts pose landmarks from an image (file path, NumPy array, or raw bytes).
 
     :param image: Image input (str: file path, np.ndarray: OpenCV frame, bytes: raw image).
     :param running_mode: 'IMAGE' or 'VIDEO' depending on the context.
     :param frame_count: Frame count for VIDEO mode (required if running_mode is 'VIDEO').
-    :return: Flattened list of (x, y, z) landmarks or None.
+    :param landmarker: Optional caller-owned landmarker, see extract_landmarks.
+    :return: PoseLandmarks or None.
     """
     if isinstance(image, str):
         bgr_image = imread(image)  # File path
@@ -92,7 +256,23 @@ def extract_pose_data(image, running_mode='IMAGE', frame_count=None):
     rgb_image = cvtColor(bgr_image, COLOR_BGR2RGB)
 
     # Extract and return pose landmarks
-    return extract_landmarks(rgb_image, running_mode, frame_count)
+    return extract_landmarks(rgb_image, running_mode, frame_count, landmarker)
+
+
+def extract_pose_data(image, running_mode='IMAGE', frame_count=None, landmarker=None):
+    """
+    Extracts pose landmarks from an image as a flattened list.
+    Prefer extract_pose_landmarks unless the caller needs plain Python floats
+    (e.g. for JSON or pose data text files).
+
+    :param image: Image input (str: file path, np.ndarray: OpenCV frame, bytes: raw image).
+    :param running_mode: 'IMAGE' or 'VIDEO' depending on the context.
+    :param frame_count: Frame count for VIDEO mode (required if running_mode is 'VIDEO').
+    :param landmarker: Optional caller-owned landmarker, see extract_landmarks.
+    :return: Flattened list of (x, y, z) landmarks or None.
+    """
+    landmarks = extract_pose_landmarks(image, running_mode, frame_count, landmarker)
+    return landmarks.tolist() if landmarks is not None else None
 
 
 def find_roll(landmarks):
@@ -101,20 +281,18 @@ def find_roll(landmarks):
 
     Parameters:
     ----------
-    landmarks : list of float
-        Flattened list of (x, y, z) coordinates for each landmark.
+    landmarks : PoseLandmarks, list of float or np.ndarray
+        One pose (flattened (x, y, z) list, (99,) or (33, 3)) or a batch
+        ((N, 99) or (N, 33, 3)).
 
     Returns:
     -------
-    float
-        Roll angle (rotation around the Z-axis).
+    float or np.ndarray
+        Roll angle (rotation around the Z-axis), one per pose for a batch.
     """
-    # Indices for left and right eye landmarks
-    left_eye = landmarks[3 * 3:3 * 3 + 3]  # Left eye outer corner (landmark 3)
-    right_eye = landmarks[6 * 3:6 * 3 + 3]  # Right eye outer corner (landmark 6)
-
-    # Difference between y-coordinates of the eyes
-    return left_eye[1] - right_eye[1]
+    xyz = as_landmark_array(landmarks)
+    # Difference between y-coordinates of the left (3) and right (6) eye outer corners
+    return unbatch(xyz[..., 3, 1] - xyz[..., 6, 1], xyz)
 
 def find_yaw(landmarks):
     """
@@ -122,25 +300,25 @@ def find_yaw(landmarks):
 
     Parameters:
     ----------
-    landmarks : list of float
-        Flattened list of (x, y, z) coordinates for each landmark.
+    landmarks : PoseLandmarks, list of float or np.ndarray
+        One pose or a batch, see find_roll.
 
     Returns:
     -------
-    float
-        Yaw angle (rotation around the Y-axis).
+    float or np.ndarray
+        Yaw angle (rotation around the Y-axis), one per pose for a batch.
     """
-    # Indices for left eye, right eye, and nose tip landmarks
-    left_eye = landmarks[3 * 3:3 * 3 + 3]  # Left eye outer corner (landmark 3)
-    right_eye = landmarks[6 * 3:6 * 3 + 3]  # Right eye outer corner (landmark 6)
-    nose_tip = landmarks[0 * 3:0 * 3 + 3]  # Nose tip (landmark 0)
+    xyz = as_landmark_array(landmarks)
+    left_eye = xyz[..., 3, :]  # Left eye outer corner (landmark 3)
+    right_eye = xyz[..., 6, :]  # Right eye outer corner (landmark 6)
+    nose_tip = xyz[..., 0, :]  # Nose tip (landmark 0)
 
     # Distance from left eye to nose and right eye to nose
-    le2n = nose_tip[0] - left_eye[0]
-    re2n = right_eye[0] - nose_tip[0]
+    le2n = nose_tip[..., 0] - left_eye[..., 0]
+    re2n = right_eye[..., 0] - nose_tip[..., 0]
 
     # Difference between left and right distances
-    return le2n - re2n
+    return unbatch(le2n - re2n, xyz)
 
 def find_pitch(landmarks):
     """
@@ -148,31 +326,26 @@ def find_pitch(landmarks):
 
     Parameters:
     ----------
-    landmarks : list of float
-        Flattened list of (x, y, z) coordinates for each landmark.
+    landmarks : PoseLandmarks, list of float or np.ndarray
+        One pose or a batch, see find_roll.
 
     Returns:
     -------
-    float
-        Pitch angle (rotation around the X-axis).
+    float or np.ndarray
+        Pitch angle (rotation around the X-axis), one per pose for a batch.
     """
-    # Indices for eye and mouth landmarks
-    left_eye = landmarks[3 * 3:3 * 3 + 3]  # Left eye outer corner (landmark 3)
-    right_eye = landmarks[6 * 3:6 * 3 + 3]  # Right eye outer corner (landmark 6)
-    nose_tip = landmarks[0 * 3:0 * 3 + 3]  # Nose tip (landmark 0)
-    mouth_left = landmarks[9 * 3:9 * 3 + 3]  # Mouth left corner (landmark 9)
-    mouth_right = landmarks[10 * 3:10 * 3 + 3]  # Mouth right corner (landmark 10)
-
-    # Average y-coordinate of the eyes and mouth
-    eye_y = (left_eye[1] + right_eye[1]) / 2
-    mou_y = (mouth_left[1] + mouth_right[1]) / 2
+    xyz = as_landmark_array(landmarks)
+    y = xyz[..., 1]
+    # Average y-coordinate of the eyes (landmarks 3, 6) and mouth corners (9, 10)
+    eye_y = (y[..., 3] + y[..., 6]) / 2
+    mou_y = (y[..., 9] + y[..., 10]) / 2
 
-    # Distance from eyes to nose and nose to mouth
-    e2n = eye_y - nose_tip[1]
-    n2m = nose_tip[1] - mou_y
+    # Distance from eyes to nose (landmark 0) and nose to mouth
+    e2n = eye_y - y[..., 0]
+    n2m = y[..., 0] - mou_y
 
     # Ratio of distances
-    return e2n / n2m if n2m != 0 else 0
+    return unbatch(np.where(n2m != 0, e2n / np.where(n2m != 0, n2m, 1), 0), xyz)
 
 def find_pose(landmarks):
     """
@@ -181,44 +354,46 @@ def find_pose(landmarks):
 
     Parameters:
     ----------
-    landmarks : list of float
-        Flattened list of (x, y, z) coordinates for each landmark.
+    landmarks : PoseLandmarks, list of float or np.ndarray
+        One pose or a batch, see find_roll.
 
     Returns:
     -------
     tuple
-        A tuple containing:
+        A tuple containing (floats for one pose, arrays of N for a batch):
         - roll: Rotation around the Z-axis (in degrees).
         - yaw: Rotation around the Y-axis (in degrees).
         - pitch: Rotation around the X-axis (in degrees).
     """
-    # Extract first 10 landmarks for the face (x, y, z)
-    face_landmarks = landmarks[:30]  # First 10 landmarks (3 values each)
-    LMx = np.array([face_landmarks[i * 3] for i in range(len(face_landmarks) // 3)])  # x-coordinates
-    LMy = np.array([face_landmarks[i * 3 + 1] for i in range(len(face_landmarks) // 3)])  # y-coordinates
+    xyz = as_landmark_array(landmarks)
+    # First 10 landmarks for the face
+    LMx = xyz[..., :10, 0]  # x-coordinates
+    LMy = xyz[..., :10, 1]  # y-coordinates
 
     # Calculate roll (rotation around Z-axis)
-    dPx_eyes = max((LMx[3] - LMx[1]), 1)  # Horizontal distance between eyes (landmarks 1 and 3)
-    dPy_eyes = (LMy[3] - LMy[1])  # Vertical distance between eyes
+    dPx_eyes = np.maximum(LMx[..., 3] - LMx[..., 1], 1)  # Horizontal distance between eyes (landmarks 1 and 3)
+    dPy_eyes = LMy[..., 3] - LMy[..., 1]  # Vertical distance between eyes
     angle = np.arctan(dPy_eyes / dPx_eyes)  # Angle for rotation based on slope of eyes
     roll = angle * 180 / np.pi  # Convert radians to degrees
 
     # Calculate yaw and pitch using geometric transformations
-    alpha = np.cos(angle)
-    beta = np.sin(angle)
+    alpha = np.cos(angle)[..., np.newaxis]
+    beta = np.sin(angle)[..., np.newaxis]
     LMxr = (alpha * LMx + beta * LMy)  # Rotated x-coordinates
     LMyr = (-beta * LMx + alpha * LMy)  # Rotated y-coordinates
 
     # Average distance between eyes and mouth (landmarks 2 and 4 for mouth)
-    dXtot = (LMxr[3] - LMxr[1] + LMxr[4] - LMxr[2]) / 2
-    dYtot = (LMyr[2] - LMyr[1] + LMyr[4] - LMyr[3]) / 2
+    dXtot = (LMxr[..., 3] - LMxr[..., 1] + LMxr[..., 4] - LMxr[..., 2]) / 2
+    dYtot = (LMyr[..., 2] - LMyr[..., 1] + LMyr[..., 4] - LMyr[..., 3]) / 2
 
     # Average distance between nose and eyes (landmark 0 for nose)
-    dXnose = (LMxr[3] - LMxr[0] + LMxr[4] - LMxr[0]) / 2
-    dYnose = (LMyr[2] - LMyr[0] + LMyr[4] - LMyr[0]) / 2
+    dXnose = (LMxr[..., 3] - LMxr[..., 0] + LMxr[..., 4] - LMxr[..., 0]) / 2
+    dYnose = (LMyr[..., 2] - LMyr[..., 0] + LMyr[..., 4] - LMyr[..., 0]) / 2
 
-    # Calculate yaw and pitch
-    yaw = (-90 + 90 / 0.5 * dXnose / dXtot) + 230 if dXtot != 0 else 0  # Yaw angle
-    pitch = (-90 + 90 / 0.5 * dYnose / dYtot) if dYtot != 0 else 0  # Pitch angle
+    # Calculate yaw and pitch, guarding the divisions for degenerate faces
+    safe_dXtot = np.where(dXtot != 0, dXtot, 1)
+    safe_dYtot = np.where(dYtot != 0, dYtot, 1)
+    yaw = np.where(dXtot != 0, (-90 + 90 / 0.5 * dXnose / safe_dXtot) + 230, 0)  # Yaw angle
+    pitch = np.where(dYtot != 0, (-90 + 90 / 0.5 * dYnose / safe_dYtot), 0)  # Pitch angle
 
-    return roll, yaw, pitch
+    return unbatch(roll, xyz), unbatch(yaw, xyz), unbatch(pitch, xyz)
@@ -0,0 +1,233 @@
+import hashlib
+import logging
+import os
+import threading
+import time
+from typing import List, NamedTuple, Optional, Sequence
+
+import numpy as np
+
+from utilities.compiled_model import CompiledPoseClassifier, compiled_path_for
+
+MODEL_DIR = './models/pose-classifier'
+DEFAULT_MODEL_PATH = f'{MODEL_DIR}/pose_classifier_test.pkl'
+DEFAULT_ENCODER_PATH = f'{MODEL_DIR}/label_encoder_test.pkl'
+DEFAULT_SCALER_PATH = f'{MODEL_DIR}/scaler.pkl'
+
+logger = logging.getLogger(__name__)
+
+# How often (seconds) predict() is allowed to stat the artifacts for changes
+DEFAULT_CHECK_INTERVAL = 2.0
+
+
+class ModelArtifacts(NamedTuple):
+    """The three pickles that together make up the pose classifier."""
+    model_path: str
+    encoder_path: str
+    scaler_path: str
+
+    @property
+    def compiled_path(self) -> str:
+        """The NumPy-only export of the three pickles, see utilities.compiled_model."""
+        return compiled_path_for(self.model_path, self.encoder_path, self.scaler_path)
+
+
+class _LoadedModel(NamedTuple):
+    model: object  # RandomForestClassifier, or CompiledPoseClassifier with no encoder/scaler
+    label_encoder: object
+    scaler: object
+    sources: tuple
+    mtimes: tuple
+
+
+def _artifact_mtimes(paths) -> tuple:
+    return tuple(os.stat(path).st_mtime_ns for path in paths)
+
+
+class ModelRegistry:
+    """
+    Keeps the pose classifier, label encoder and scaler loaded in memory.
+
+    The artifacts are loaded once (on first use or via `load()`) and reused
+    for every prediction. If a compiled export of the pickles exists it is
+    used instead, which keeps sklearn and joblib out of the process, unless
+    a pickle is newer than the export (retrained without re-running
+    `python -m utilities.compiled_model`). When the files
+    change on disk the registry loads the new versions off to the side and
+    swaps them in with a single assignment, so concurrent callers see either
+    the old or the new model, never a mix of both.
+    """
+
+    def __init__(self, artifacts: ModelArtifacts, check_interval: float = DEFAULT_CHECK_INTERVAL,
+                 prefer_compiled: bool = True):
+        self.artifacts = artifacts
+        self.check_interval = check_interval
+        self.prefer_compiled = prefer_compiled
+        self._loaded: Optional[_LoadedModel] = None
+        self._lock = threading.Lock()
+        self._last_check = 0.0
+        self._version = None
+        self._version_checked = 0.0
+        self.loads = 0
+        self.last_load_seconds = 0.0
+
+    def _sources(self) -> tuple:
+        """The files the next load would read: the compiled export if it is current, else the pickles."""
+        pickles = tuple(self.artifacts)
+        if self.prefer_compiled and os.path.exists(self.artifacts.compiled_path):
+            if _artifact_mtimes([self.artifacts.compiled_path])[0] >= max(_artifact_mtimes(pickles)):
+                return (self.artifacts.compiled_path,)
+        return pickles
+
+    def load(self) -> _LoadedModel:
+        """Loads the artifacts from disk and swaps them in atomically."""
+        with self._lock:
+            started = time.perf_counter()
+            sources = self._sources()
+            mtimes = _artifact_mtimes(sources)
+            if len(sources) == 1:
+                loaded = _LoadedModel(CompiledPoseClassifier.load(sources[0]), None, None, sources, mtimes)
+            else:
+                if self.prefer_compiled and os.path.exists(self.artifacts.compiled_path):
+                    logger.warning("%s is older than the pickles it was compiled from; serving the pickles "
+                                   "until it is rebuilt with `python -m utilities.compiled_model`",
+                                   self.artifacts.compiled_path)
+                # Only the pickles need sklearn, so only import it for them
+                import joblib
+                loaded = _LoadedModel(
+                    model=joblib.load(self.artifacts.model_path),
+                    label_encoder=joblib.load(self.artifacts.encoder_path),
+                    scaler=joblib.load(self.artifacts.scaler_path),
+                    sources=sources,
+                    mtimes=mtimes,
+                )
+            self._loaded = loaded
+            self._last_check = time.monotonic()
+            self.loads += 1
+            self.last_load_seconds = time.perf_counter() - started
+        return loaded
+
+    def ensure_loaded(self):
+        """Loads the artifacts unless a version is already in memory."""
+        if self._loaded is None:
+            self.load()
+
+    def is_stale(self) -> bool:
+        """Returns True if any artifact on disk differs from the loaded version."""
+        loaded = self._loaded
+        if loaded is None:
+            return True
+        try:
+            sources = self._sources()
+            return sources != loaded.sources or _artifact_mtimes(sources) != loaded.mtimes
+        except FileNotFoundError:
+            # A half-written deploy; keep serving the model we have
+            return False
+
+    def reload_if_changed(self) -> bool:
+        """
+        Reloads the artifacts if they changed on disk. Returns True on reload.
+        If the new files can't be loaded (a half-written or corrupt deploy),
+        keeps serving the loaded version and retries after `check_interval`;
+        only a failed first load raises.
+        """
+        if not self.is_stale():
+            return False
+        try:
+            self.load()
+        except Exception:
+            if self._loaded is None:
+                raise
+            logger.exception("Failed to reload the pose classifier from %s; keeping the loaded version",
+                             ', '.join(self._sources()))
+            self._last_check = time.monotonic()
+            return False
+        return True
+
+    def version(self) -> str:
+        """
+        Short fingerprint of the artifacts on disk (the files the next load
+        would read and their mtimes), for keying cached predictions so a
+        redeployed model never serves its predecessor's results. Stats the
+        files at most every `check_interval`.
+        """
+        now = time.monotonic()
+        if self._version is None or (self.check_interval is not None
+                                     and now - self._version_checked >= self.check_interval):
+            try:
+                sources = self._sources()
+                identity = repr((sources, _artifact_mtimes(sources))).encode()
+                self._version = hashlib.blake2b(identity, digest_size=8).hexdigest()
+            except FileNotFoundError:
+                # A half-written deploy; keep the last fingerprint, like is_stale()
+                self._version = self._version or 'missing'
+            self._version_checked = now
+        return self._version
+
+    def _current(self) -> _LoadedModel:
+        loaded = self._loaded
+        if loaded is None:
+            return self.load()
+        if self.check_interval is not None:
+            now = time.monotonic()
+            if now - self._last_check >= self.check_interval:
+                self._last_check = now
+                self.reload_if_changed()
+                loaded = self._loaded
+        return loaded
+
+    @property
+    def classes(self) -> List[str]:
+        """The class labels the loaded classifier can predict."""
+        loaded = self._current()
+        if loaded.label_encoder is None:
+            return list(loaded.model.classes)
+        return list(loaded.label_encoder.classes_)
+
+    def predict(self, pose_data: Sequence[float]) -> Optional[str]:
+        """
+        Classifies a single flattened (x, y, z) landmark vector.
+
+        :param pose_data: Flattened list of 33 * 3 landmark coordinates.
+        :return: Predicted pose label or None if no pose data was given.
+        """
+        if pose_data is None or len(pose_data) == 0:
+            return None
+        return self.predict_batch(np.asarray(pose_data, dtype=np.float64)[np.newaxis])[0]
+
+    def predict_batch(self, pose_batch: np.ndarray) -> List[str]:
+        """
+        Classifies a batch of flattened landmark vectors in one scaler/model call.
+
+        :param pose_batch: Array of shape (N, 99).
+        :return: List of N predicted pose labels.
+        """
+        pose_batch = np.asarray(pose_batch, dtype=np.float64)
+        if pose_batch.ndim != 2:
+            raise ValueError(f"Expected a 2D (N, features) array, got shape {pose_batch.shape}.")
+        if len(pose_batch) == 0:
+            return []
+
+        # Grab one snapshot so a concurrent reload can't mix model and scaler
+        loaded = self._current()
+        if loaded.scaler is None:
+            return loaded.model.predict(pose_batch)
+        scaled = loaded.scaler.transform(pose_batch)
+        predictions = loaded.model.predict(scaled)
+        return loaded.label_encoder.inverse_transform(predictions).tolist()
+
+
+_registries = {}
+_registries_lock = threading.Lock()
+
+
+def get_model_registry(model_path: str = DEFAULT_MODEL_PATH,
+                       encoder_path: str = DEFAULT_ENCODER_PATH,
+                       scaler_path: str = DEFAULT_SCALER_PATH) -> ModelRegistry:
+    """Returns the shared registry for the given artifacts, creating it once."""
+    artifacts = ModelArtifacts(model_path, encoder_path, scaler_path)
+    registry = _registries.get(artifacts)
+    if registry is None:
+        with _registries_lock:
+            registry = _registries.setdefault(artifacts, ModelRegistry(artifacts))
+    return registry
@@ -1,6 +1,8 @@
-import joblib
-from typing import List
+from typing import List, Optional
+import numpy as np
+from utilities.landmarks import PoseLandmarks, as_pose_vectors, is_empty
 from utilities.media_pipe import extract_pose_data
+from utilities.model_registry import MODEL_DIR, get_model_registry
 
 def make_prediction_image(image_path: str):
 
@@ -10,39 +12,44 @@ def make_prediction_image(image_path: str):
         print("Pose data extracted successfully:")
         print(pose_data)
         
-        # Load the model from the .pkl file
-        model = joblib.load('./models/pose-classifier/pose_classifier_test.pkl')
-        label_encoder = joblib.load('./models/pose-classifier/label_encoder_test.pkl')
-        scaler = joblib.load("./models/pose-classifier/scaler_test.pkl")
-        # Reshape pose_data to match the model input
-        pose_data_reshaped = scaler.transform([pose_data])  # Reshape to (1, number_of_features)
-
-        # Use the model for predictions
-        predictions = model.predict(pose_data_reshaped)  # Model expects 2D array
-        predicted_label = label_encoder.inverse_transform(predictions)[0]
+        # Models are loaded once and kept warm by the registry
+        registry = get_model_registry(scaler_path=f'{MODEL_DIR}/scaler_test.pkl')
+        predicted_label = registry.predict(pose_data)
         print("Predicted pose class:", predicted_label)
         return predicted_label
     else:
         print("No pose data extracted.")
         return None
 
-def make_prediction_data(pose_data: List[float]):
-    if pose_data:
-        
-        # Load the model from the .pkl file
-        model = joblib.load('./models/pose-classifier/pose_classifier_test.pkl')
-        label_encoder = joblib.load('./models/pose-classifier/label_encoder_test.pkl')
-        scaler = joblib.load("./models/pose-classifier/scaler.pkl")
-        # Reshape pose_data to match the model input
-        pose_data_reshaped = scaler.transform([pose_data])  # Reshape to (1, number_of_features)
-
-        # Use the model for predictions
-        predictions = model.predict(pose_data_reshaped)  # Model expects 2D array
-        predicted_label = label_encoder.inverse_transform(predictions)[0]
-        return predicted_label
+def make_prediction_data(pose_data):
+    if not is_empty(pose_data):
+        # Models are loaded once and kept warm by the registry
+        return get_model_registry().predict_batch(as_pose_vectors(pose_data))[0]
     else:
         return None
 
+def make_prediction_batch(pose_batch) -> List[Optional[str]]:
+    """
+    Classifies many poses with a single scaler and classifier call.
+
+    :param pose_batch: Either a batch array / PoseLandmarks of shape (N, 33, 3)
+                       or (N, 99), or a sequence of single poses (PoseLandmarks
+                       or flattened lists) where entries may be None for images
+                       where no person was found.
+    :return: List of predicted labels aligned with the input (None where missing).
+    """
+    if isinstance(pose_batch, (np.ndarray, PoseLandmarks)):
+        return get_model_registry().predict_batch(as_pose_vectors(pose_batch))
+
+    present = [i for i, pose_data in enumerate(pose_batch) if not is_empty(pose_data)]
+    labels: List[Optional[str]] = [None] * len(pose_batch)
+    if present:
+        # Stack into one (N, 99) matrix so the classifier vectorizes across images
+        stacked = np.concatenate([as_pose_vectors(pose_batch[i]) for i in present])
+        for i, label in zip(present, get_model_registry().predict_batch(stacked)):
+            labels[i] = label
+    return labels
+
    
 def save_pose_data_to_file(image_path: str, output_file: str):
     # Extract pose data from the image
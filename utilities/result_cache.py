@@ -0,0 +1,192 @@
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+# Returned by ResultCache.get on a miss, since None is a valid cached result
+MISSING = object()
+
+
+def content_key(namespace: str, data: bytes) -> str:
+    """Cache key for raw upload bytes. BLAKE2 is fast and releases the GIL on large inputs."""
+    return f"{namespace}-{hashlib.blake2b(data, digest_size=16).hexdigest()}"
+
+
+def path_key(namespace: str, path: str) -> str:
+    """Cache key for a file on disk; changes whenever the file is rewritten."""
+    stat = os.stat(path)
+    identity = f"{os.path.abspath(path)}:{stat.st_mtime_ns}:{stat.st_size}"
+    return f"{namespace}-{hashlib.blake2b(identity.encode(), digest_size=16).hexdigest()}"
+
+
+class ResultCache:
+    """
+    In-process LRU cache for inference results, with an optional on-disk tier.
+
+    Entries are evicted least-recently-used first once `max_entries` or
+    `max_bytes` (pickled size) is exceeded, and expire `ttl` seconds after
+    being stored. With `disk_dir` set, results are also written there (one
+    file per key, replaced atomically) so several worker processes on the same
+    host can reuse each other's results. The directory is swept every time
+    another eighth of `disk_max_bytes` has been written: expired files are
+    deleted, then the oldest until it fits. Only point `disk_dir` at a
+    directory this service owns: entries are unpickled on read and the sweep
+    deletes files. A `max_entries` of 0 or less disables both tiers.
+    """
+
+    def __init__(self, max_entries: int = 1024, max_bytes: int = 64 * 1024 * 1024,
+                 ttl: float = 300.0, disk_dir: Optional[str] = None,
+                 disk_max_bytes: int = 256 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = disk_max_bytes
+        self._entries = OrderedDict()  # key -> (expires_at, size, value)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._disk_written = 0  # Bytes written to disk since the last sweep
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: str):
+        """Returns the cached value for `key`, or MISSING."""
+        if self.max_entries <= 0:
+            return MISSING
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, size, value = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                self._remove(key)
+                self.expirations += 1
+
+        value = self._disk_get(key)
+        if value is not MISSING:
+            with self._lock:
+                self.disk_hits += 1
+            self._memory_put(key, value, len(pickle.dumps(value)))
+            return value
+
+        with self._lock:
+            self.misses += 1
+        return MISSING
+
+    def put(self, key: str, value):
+        if self.max_entries <= 0:
+            return
+        payload = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        self._memory_put(key, value, len(payload))
+        self._disk_put(key, payload)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {"entries": len(self._entries),
+                    "bytes": self._bytes,
+                    "hits": self.hits,
+                    "disk_hits": self.disk_hits,
+                    "misses": self.misses,
+                    "evictions": self.evictions,
+                    "expirations": self.expirations,
+                    "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0
+                    }
+
+    def _remove(self, key: str):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def _memory_put(self, key: str, value, size: int):
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl, size, value)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, key[-2:], key)
+
+    def _disk_get(self, key: str):
+        if not self.disk_dir:
+            return MISSING
+        path = self._disk_path(key)
+        try:
+            # The file mtime doubles as the store time, shared by all workers
+            if time.time() - os.stat(path).st_mtime > self.ttl:
+                return MISSING
+            with open(path, 'rb') as f:
+                return pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return MISSING
+
+    def _disk_put(self, key: str, payload: bytes):
+        if not self.disk_dir:
+            return
+        directory = os.path.dirname(self._disk_path(key))
+        try:
+            os.makedirs(directory, exist_ok=True)
+            # Write to a temp file and rename so readers never see partial entries
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(payload)
+            os.replace(tmp_path, self._disk_path(key))
+        except OSError:
+            return  # The disk tier is best-effort
+        with self._lock:
+            self._disk_written += len(payload)
+            sweep = self._disk_written >= self.disk_max_bytes / 8
+            if sweep:
+                self._disk_written = 0
+        if sweep:
+            self.sweep_disk()
+
+    def sweep_disk(self):
+        """
+        Deletes expired disk entries (and temp files left by crashed writers),
+        then the least recently stored ones until the tier fits `disk_max_bytes`.
+        Other workers may sweep concurrently; files that vanish are skipped.
+        """
+        if not self.disk_dir:
+            return
+        now = time.time()
+        files = []
+        for directory, _, names in os.walk(self.disk_dir):
+            for name in names:
+                path = os.path.join(directory, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+        files.sort()
+        total = sum(size for _, size, _ in files)
+        for mtime, size, path in files:
+            if total <= self.disk_max_bytes and now - mtime <= self.ttl:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
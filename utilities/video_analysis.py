@@ -0,0 +1,221 @@
+import time
+from typing import NamedTuple, Optional, Tuple
+
+import numpy as np
+from cv2 import cvtColor, resize, absdiff, INTER_AREA, COLOR_BGR2GRAY, COLOR_BGR2RGB
+
+from photography.leading_lines import LeadingLineDetector, get_person_bounding_box
+from utilities.landmarks import PoseLandmarks
+from utilities.media_pipe import DEFAULT_MODEL_ASSET_PATH, create_pose_landmarker, extract_landmarks, find_pose
+from utilities.pose_classifier import get_gaze_direction, make_prediction_data
+
+# Size of the grayscale thumbnail used to measure motion between frames
+MOTION_THUMBNAIL_SIZE = (64, 36)
+
+
+class OneEuroFilter:
+    """
+    One-Euro low-pass filter (Casiez et al., CHI 2012), applied elementwise.
+
+    Smooths jitter when the signal is slow and follows it closely when it moves
+    fast, by raising the cutoff frequency with the filtered speed. Works on
+    arrays of any fixed shape, e.g. all (33, 3) landmarks at once, and can
+    extrapolate the last estimate with its filtered velocity.
+    """
+
+    def __init__(self, min_cutoff=1.7, beta=0.3, d_cutoff=1.0):
+        self.min_cutoff = min_cutoff
+        self.beta = beta
+        self.d_cutoff = d_cutoff
+        self.reset()
+
+    def reset(self):
+        self._x = None
+        self._dx = None
+        self._t = None
+
+    @staticmethod
+    def _alpha(cutoff, dt):
+        tau = 1.0 / (2 * np.pi * cutoff)
+        return 1.0 / (1.0 + tau / dt)
+
+    def __call__(self, x, t):
+        """Filters sample `x` taken at time `t` (seconds) and returns the estimate."""
+        x = np.asarray(x, dtype=np.float64)
+        if self._x is None:
+            self._x, self._dx, self._t = x, np.zeros_like(x), t
+            return x
+        dt = max(t - self._t, 1e-6)
+        dx = (x - self._x) / dt
+        self._dx = self._dx + self._alpha(self.d_cutoff, dt) * (dx - self._dx)
+        cutoff = self.min_cutoff + self.beta * np.abs(self._dx)
+        self._x = self._x + self._alpha(cutoff, dt) * (x - self._x)
+        self._t = t
+        return self._x
+
+    def predict(self, t):
+        """Extrapolates the last estimate to time `t` with the filtered velocity."""
+        if self._x is None:
+            return None
+        return self._x + self._dx * (t - self._t)
+
+
+class FrameAnalysis(NamedTuple):
+    """
+    Analysis of one video frame.
+
+    `recomputed` names the expensive stages that actually ran on this frame
+    ('landmarks', 'classify', 'leading_lines'); `reused` names the ones whose
+    previous result was carried over (landmarks are then extrapolated by the
+    smoothing filter).
+    """
+    frame_index: int
+    timestamp_ms: int
+    landmarks: Optional[PoseLandmarks]
+    prediction: Optional[str]
+    bounding_box: Optional[Tuple[int, int, int, int]]
+    lines: Optional[np.ndarray]
+    convergence: Optional[Tuple[int, int]]
+    head_angles: Optional[Tuple[float, float, float]]
+    gaze: Optional[str]
+    motion: float
+    recomputed: Tuple[str, ...]
+    reused: Tuple[str, ...]
+
+
+class VideoAnalysisPipeline:
+    """
+    Incremental pose and composition analysis for a video stream.
+
+    Expensive stages only run on keyframes. A frame becomes a pose keyframe
+    when the mean absolute difference of a small grayscale thumbnail against
+    the last keyframe exceeds `motion_threshold` (0-255 scale), when
+    `max_keyframe_interval` frames have passed, or on a scene change
+    (`scene_change_threshold` against the previous frame, which also resets
+    the smoothing). This holds whether or not the last keyframe found anyone,
+    so an empty, static scene is not searched on every frame. Leading lines
+    describe the background and are refreshed on scene changes and every
+    `lines_interval` frames. Between keyframes, landmarks are extrapolated
+    and smoothed with a One-Euro filter, and the cheap geometry (bounding
+    box, head angles) is recomputed from them.
+    """
+
+    def __init__(self, landmarker=None, model_asset_path=DEFAULT_MODEL_ASSET_PATH,
+                 motion_threshold=4.0, scene_change_threshold=40.0,
+                 max_keyframe_interval=10, lines_interval=30,
+                 line_detector: Optional[LeadingLineDetector] = None,
+                 landmark_filter: Optional[OneEuroFilter] = None):
+        self.model_asset_path = model_asset_path
+        self.motion_threshold = motion_threshold
+        self.scene_change_threshold = scene_change_threshold
+        self.max_keyframe_interval = max_keyframe_interval
+        self.lines_interval = lines_interval
+        self.line_detector = line_detector or LeadingLineDetector()
+        self.landmark_filter = landmark_filter or OneEuroFilter()
+        self._landmarker = landmarker
+        self._owns_landmarker = landmarker is None
+        self._frame_index = 0
+        self._last_timestamp_ms = -1
+        self._started = time.monotonic()
+        self._previous_thumbnail = None
+        self._keyframe_thumbnail = None
+        self._frames_since_pose = 0
+        self._frames_since_lines = None  # None until lines have run once
+        self._pose: Optional[PoseLandmarks] = None
+        self._prediction = None
+        self._lines = None
+        self._convergence = None
+        self.stage_runs = {"landmarks": 0, "classify": 0, "leading_lines": 0}
+
+    def _timestamp(self, timestamp_ms):
+        if timestamp_ms is None:
+            timestamp_ms = int((time.monotonic() - self._started) * 1000)
+        # VIDEO mode needs strictly increasing timestamps
+        timestamp_ms = max(int(timestamp_ms), self._last_timestamp_ms + 1)
+        self._last_timestamp_ms = timestamp_ms
+        return timestamp_ms
+
+    def _detect_pose(self, rgb, timestamp_ms):
+        if self._landmarker is None:
+            self._landmarker = create_pose_landmarker('VIDEO', self.model_asset_path)
+        return extract_landmarks(rgb, 'VIDEO', timestamp_ms, self._landmarker)
+
+    def process(self, frame, timestamp_ms=None, rgb=None) -> FrameAnalysis:
+        """
+        Analyzes one BGR frame.
+
+        :param frame: BGR frame as a NumPy array.
+        :param timestamp_ms: Capture time; defaults to the time since the pipeline started.
+        :param rgb: The same frame as RGB, if the caller already has it.
+        :return: FrameAnalysis for the frame.
+        """
+        timestamp_ms = self._timestamp(timestamp_ms)
+        t = timestamp_ms / 1000.0
+        gray = cvtColor(frame, COLOR_BGR2GRAY)
+        thumbnail = resize(gray, MOTION_THUMBNAIL_SIZE, interpolation=INTER_AREA)
+
+        scene_change = (self._previous_thumbnail is not None and
+                        float(absdiff(thumbnail, self._previous_thumbnail).mean()) > self.scene_change_threshold)
+        motion = (float(absdiff(thumbnail, self._keyframe_thumbnail).mean())
+                  if self._keyframe_thumbnail is not None else float('inf'))
+        self._previous_thumbnail = thumbnail
+        if scene_change:
+            self.landmark_filter.reset()
+
+        recomputed, reused = [], []
+        run_pose = (scene_change or motion > self.motion_threshold
+                    or self._frames_since_pose + 1 >= self.max_keyframe_interval)
+
+        if run_pose:
+            if rgb is None:
+                rgb = cvtColor(frame, COLOR_BGR2RGB)
+            detected = self._detect_pose(rgb, timestamp_ms)
+            self._keyframe_thumbnail = thumbnail
+            self._frames_since_pose = 0
+            recomputed.append('landmarks')
+            self.stage_runs['landmarks'] += 1
+            if detected is None:
+                self._pose, self._prediction = None, None
+                self.landmark_filter.reset()
+            else:
+                smoothed = self.landmark_filter(detected.xyz, t)
+                self._pose = detected._replace(xyz=smoothed.astype(np.float32))
+                # The classifier sees the raw detection, not the smoothed estimate
+                self._prediction = make_prediction_data(detected)
+                recomputed.append('classify')
+                self.stage_runs['classify'] += 1
+        else:
+            self._frames_since_pose += 1
+            reused.extend(['landmarks', 'classify'])
+            if self._pose is not None:
+                predicted = self.landmark_filter.predict(t)
+                self._pose = self._pose._replace(xyz=predicted.astype(np.float32))
+
+        bounding_box = get_person_bounding_box(self._pose, frame.shape)
+
+        if (scene_change or self._frames_since_lines is None
+                or self._frames_since_lines + 1 >= self.lines_interval):
+            result = self.line_detector.detect(frame, [bounding_box] if bounding_box else ())
+            self._lines, self._convergence = result.lines, result.convergence
+            self._frames_since_lines = 0
+            recomputed.append('leading_lines')
+            self.stage_runs['leading_lines'] += 1
+        else:
+            self._frames_since_lines += 1
+            reused.append('leading_lines')
+
+        head_angles, gaze = None, None
+        if self._pose is not None:
+            head_angles = find_pose(self._pose)
+            gaze = get_gaze_direction(head_angles[1])
+
+        analysis = FrameAnalysis(self._frame_index, timestamp_ms, self._pose, self._prediction, bounding_box,
+                                 self._lines, self._convergence, head_angles, gaze, motion,
+                                 tuple(recomputed), tuple(reused))
+        self._frame_index += 1
+        return analysis
+
+    def close(self):
+        if self._owns_landmarker and self._landmarker is not None:
+            self._landmarker.close()
+            self._landmarker = None